@@ -1,46 +1,82 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, Response
 from flask_cors import CORS
+import logging
 import time
 from urllib.parse import quote  # Replace Werkzeug's url_quote with this
-from algosdk.v2client import indexer
 import os
 import requests
 
 # Import custom modules
-from voting import register_voter, create_election, add_proposal, cast_vote, submit_offline_vote, get_election_results
+from voting import state_recovery, register_voter, create_election, setup_election, add_proposal, cast_vote, submit_offline_vote, submit_offline_bundle, get_election_results, get_election, close_election, get_region_tallies
+from archive import election_archive
 from smart_id import SmartIDVerification
 from baidu_ernie import ErnieX1
 from config import ERNIE_API_KEY  # Import API key from config
+from serialization import json_response, cached_response, response_cache
+from node_pool import get_algod_pool, get_indexer_pool
+from jobs import job_queue, wants_async
+from traffic import install_recorder
+from tracing import install_tracing, span
+from idempotency import idempotent
+from turnout import turnout_tracker
+from profiler import is_admin_request, sample_stacks, collapsed_stacks, profile_slow_requests, slow_request_profiles
+from config import JOB_CONCURRENCY_REGISTER, JOB_CONCURRENCY_ELECTION, LOG_LEVEL
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+install_recorder(app)  # Opt-in traffic capture (TRAFFIC_CAPTURE_PATH)
+install_tracing(app)  # Opt-in request tracing (TRACE_EXPORTER)
 
-# Configure the Indexer client
-INDEXER_ADDRESS = "https://testnet-idx.algonode.cloud"
-INDEXER_TOKEN = ""  # No token required for Algonode
-indexer_client = indexer.IndexerClient(INDEXER_TOKEN, INDEXER_ADDRESS)
+# Restore elections from the last snapshot plus any newer rounds, then keep snapshotting
+try:
+    logger.info("Recovered %d elections", state_recovery.recover())
+except Exception:
+    logger.exception("State recovery failed")
+state_recovery.start()
+
+# Configure the Indexer client (load balanced across ALGORAND_INDEXER_ADDRESSES)
+indexer_client = get_indexer_pool()
+
+# Background job types for long-running operations
+job_queue.register("register_voter", register_voter, concurrency=JOB_CONCURRENCY_REGISTER)
+job_queue.register("create_election", create_election, concurrency=JOB_CONCURRENCY_ELECTION)
+job_queue.register("setup_election", setup_election, concurrency=JOB_CONCURRENCY_ELECTION)
+job_queue.register("add_proposal", add_proposal, concurrency=JOB_CONCURRENCY_ELECTION)
+
+
+def queued_job_response(job_type, *args):
+    """Queue a background job and return its ID with a 202 response."""
+    job_id = job_queue.submit(job_type, *args)
+    return json_response({"jobId": job_id, "status": "queued", "statusUrl": f"/jobs/{job_id}"}), 202
 
 # Flask routes
 
 
 @app.route('/register', methods=['POST'])
+@profile_slow_requests
 def register():
     data = request.json
     voter_id = data.get('voter_id')
 
     if not voter_id:
-        return jsonify({"error": "voter_id is required"}), 400
+        return json_response({"error": "voter_id is required"}), 400
+
+    if wants_async(request):
+        return queued_job_response("register_voter", voter_id)
 
     try:
         # Attempt to register voter with verification
         result = register_voter(voter_id)
-        return jsonify(result)
+        return json_response(result)
     except ValueError as e:
         # Handle verification/eligibility errors
-        return jsonify({"error": str(e)}), 403
+        return json_response({"error": str(e)}), 403
     except Exception as e:
         # Handle other errors
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}), 500
 
 
 @app.route('/create-election', methods=['POST'])
@@ -54,15 +90,50 @@ def create_election_route():
     multisig_admin = data.get('multisig_admin')
 
     if not creator_credentials or not election_name or not total_votes:
-        return jsonify({"error": "Missing required fields"}), 400
+        return json_response({"error": "Missing required fields"}), 400
+
+    if wants_async(request):
+        return queued_job_response(
+            "create_election", creator_credentials, election_name, total_votes, multisig_admin)
 
     try:
         # Call actual implementation
         result = create_election(
             creator_credentials, election_name, total_votes, multisig_admin)
-        return jsonify(result)
+        response_cache.invalidate("results")
+        return json_response(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}), 500
+
+
+@app.route('/setup-election', methods=['POST'])
+def setup_election_route():
+    data = request.json
+
+    # Extract and validate data
+    creator_credentials = data.get('creator_credentials')
+    election_name = data.get('election_name')
+    total_votes = data.get('total_votes')
+    proposals = data.get('proposals')
+    multisig_admin = data.get('multisig_admin')
+
+    if not creator_credentials or not election_name or not total_votes or not proposals:
+        return json_response({"error": "Missing required fields"}), 400
+
+    if wants_async(request):
+        return queued_job_response(
+            "setup_election", creator_credentials, election_name, total_votes, proposals, multisig_admin)
+
+    try:
+        # Create the election and all proposal accounts in one pass
+        result = setup_election(
+            creator_credentials, election_name, total_votes, proposals, multisig_admin)
+        response_cache.invalidate("results")
+        return json_response(result)
+    except ValueError as e:
+        return json_response({"error": str(e)}), 400
+    except Exception as e:
+        return json_response({"error": str(e)}), 500
 
 
 @app.route('/add-proposal', methods=['POST'])
@@ -75,17 +146,23 @@ def add_proposal_route():
     proposal_details = data.get('proposal_details')
 
     if not asset_id or not proposal_name:
-        return jsonify({"error": "Missing required fields"}), 400
+        return json_response({"error": "Missing required fields"}), 400
+
+    if wants_async(request):
+        return queued_job_response("add_proposal", asset_id, proposal_name, proposal_details)
 
     try:
         # Call actual implementation
         result = add_proposal(asset_id, proposal_name, proposal_details)
-        return jsonify(result)
+        response_cache.invalidate("results")
+        return json_response(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}), 500
 
 
 @app.route('/cast-vote', methods=['POST'])
+@idempotent("cast-vote")
+@profile_slow_requests
 def cast_vote_route():
     data = request.json
 
@@ -96,30 +173,35 @@ def cast_vote_route():
     proposal_name = data.get('proposal_name')
 
     if not voter_credentials or not asset_id or not voting_power or not proposal_name:
-        return jsonify({"error": "Missing required fields"}), 400
+        return json_response({"error": "Missing required fields"}), 400
 
     try:
         # Verify the voter's ASA balance
         # Replace with actual logic to get the voter's address
         voter_address = voter_credentials
         asa_id = 123456  # Replace with your ASA ID
-        account_info = indexer_client.account_info(voter_address)
-        assets = account_info.get('account', {}).get('assets', [])
-        voter_balance = next((a['amount']
-                             for a in assets if a['asset-id'] == asa_id), 0)
+        with span("indexer.balance_check", asset_id=asa_id):
+            account_info = indexer_client.account_info(voter_address)
+            assets = account_info.get('account', {}).get('assets', [])
+            voter_balance = next((a['amount']
+                                 for a in assets if a['asset-id'] == asa_id), 0)
 
         if voter_balance < voting_power:
-            return jsonify({"error": "Insufficient token balance to vote"}), 403
+            return json_response({"error": "Insufficient token balance to vote"}), 403
 
         # Call actual implementation
         result = cast_vote(voter_credentials, asset_id,
-                           voting_power, proposal_name)
-        return jsonify(result)
+                           voting_power, proposal_name, region=data.get('region'))
+        # No invalidation here: under load it would rebuild /results on every vote;
+        # RESPONSE_CACHE_TTL bounds how long the cached tally lags behind
+        return json_response(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}), 500
 
 
 @app.route('/offline-vote', methods=['POST'])
+@idempotent("offline-vote")
+@profile_slow_requests
 def offline_vote_route():
     data = request.json
 
@@ -128,14 +210,28 @@ def offline_vote_route():
     vote_data = data.get('vote_data')
 
     if not voter_id or not vote_data:
-        return jsonify({"error": "Missing required fields"}), 400
+        return json_response({"error": "Missing required fields"}), 400
 
     try:
         # Call actual implementation
         result = submit_offline_vote(voter_id, vote_data)
-        return jsonify(result)
+        return json_response(result)
+    except ValueError as e:
+        return json_response({"error": str(e)}), 400
+    except Exception as e:
+        return json_response({"error": str(e)}), 500
+
+
+@app.route('/offline-vote/bundle', methods=['POST'])
+def offline_vote_bundle_route():
+    # Body is a signed binary bundle (see bundle.py), parsed straight from the request stream
+    try:
+        result = submit_offline_bundle(request.stream)
+        return json_response(result)
+    except ValueError as e:
+        return json_response({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}), 500
 
 
 @app.route('/verify-smart-id', methods=['POST'])
@@ -145,29 +241,161 @@ def verify_smart_id():
     smart_id = data.get('smart_id')
 
     if not voter_id or not smart_id:
-        return jsonify({"error": "voter_id and smart_id are required"}), 400
+        return json_response({"error": "voter_id and smart_id are required"}), 400
 
     try:
         # Attempt to verify Smart ID
         verifier = ErnieX1(api_key=ERNIE_API_KEY)
         result = verifier.verify(voter_id, smart_id)
-        return jsonify(result)
+        return json_response(result)
     except ValueError as e:
         # Handle verification errors
-        return jsonify({"error": str(e)}), 403
+        return json_response({"error": str(e)}), 403
     except Exception as e:
         # Handle other errors
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}), 500
 
 
 @app.route('/results', methods=['GET'])
+@profile_slow_requests
 def results():
     try:
+        # Serve pre-serialized bytes while they are fresh
+        cached = cached_response("results")
+        if cached is not None:
+            return cached
+
         # Call actual implementation
         result = get_election_results()
-        return jsonify(result)
+        return json_response(result, cache_key="results")
+    except Exception as e:
+        return json_response({"error": str(e)}), 500
+
+
+@app.route('/results/<int:asset_id>', methods=['GET'])
+def election_results(asset_id):
+    # Live tally for open elections, frozen tally for closed ones (archived elections are loaded from disk)
+    try:
+        result = get_election(asset_id)
+        if result is None:
+            return json_response({"error": "Election not found"}), 404
+        return json_response(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}), 500
+
+
+@app.route('/close-election', methods=['POST'])
+def close_election_route():
+    # Freeze an election's tally and move it to the archive; requires the X-Admin-Token header
+    if not is_admin_request(request):
+        return json_response({"error": "Forbidden"}), 403
+
+    data = request.json
+    asset_id = data.get('asset_id')
+    if not asset_id:
+        return json_response({"error": "asset_id is required"}), 400
+
+    try:
+        result = close_election(asset_id, archive=data.get('archive', True))
+        response_cache.invalidate("results")
+        return json_response(result)
+    except ValueError as e:
+        return json_response({"error": str(e)}), 400
+    except Exception as e:
+        return json_response({"error": str(e)}), 500
+
+
+@app.route('/archive', methods=['GET'])
+def archived_elections():
+    # Index of archived elections; full results via /results/<asset_id>
+    return json_response(election_archive.list())
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    # Status, attempts and result (once finished) of a background job
+    job = job_queue.get(job_id)
+    if not job:
+        return json_response({"error": "Job not found"}), 404
+    return json_response(job)
+
+
+@app.route('/nodes', methods=['GET'])
+def nodes_status():
+    # Health and latency of each configured algod and indexer node
+    algod_pool, indexer_pool = get_algod_pool(), get_indexer_pool()
+    return json_response({
+        "algod": algod_pool.stats() if hasattr(algod_pool, "stats") else [],
+        "indexer": indexer_pool.stats() if hasattr(indexer_pool, "stats") else []
+    })
+
+
+@app.route('/admin/profile', methods=['GET'])
+def admin_profile():
+    # Sample this worker's stacks for ?seconds=N; ?format=json for structured output
+    if not is_admin_request(request):
+        return json_response({"error": "Forbidden"}), 403
+
+    try:
+        seconds = float(request.args.get('seconds', 10))
+    except ValueError:
+        return json_response({"error": "seconds must be a number"}), 400
+
+    profile = sample_stacks(seconds)
+    if profile is None:
+        return json_response({"error": "A profiling session is already running"}), 409
+
+    if request.args.get('format') == 'json':
+        return json_response(profile)
+    return Response(collapsed_stacks(profile), mimetype='text/plain')
+
+
+@app.route('/admin/slow-requests', methods=['GET'])
+def admin_slow_requests():
+    # cProfile captures of requests slower than PROFILE_SLOW_REQUEST_MS
+    if not is_admin_request(request):
+        return json_response({"error": "Forbidden"}), 403
+    return json_response(list(slow_request_profiles))
+
+
+@app.route('/turnout', methods=['GET'])
+def turnout():
+    # ?election=<asset id>[&proposal=<name>][&window=<seconds>][&resolution=minute|hour]
+    election = request.args.get('election', type=int)
+    if not election:
+        return json_response({"error": "election is required"}), 400
+
+    try:
+        result = turnout_tracker.query(
+            election,
+            request.args.get('proposal'),
+            window=request.args.get('window', 3600, type=int),
+            resolution=request.args.get('resolution', 'minute')
+        )
+        return json_response(result)
+    except ValueError as e:
+        return json_response({"error": str(e)}), 400
+
+
+@app.route('/tallies', methods=['GET'])
+def region_tallies():
+    # ?election=<asset id>[&region=<Province/District>][&offset=<n>][&limit=<n>]
+    election = request.args.get('election', type=int)
+    if not election:
+        return json_response({"error": "election is required"}), 400
+
+    try:
+        result = get_region_tallies(
+            election,
+            request.args.get('region'),
+            offset=request.args.get('offset', 0, type=int),
+            limit=request.args.get('limit', type=int)
+        )
+        if result is None:
+            return json_response({"error": "No votes recorded for this region"}), 404
+        return json_response(result)
+    except ValueError as e:
+        return json_response({"error": str(e)}), 400
 
 
 def get_ai_response(user_input):
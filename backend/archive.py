@@ -0,0 +1,125 @@
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import ELECTION_ARCHIVE_DIR, ELECTION_ARCHIVE_CACHE_SIZE
+
+INDEX_FILE = "index.json"
+
+
+def _write_atomic(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class ElectionArchive:
+    """
+    Compressed on-disk store for closed elections and their frozen tallies.
+
+    Each election is one gzip-compressed JSON file. A small JSON index holds a
+    summary of every archived election (name, close time, totals), so listing
+    the archive never opens the election files. Full records are loaded only
+    when asked for and kept in a small LRU cache.
+    """
+
+    def __init__(self, directory=ELECTION_ARCHIVE_DIR, cache_size=ELECTION_ARCHIVE_CACHE_SIZE):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._index = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _election_path(self, asset_id):
+        return os.path.join(self.directory, f"{asset_id}.json.gz")
+
+    def _load_index(self):
+        """Read the index on first use (callers hold the lock)."""
+        if self._index is None:
+            path = self._index_path()
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    self._index = {int(asset_id): entry for asset_id, entry in json.load(f).items()}
+            else:
+                self._index = {}
+        return self._index
+
+    def archive(self, election):
+        """
+        Write a closed election to the archive and add it to the index.
+
+        Args:
+            election: Election record including "finalResults" and "closedAt"
+
+        Returns:
+            Index entry for the election
+        """
+        asset_id = election["assetId"]
+        results = election.get("finalResults") or {}
+        entry = {
+            "assetId": asset_id,
+            "electionName": election.get("electionName"),
+            "closedAt": election.get("closedAt"),
+            "archivedAt": int(time.time()),
+            "proposals": len(election.get("proposals", {})),
+            "votesCast": sum(proposal["votes"] for proposal in results.get("proposals", []))
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        body = json.dumps(election, separators=(",", ":")).encode("utf-8")
+        _write_atomic(self._election_path(asset_id), gzip.compress(body))
+
+        with self._lock:
+            index = self._load_index()
+            index[asset_id] = entry
+            _write_atomic(self._index_path(), json.dumps({str(key): value for key, value in index.items()}).encode("utf-8"))
+            self._cache.pop(asset_id, None)
+        return entry
+
+    def get(self, asset_id):
+        """
+        Load an archived election.
+
+        Returns:
+            The archived election record, or None if it is not in the archive
+        """
+        with self._lock:
+            if asset_id in self._cache:
+                self._cache.move_to_end(asset_id)
+                return self._cache[asset_id]
+            if asset_id not in self._load_index():
+                return None
+
+        with gzip.open(self._election_path(asset_id), "rt", encoding="utf-8") as f:
+            election = json.load(f)
+
+        with self._lock:
+            self._cache[asset_id] = election
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return election
+
+    def list(self):
+        """Index entries for every archived election, most recently closed first."""
+        with self._lock:
+            entries = list(self._load_index().values())
+        return sorted(entries, key=lambda entry: entry.get("closedAt") or 0, reverse=True)
+
+    def asset_ids(self):
+        with self._lock:
+            return set(self._load_index())
+
+    def __contains__(self, asset_id):
+        with self._lock:
+            return asset_id in self._load_index()
+
+
+# Shared archive of closed elections
+election_archive = ElectionArchive()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark for the quantum.py key backends.
+
+Compares keygen, encrypt and decrypt throughput for every available backend.
+
+Usage:
+    python bench_quantum.py [iterations]
+"""
+import sys
+import time
+
+from quantum import KEY_BACKENDS, generate_quantum_keypair, encrypt_vote, decrypt_vote
+
+SAMPLE_VOTE = {
+    "voter": "9001015009087",
+    "election": 123456,
+    "proposal": "Proposal A",
+    "voting_power": 1,
+    "timestamp": 1700000000
+}
+
+
+def _rate(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed, elapsed / iterations * 1000
+
+
+def benchmark_backend(algorithm, iterations):
+    """Return ops/sec and ms/op for keygen, encrypt and decrypt."""
+    # RSA keygen is slow; cap its iterations so the run stays short
+    keygen_iterations = max(1, iterations // 20) if algorithm == "rsa-4096" else iterations
+    keygen = _rate(lambda: generate_quantum_keypair(algorithm), keygen_iterations)
+
+    keys = generate_quantum_keypair(algorithm)
+    ciphertext = encrypt_vote(keys["public_key"], SAMPLE_VOTE)
+
+    encrypt = _rate(lambda: encrypt_vote(keys["public_key"], SAMPLE_VOTE), iterations)
+    decrypt = _rate(lambda: decrypt_vote(keys["private_key"], ciphertext), iterations)
+
+    return {
+        "keygen": keygen,
+        "encrypt": encrypt,
+        "decrypt": decrypt,
+        "public_key_bytes": len(keys["public_key"]),
+        "ciphertext_bytes": len(ciphertext) // 2
+    }
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    print(f"{'backend':<10} {'op':<8} {'ops/sec':>12} {'ms/op':>10}")
+    for algorithm, backend in KEY_BACKENDS.items():
+        if not backend.available:
+            print(f"{algorithm:<10} skipped (backend not available)")
+            continue
+
+        results = benchmark_backend(algorithm, iterations)
+        for op in ("keygen", "encrypt", "decrypt"):
+            rate, ms = results[op]
+            print(f"{algorithm:<10} {op:<8} {rate:>12.1f} {ms:>10.3f}")
+        print(f"{algorithm:<10} public key {results['public_key_bytes']} chars, "
+              f"ciphertext {results['ciphertext_bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,46 @@
 
 from algosdk import account, mnemonic
 from algosdk.v2client import algod, indexer
-from algosdk.future.transaction import AssetConfigTxn, AssetTransferTxn
-from algosdk.future.transaction import PaymentTxn, wait_for_confirmation
+from algosdk.transaction import AssetConfigTxn, AssetTransferTxn
+from algosdk.transaction import PaymentTxn, assign_group_id
 import json
 import time
 import base64
-from config import ALGORAND_ALGOD_ADDRESS, ALGORAND_ALGOD_TOKEN
+from confirmation import ConfirmationWatcher
+from node_pool import get_algod_pool
+from config import PROPOSAL_FUNDING_MICROALGOS
+from tracing import span, traced
+from txn_template import sign_asset_transfer
+from signing import signing_service, decode_private_key
+from jobs import mark_submitted
+
+# Maximum number of transactions in an Algorand atomic group
+MAX_GROUP_SIZE = 16
+
+# Note prefix on proposal opt-in transactions, used to recover proposal names from the chain
+PROPOSAL_NOTE_PREFIX = b"qv-proposal:"
 
 # Initialize Algorand client
 def get_algod_client():
-    """Get Algorand client for interacting with the blockchain."""
-    return algod.AlgodClient(ALGORAND_ALGOD_TOKEN, ALGORAND_ALGOD_ADDRESS)
+    """Get Algorand client for interacting with the blockchain (load balanced across nodes)."""
+    return get_algod_pool()
+
+# Shared watcher that confirms all submitted transactions once per round
+confirmation_watcher = ConfirmationWatcher(get_algod_client)
+
+def wait_for_transactions(txids, timeout=None):
+    """
+    Wait for a set of transactions to be confirmed.
+    
+    Args:
+        txids: List of transaction IDs
+        timeout: Optional timeout in seconds for each transaction
+        
+    Returns:
+        List of confirmation results ({"txid", "confirmed-round"})
+    """
+    with span("blockchain.confirm", transactions=len(txids)):
+        return confirmation_watcher.wait(txids, timeout=timeout)
 
 def create_account():
     """Create a new Algorand account."""
@@ -23,6 +52,7 @@ def create_account():
         "mnemonic": account_mnemonic
     }
 
+@traced()
 def create_voting_asset(creator_mnemonic, asset_name, total_votes):
     """
     Create a new Algorand asset to represent votes in an election.
@@ -35,11 +65,8 @@ def create_voting_asset(creator_mnemonic, asset_name, total_votes):
     Returns:
         Asset ID of the created voting token
     """
-    # Get the private key from mnemonic
-    private_key = mnemonic.to_private_key(creator_mnemonic)
-    
-    # Get creator address
-    sender = account.address_from_private_key(private_key)
+    # Load the creator's signing key (decoded once, then cached by address)
+    sender, signing_key = signing_service.load_mnemonic(creator_mnemonic)
     
     # Get algod client
     algod_client = get_algod_client()
@@ -64,13 +91,14 @@ def create_voting_asset(creator_mnemonic, asset_name, total_votes):
     )
     
     # Sign the transaction
-    signed_txn = txn.sign(private_key)
+    [(txid, signed_txn)] = signing_service.sign_transactions([txn], {sender: signing_key})
     
     # Send the transaction
-    txid = algod_client.send_transaction(signed_txn)
+    algod_client.send_raw_transaction(base64.b64encode(signed_txn).decode())
+    mark_submitted()
     
     # Wait for confirmation
-    wait_for_confirmation(algod_client, txid)
+    wait_for_transactions([txid])
     
     # Get the asset ID
     ptx = algod_client.pending_transaction_info(txid)
@@ -78,6 +106,102 @@ def create_voting_asset(creator_mnemonic, asset_name, total_votes):
     
     return asset_id
 
+@traced()
+def create_proposal_accounts(creator_mnemonic, asset_id, proposal_names, funding_amount=PROPOSAL_FUNDING_MICROALGOS):
+    """
+    Create, fund and opt in one Algorand account per proposal using atomic groups.
+    
+    Each proposal gets a funding payment from the creator and an asset opt-in
+    (tagged with the proposal name in the note). Pairs are packed into atomic
+    groups of up to 16 transactions, all groups are sent before waiting, and
+    every group is confirmed in a single pass.
+    
+    Args:
+        creator_mnemonic: Mnemonic of the creator account that pays for funding
+        asset_id: ID of the voting asset to opt the proposal accounts into
+        proposal_names: List of proposal names
+        funding_amount: MicroAlgos sent to each proposal account
+        
+    Returns:
+        List of proposal account details in the same order as proposal_names
+    """
+    # Load the creator's signing key once for all groups
+    creator_address, creator_key = signing_service.load_mnemonic(creator_mnemonic)
+    # New proposal accounts sign only their opt-in, so their keys are passed in rather than cached
+    keys = {creator_address: creator_key}
+    
+    # Get algod client
+    algod_client = get_algod_client()
+    
+    # Suggested parameters are shared by every transaction in the setup
+    params = algod_client.suggested_params()
+    
+    proposals = []
+    pairs_per_group = MAX_GROUP_SIZE // 2
+    groups = []
+    
+    for start in range(0, len(proposal_names), pairs_per_group):
+        txns = []
+        
+        for name in proposal_names[start:start + pairs_per_group]:
+            note = PROPOSAL_NOTE_PREFIX + name.encode()
+            if len(note) > 1024:
+                raise ValueError(f"Proposal name too long: {name}")
+            
+            proposal_account = create_account()
+            keys[proposal_account["address"]] = decode_private_key(proposal_account["private_key"])[1]
+            
+            # Fund the proposal account to cover its minimum balance and opt-in fee
+            fund_txn = PaymentTxn(
+                sender=creator_address,
+                sp=params,
+                receiver=proposal_account["address"],
+                amt=funding_amount
+            )
+            
+            # Opt the proposal account into the voting asset so it can receive votes
+            opt_in_txn = AssetTransferTxn(
+                sender=proposal_account["address"],
+                sp=params,
+                receiver=proposal_account["address"],
+                amt=0,
+                index=asset_id,
+                note=note
+            )
+            
+            txns.extend([fund_txn, opt_in_txn])
+            proposals.append({
+                "name": name,
+                "address": proposal_account["address"],
+                "mnemonic": proposal_account["mnemonic"]
+            })
+        
+        assign_group_id(txns)
+        groups.append(txns)
+    
+    # Sign every group in one parallel batch
+    signed = signing_service.sign_transactions([txn for txns in groups for txn in txns], keys)
+    
+    # Send every group without waiting, so all groups land in the same rounds
+    group_txids = []
+    offset = 0
+    for txns in groups:
+        group_signed = signed[offset:offset + len(txns)]
+        algod_client.send_raw_transaction(base64.b64encode(b"".join(blob for _, blob in group_signed)).decode())
+        mark_submitted()
+        group_txids.append(group_signed[0][0])
+        offset += len(txns)
+    
+    # Fund and opt-in transaction IDs alternate in the same order as the proposals
+    for proposal, index in zip(proposals, range(0, len(signed), 2)):
+        proposal["fundingTxid"] = signed[index][0]
+        proposal["optInTxid"] = signed[index + 1][0]
+    
+    # A group commits atomically, so confirming its first transaction confirms all of it
+    wait_for_transactions(group_txids)
+    
+    return proposals
+
 def transfer_votes(sender_mnemonic, receiver_address, asset_id, amount):
     """
     Transfer voting tokens to a voter.
@@ -91,11 +215,8 @@ def transfer_votes(sender_mnemonic, receiver_address, asset_id, amount):
     Returns:
         Transaction ID
     """
-    # Get the private key from mnemonic
-    private_key = mnemonic.to_private_key(sender_mnemonic)
-    
-    # Get sender address
-    sender = account.address_from_private_key(private_key)
+    # Load the sender's signing key (decoded once, then cached by address)
+    sender, signing_key = signing_service.load_mnemonic(sender_mnemonic)
     
     # Get algod client
     algod_client = get_algod_client()
@@ -103,26 +224,20 @@ def transfer_votes(sender_mnemonic, receiver_address, asset_id, amount):
     # Get suggested parameters
     params = algod_client.suggested_params()
     
-    # Create the asset transfer transaction
-    txn = AssetTransferTxn(
-        sender=sender,
-        sp=params,
-        receiver=receiver_address,
-        amt=amount,
-        index=asset_id
-    )
-    
-    # Sign the transaction
-    signed_txn = txn.sign(private_key)
+    # Build and sign the asset transfer from the pre-encoded template for this receiver
+    txid, signed_txn = sign_asset_transfer(
+        signing_key, params, receiver_address, asset_id, amount, sender=sender)
     
     # Send the transaction
-    txid = algod_client.send_transaction(signed_txn)
+    algod_client.send_raw_transaction(signed_txn)
+    mark_submitted()
     
     # Wait for confirmation
-    wait_for_confirmation(algod_client, txid)
+    wait_for_transactions([txid])
     
     return txid
 
+@traced()
 def submit_vote_to_blockchain(voter_mnemonic, proposal_address, asset_id, voting_power, vote_hash):
     """
     Submit a vote to the blockchain.
@@ -137,39 +252,34 @@ def submit_vote_to_blockchain(voter_mnemonic, proposal_address, asset_id, voting
     Returns:
         Transaction ID
     """
-    # Get the private key from mnemonic
-    private_key = mnemonic.to_private_key(voter_mnemonic)
-    
-    # Get voter address
-    sender = account.address_from_private_key(private_key)
+    # Load the voter's signing key (decoded once, then cached by address)
+    with span("blockchain.load_key"):
+        sender, signing_key = signing_service.load_mnemonic(voter_mnemonic)
     
     # Get algod client
     algod_client = get_algod_client()
     
     # Get suggested parameters
-    params = algod_client.suggested_params()
+    with span("blockchain.suggested_params"):
+        params = algod_client.suggested_params()
     
-    # Create the asset transfer transaction
-    txn = AssetTransferTxn(
-        sender=sender,
-        sp=params,
-        receiver=proposal_address,
-        amt=voting_power,
-        index=asset_id,
-        note=vote_hash.encode()
-    )
-    
-    # Sign the transaction
-    signed_txn = txn.sign(private_key)
+    # Build and sign the asset transfer from the pre-encoded template for this proposal
+    with span("blockchain.sign"):
+        txid, signed_txn = sign_asset_transfer(
+            signing_key, params, proposal_address, asset_id, voting_power,
+            vote_hash.encode(), sender=sender)
     
     # Send the transaction
-    txid = algod_client.send_transaction(signed_txn)
+    with span("blockchain.send", asset_id=asset_id, txid=txid):
+        algod_client.send_raw_transaction(signed_txn)
+    mark_submitted()
     
     # Wait for confirmation
-    wait_for_confirmation(algod_client, txid)
+    wait_for_transactions([txid])
     
     return txid
 
+@traced()
 def get_voting_results(asset_id, proposals):
     """
     Get the voting results for a specific election.
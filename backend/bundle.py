@@ -0,0 +1,264 @@
+"""
+Signed binary bundle format for batches of offline votes uploaded by kiosks.
+
+Layout (version 1, all integers big-endian):
+
+    header:  magic "QVB" | version u8 | flags u8 | kiosk id length u8 | kiosk id
+             | record count u32 | body length u32
+    body:    records, zlib-compressed when flags & FLAG_ZLIB
+    record:  record length u32 | voter id length u8 | voter id | election id u64
+             | timestamp u64 | ciphertext (rest of the record, raw bytes)
+    trailer: Ed25519 signature (64 bytes) over SHA-512(header + body)
+
+Signing a digest rather than the raw bytes lets the server hash the body as
+it streams in and verify the signature before ingesting any record.
+"""
+import hashlib
+import struct
+import tempfile
+import zlib
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from config import (
+    KIOSK_PUBLIC_KEYS, KIOSK_REGIONS, BUNDLE_MAX_BYTES, BUNDLE_MAX_RECORDS,
+    BUNDLE_MAX_RECORD_BYTES, BUNDLE_SPOOL_BYTES
+)
+from tallies import parse_region
+
+MAGIC = b"QVB"
+VERSION = 1
+FLAG_ZLIB = 0x01
+SIGNATURE_SIZE = 64
+CHUNK_SIZE = 64 * 1024
+
+_HEADER_PREFIX = struct.Struct(">3sBBB")
+_HEADER_COUNTS = struct.Struct(">II")
+_RECORD_LENGTH = struct.Struct(">I")
+_RECORD_FIELDS = struct.Struct(">QQ")
+
+# Registered kiosk public keys (raw 32-byte Ed25519) by kiosk ID
+kiosk_keys = {
+    kiosk_id: ed25519.Ed25519PublicKey.from_public_bytes(bytes.fromhex(public_key_hex))
+    for kiosk_id, public_key_hex in KIOSK_PUBLIC_KEYS.items()
+}
+
+# Region path of each kiosk's polling station by kiosk ID
+kiosk_regions = {kiosk_id: parse_region(region) for kiosk_id, region in KIOSK_REGIONS.items()}
+
+
+def register_kiosk_key(kiosk_id, public_key_bytes, region=None):
+    """Register the Ed25519 public key that a kiosk signs its bundles with (and the kiosk's region)."""
+    kiosk_keys[kiosk_id] = ed25519.Ed25519PublicKey.from_public_bytes(public_key_bytes)
+    if region:
+        kiosk_regions[kiosk_id] = parse_region(region)
+
+
+def build_bundle(kiosk_id, private_key, votes, compress=True):
+    """
+    Build a signed bundle (kiosk side).
+
+    Args:
+        kiosk_id: ID of the kiosk
+        private_key: Kiosk Ed25519PrivateKey
+        votes: Iterable of dicts with "voter_id", "election", "timestamp" and "ciphertext" (bytes)
+        compress: Compress the record body with zlib
+
+    Returns:
+        Bundle bytes
+    """
+    records = bytearray()
+    count = 0
+    for vote in votes:
+        voter_id = vote["voter_id"].encode()
+        payload = (
+            bytes([len(voter_id)]) + voter_id
+            + _RECORD_FIELDS.pack(vote.get("election") or 0, vote["timestamp"])
+            + vote["ciphertext"]
+        )
+        records += _RECORD_LENGTH.pack(len(payload)) + payload
+        count += 1
+
+    body = zlib.compress(bytes(records)) if compress else bytes(records)
+    kiosk = kiosk_id.encode()
+    header = (
+        _HEADER_PREFIX.pack(MAGIC, VERSION, FLAG_ZLIB if compress else 0, len(kiosk))
+        + kiosk
+        + _HEADER_COUNTS.pack(count, len(body))
+    )
+    signature = private_key.sign(hashlib.sha512(header + body).digest())
+    return header + body + signature
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if data is None or len(data) != size:
+        raise ValueError("Bundle is truncated")
+    return data
+
+
+def read_bundle_header(stream):
+    """
+    Read and validate a bundle header.
+
+    Returns:
+        (header dict, raw header bytes)
+    """
+    prefix = _read_exact(stream, _HEADER_PREFIX.size)
+    magic, version, flags, kiosk_length = _HEADER_PREFIX.unpack(prefix)
+    if magic != MAGIC:
+        raise ValueError("Not a vote bundle")
+    if version != VERSION:
+        raise ValueError(f"Unsupported bundle version: {version}")
+
+    kiosk = _read_exact(stream, kiosk_length)
+    counts = _read_exact(stream, _HEADER_COUNTS.size)
+    record_count, body_length = _HEADER_COUNTS.unpack(counts)
+
+    if record_count > BUNDLE_MAX_RECORDS:
+        raise ValueError("Bundle has too many records")
+    if body_length > BUNDLE_MAX_BYTES:
+        raise ValueError("Bundle is too large")
+
+    header = {
+        "version": version,
+        "compressed": bool(flags & FLAG_ZLIB),
+        "kiosk": kiosk.decode(),
+        "record_count": record_count,
+        "body_length": body_length
+    }
+    return header, prefix + kiosk + counts
+
+
+def _iter_body_chunks(spool, compressed):
+    """Yield decompressed body chunks from the spooled body."""
+    decompressor = zlib.decompressobj() if compressed else None
+    while True:
+        chunk = spool.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if decompressor:
+            # Bound each step so a small compressed chunk cannot expand without limit
+            chunk = decompressor.decompress(chunk, CHUNK_SIZE * 4)
+            yield chunk
+            while decompressor.unconsumed_tail:
+                yield decompressor.decompress(decompressor.unconsumed_tail, CHUNK_SIZE * 4)
+        else:
+            yield chunk
+    if decompressor:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+def iter_records(spool, header):
+    """
+    Parse records from a verified body without materialising the whole body.
+
+    Fields are read with struct.unpack_from on a memoryview of the current
+    buffer; only each ciphertext is copied out.
+
+    Yields:
+        Dicts with "voter_id", "election", "timestamp" and "ciphertext" (bytes)
+    """
+    buffer = bytearray()
+    offset = 0
+    parsed = 0
+
+    for chunk in _iter_body_chunks(spool, header["compressed"]):
+        # Drop consumed bytes before appending, so the buffer stays around one record
+        del buffer[:offset]
+        offset = 0
+        buffer += chunk
+
+        view = memoryview(buffer)
+        try:
+            while len(buffer) - offset >= _RECORD_LENGTH.size:
+                (length,) = _RECORD_LENGTH.unpack_from(view, offset)
+                if length > BUNDLE_MAX_RECORD_BYTES:
+                    raise ValueError("Bundle record is too large")
+                if length < 1 + _RECORD_FIELDS.size:
+                    raise ValueError("Malformed bundle record")
+                end = offset + _RECORD_LENGTH.size + length
+                if end > len(buffer):
+                    break
+
+                start = offset + _RECORD_LENGTH.size
+                voter_id_length = view[start]
+                fields_at = start + 1 + voter_id_length
+                if fields_at + _RECORD_FIELDS.size > end:
+                    raise ValueError("Malformed bundle record")
+
+                voter_id = bytes(view[start + 1:fields_at]).decode()
+                election, timestamp = _RECORD_FIELDS.unpack_from(view, fields_at)
+                ciphertext = bytes(view[fields_at + _RECORD_FIELDS.size:end])
+
+                parsed += 1
+                if parsed > header["record_count"]:
+                    raise ValueError("Bundle has more records than its header declares")
+
+                yield {
+                    "voter_id": voter_id,
+                    "election": election or None,
+                    "timestamp": timestamp,
+                    "ciphertext": ciphertext
+                }
+                offset = end
+        finally:
+            view.release()
+
+    if offset != len(buffer) or parsed != header["record_count"]:
+        raise ValueError("Bundle record count does not match its header")
+
+
+def ingest_bundle(stream, submit):
+    """
+    Validate a bundle from a stream and ingest its records.
+
+    The body is hashed while it is spooled (in memory up to BUNDLE_SPOOL_BYTES,
+    then on disk), the kiosk signature is checked, and only then are records
+    parsed one at a time and passed to submit.
+
+    Args:
+        stream: Readable binary stream (e.g. request.stream)
+        submit: Callable(record, kiosk_id) returning the ingest result for one record
+
+    Returns:
+        Dict with the kiosk ID, record count and per-record results
+    """
+    header, header_bytes = read_bundle_header(stream)
+    public_key = kiosk_keys.get(header["kiosk"])
+    if public_key is None:
+        raise ValueError(f"Unknown kiosk: {header['kiosk']}")
+
+    digest = hashlib.sha512(header_bytes)
+    with tempfile.SpooledTemporaryFile(max_size=BUNDLE_SPOOL_BYTES) as spool:
+        remaining = header["body_length"]
+        while remaining:
+            chunk = stream.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ValueError("Bundle is truncated")
+            digest.update(chunk)
+            spool.write(chunk)
+            remaining -= len(chunk)
+
+        signature = _read_exact(stream, SIGNATURE_SIZE)
+        try:
+            public_key.verify(signature, digest.digest())
+        except InvalidSignature:
+            raise ValueError("Invalid bundle signature")
+
+        # Validate every record first, so a malformed record rejects the whole bundle,
+        # then stream through again to ingest
+        spool.seek(0)
+        for _ in iter_records(spool, header):
+            pass
+
+        spool.seek(0)
+        results = [submit(record, header["kiosk"]) for record in iter_records(spool, header)]
+
+    return {
+        "kiosk": header["kiosk"],
+        "records": len(results),
+        "votes": results
+    }
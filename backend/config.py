@@ -1,7 +1,7 @@
 import os
 from dotenv import load_dotenv
 from flask import Flask, jsonify
-from algosdk import account, transaction
+from algosdk import account, encoding, transaction
 from algosdk.v2client import algod
 from algosdk.mnemonic import to_private_key
 
@@ -14,6 +14,152 @@ ALGORAND_ALGOD_TOKEN = ""  # No token needed for AlgoNode
 ALGORAND_INDEXER_ADDRESS = "https://testnet-idx.algonode.cloud"
 ALGORAND_INDEXER_TOKEN = ""  # No token needed for AlgoNode
 
+# "testnet" (default) or "simulator" to run against the in-process ledger simulator
+ALGORAND_NETWORK = os.getenv("ALGORAND_NETWORK", "testnet")
+
+# Log level for the backend's own messages (DEBUG, INFO, WARNING, ...)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Ledger simulator settings (round time 0 commits every submission immediately and
+# closes an empty round after the empty round time without submissions)
+SIMULATOR_ROUND_TIME = float(os.getenv("SIMULATOR_ROUND_TIME", "0"))
+SIMULATOR_EMPTY_ROUND_TIME = float(os.getenv("SIMULATOR_EMPTY_ROUND_TIME", "0.1"))
+SIMULATOR_AUTO_FUND_MICROALGOS = int(os.getenv("SIMULATOR_AUTO_FUND_MICROALGOS", "100000000"))
+SIMULATOR_VERIFY_SIGNATURES = os.getenv("SIMULATOR_VERIFY_SIGNATURES", "True").lower() in ("true", "1", "t")
+SIMULATOR_TXN_HISTORY = int(os.getenv("SIMULATOR_TXN_HISTORY", "100000"))
+
+# Comma-separated node lists for load balancing (default to the single nodes above)
+ALGORAND_ALGOD_ADDRESSES = [
+    address.strip() for address in os.getenv("ALGORAND_ALGOD_ADDRESSES", ALGORAND_ALGOD_ADDRESS).split(",")
+    if address.strip()
+]
+ALGORAND_INDEXER_ADDRESSES = [
+    address.strip() for address in os.getenv("ALGORAND_INDEXER_ADDRESSES", ALGORAND_INDEXER_ADDRESS).split(",")
+    if address.strip()
+]
+
+# Node pool health and hedging settings
+NODE_LATENCY_WINDOW = int(os.getenv("NODE_LATENCY_WINDOW", "200"))
+NODE_HEDGE_PERCENTILE = int(os.getenv("NODE_HEDGE_PERCENTILE", "95"))
+NODE_HEDGE_MIN_DELAY_MS = int(os.getenv("NODE_HEDGE_MIN_DELAY_MS", "50"))
+NODE_HEDGE_WORKERS = int(os.getenv("NODE_HEDGE_WORKERS", "16"))
+NODE_BREAKER_FAILURES = int(os.getenv("NODE_BREAKER_FAILURES", "3"))
+NODE_BREAKER_COOLDOWN = int(os.getenv("NODE_BREAKER_COOLDOWN", "30"))
+
+# MicroAlgos sent to each proposal account during election setup
+# (0.1 Algo minimum balance + 0.1 Algo per asset opt-in + fees)
+PROPOSAL_FUNDING_MICROALGOS = int(os.getenv("PROPOSAL_FUNDING_MICROALGOS", "210000"))
+
+# Background job settings
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "1"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "30"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+# Maximum concurrent jobs per job type
+JOB_CONCURRENCY_REGISTER = int(os.getenv("JOB_CONCURRENCY_REGISTER", "4"))
+JOB_CONCURRENCY_ELECTION = int(os.getenv("JOB_CONCURRENCY_ELECTION", "2"))
+JOB_CONCURRENCY_FUNDING = int(os.getenv("JOB_CONCURRENCY_FUNDING", "4"))
+
+# Admin endpoints (disabled when ADMIN_TOKEN is empty)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Profiling settings
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+# Keep cProfile output for requests slower than this (0 disables per-request profiling)
+PROFILE_SLOW_REQUEST_MS = int(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+PROFILE_SLOW_KEEP = int(os.getenv("PROFILE_SLOW_KEEP", "20"))
+
+# Request tracing: exporter "" (disabled), "file" (JSON lines) or "otlp" (OTLP/HTTP collector)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "").lower()
+TRACE_FILE_PATH = os.getenv("TRACE_FILE_PATH", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "quantum-voting-backend")
+# Fraction of requests traced; requests slower than TRACE_SLOW_MS are always kept (0 disables)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_MS = int(os.getenv("TRACE_SLOW_MS", "0"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "256"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "2"))
+
+# Traffic capture (set TRAFFIC_CAPTURE_PATH to record sanitized requests for replay.py)
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH", "")
+TRAFFIC_CAPTURE_ROUTES = [
+    route.strip() for route in os.getenv("TRAFFIC_CAPTURE_ROUTES", "/register,/cast-vote,/offline-vote,/results").split(",")
+    if route.strip()
+]
+TRAFFIC_FLUSH_EVERY = int(os.getenv("TRAFFIC_FLUSH_EVERY", "100"))
+
+# Offline vote bundles: kiosk Ed25519 public keys as "kiosk-id=hex,kiosk-id=hex"
+KIOSK_PUBLIC_KEYS = dict(
+    entry.strip().split("=", 1) for entry in os.getenv("KIOSK_PUBLIC_KEYS", "").split(",")
+    if "=" in entry
+)
+# Region of each polling-station kiosk as "kiosk-id=Province/District/Ward,..."; votes in
+# its signed bundles count towards that region's tally
+KIOSK_REGIONS = dict(
+    entry.strip().split("=", 1) for entry in os.getenv("KIOSK_REGIONS", "").split(",")
+    if "=" in entry
+)
+BUNDLE_MAX_BYTES = int(os.getenv("BUNDLE_MAX_BYTES", str(64 * 1024 * 1024)))
+BUNDLE_MAX_RECORDS = int(os.getenv("BUNDLE_MAX_RECORDS", "100000"))
+BUNDLE_MAX_RECORD_BYTES = int(os.getenv("BUNDLE_MAX_RECORD_BYTES", "16384"))
+# Bundle bodies larger than this are spooled to disk while the signature is checked
+BUNDLE_SPOOL_BYTES = int(os.getenv("BUNDLE_SPOOL_BYTES", str(1024 * 1024)))
+
+# Turnout tracking: minute buckets kept (24 hours) and hour buckets kept (30 days)
+TURNOUT_MINUTE_BUCKETS = int(os.getenv("TURNOUT_MINUTE_BUCKETS", "1440"))
+TURNOUT_HOUR_BUCKETS = int(os.getenv("TURNOUT_HOUR_BUCKETS", "720"))
+# Seconds a client-supplied vote time (offline votes, kiosk bundles) may be ahead of the server clock
+TURNOUT_MAX_CLOCK_SKEW = int(os.getenv("TURNOUT_MAX_CLOCK_SKEW", "300"))
+
+# Response serialization: compress JSON bodies at least this large (gzip, or brotli if installed)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+# Seconds that pre-serialized responses for hot read endpoints (e.g. /results) are reused
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "2"))
+
+# Idempotency keys on vote and funding endpoints: key lifetime, maximum keys kept,
+# and how long a retry waits for the original request to finish
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+
+# State recovery: address that creates election assets, local snapshot file and snapshot interval
+ELECTION_CREATOR_ADDRESS = os.getenv("ELECTION_CREATOR_ADDRESS", "")
+RECOVERY_SNAPSHOT_PATH = os.getenv("RECOVERY_SNAPSHOT_PATH", "election_snapshot.json")
+RECOVERY_SNAPSHOT_INTERVAL = int(os.getenv("RECOVERY_SNAPSHOT_INTERVAL", "60"))
+
+# Signing service: cached signing keys, seconds an unused key is kept, signing threads,
+# and the batch size from which signing is spread across the threads
+SIGNING_MAX_KEYS = int(os.getenv("SIGNING_MAX_KEYS", "100000"))
+SIGNING_KEY_TTL = int(os.getenv("SIGNING_KEY_TTL", "3600"))
+SIGNING_WORKERS = int(os.getenv("SIGNING_WORKERS", str(os.cpu_count() or 4)))
+SIGNING_PARALLEL_MIN = int(os.getenv("SIGNING_PARALLEL_MIN", "32"))
+
+# Closed elections: archive directory and number of archived elections kept in memory once loaded
+ELECTION_ARCHIVE_DIR = os.getenv("ELECTION_ARCHIVE_DIR", "election_archive")
+ELECTION_ARCHIVE_CACHE_SIZE = int(os.getenv("ELECTION_ARCHIVE_CACHE_SIZE", "32"))
+# Seconds close_election waits for votes already being submitted to finish before the final tally
+ELECTION_CLOSE_WAIT_SECONDS = float(os.getenv("ELECTION_CLOSE_WAIT_SECONDS", "120"))
+
+# Region hierarchy for vote tallies (top level first) and drill-down page sizes
+REGION_LEVELS = [level.strip() for level in os.getenv("REGION_LEVELS", "province,district,ward").split(",") if level.strip()]
+TALLY_PAGE_SIZE = int(os.getenv("TALLY_PAGE_SIZE", "50"))
+TALLY_MAX_PAGE_SIZE = int(os.getenv("TALLY_MAX_PAGE_SIZE", "500"))
+# Most sub-regions one region may have; votes for further new names count as unassigned
+TALLY_MAX_CHILDREN = int(os.getenv("TALLY_MAX_CHILDREN", "1000"))
+
+# Transaction confirmation settings
+CONFIRMATION_WAIT_ROUNDS = int(os.getenv("CONFIRMATION_WAIT_ROUNDS", "10"))
+CONFIRMATION_IDLE_ROUNDS = int(os.getenv("CONFIRMATION_IDLE_ROUNDS", "2"))
+CONFIRMATION_RECENT_ROUNDS = int(os.getenv("CONFIRMATION_RECENT_ROUNDS", "8"))
+CONFIRMATION_CATCHUP_ROUNDS = int(os.getenv("CONFIRMATION_CATCHUP_ROUNDS", "1000"))
+# While the node cannot be reached: longest pause between retries, and the seconds per
+# round used to turn a transaction's wait rounds into a deadline
+CONFIRMATION_RETRY_MAX_SECONDS = float(os.getenv("CONFIRMATION_RETRY_MAX_SECONDS", "5"))
+CONFIRMATION_ROUND_SECONDS = float(os.getenv("CONFIRMATION_ROUND_SECONDS", "4"))
+
 # Initialize the TestNet client
 algod_client = algod.AlgodClient(ALGORAND_ALGOD_TOKEN, ALGORAND_ALGOD_ADDRESS)
 
@@ -44,8 +190,10 @@ def fund_test_wallet(voter_wallet_address):
         treasury_private_key = to_private_key(os.getenv("TREASURY_MNEMONIC"))
         treasury_address = account.address_from_private_key(treasury_private_key)
 
-        # Get suggested parameters
-        params = algod_client.suggested_params()
+        # Get suggested parameters from the load-balanced node pool
+        from node_pool import get_algod_pool
+        pool = get_algod_pool()
+        params = pool.suggested_params()
         
         # Create a payment transaction
         txn = transaction.PaymentTxn(
@@ -59,10 +207,11 @@ def fund_test_wallet(voter_wallet_address):
         signed_txn = txn.sign(treasury_private_key)
         
         # Submit the transaction
-        txid = algod_client.send_transaction(signed_txn)
+        txid = pool.send_transaction(signed_txn)
         
-        # Wait for confirmation
-        transaction.wait_for_confirmation(algod_client, txid, 4)
+        # Wait for confirmation through the shared round watcher
+        from blockchain import wait_for_transactions
+        wait_for_transactions([txid])
         
         return {"success": True, "txid": txid}
     except Exception as e:
@@ -71,6 +220,8 @@ def fund_test_wallet(voter_wallet_address):
 # Quantum security parameters
 QUANTUM_KEY_SIZE = int(os.getenv("QUANTUM_KEY_SIZE", "256"))
 QUANTUM_CIRCUIT_DEPTH = int(os.getenv("QUANTUM_CIRCUIT_DEPTH", "3"))
+# Voter key backend: rsa-4096 (default), x25519 or kyber768 (requires liboqs-python)
+QUANTUM_KEM_ALGORITHM = os.getenv("QUANTUM_KEM_ALGORITHM", "rsa-4096")
 
 # Application settings
 DEBUG = os.getenv("DEBUG", "True").lower() in ("true", "1", "t")
@@ -134,12 +285,29 @@ def get_voter_address():
 def fund_voter_wallet(voter_wallet_address):
     """
     Sends a small amount of the specialized token (ASA) to the voter's wallet.
+
+    In a background job the signed transfer is saved before it is sent, and a
+    retry sends those same bytes again (unless the node already has them): a
+    signed transaction has one txid, so the voter is funded at most once.
     """
     try:
+        from node_pool import get_algod_pool
+        from jobs import job_progress, save_progress, mark_submitted
+        pool = get_algod_pool()
+
+        progress = job_progress()
+        if "signed_txn" in progress:
+            txid = progress["txid"]
+            if _transaction_known(pool, txid):
+                return {"success": True, "txid": txid}
+            pool.send_raw_transaction(progress["signed_txn"])
+            mark_submitted()
+            return {"success": True, "txid": txid}
+
         # Convert mnemonic to private key
         private_key = to_private_key(REGISTERED_CAUSE_WALLET_MNEMONIC)
-        # Get suggested transaction parameters
-        params = algod_client.suggested_params()
+        # Get suggested transaction parameters (node pool, or the simulator)
+        params = pool.suggested_params()
         # Define the ASA ID (replace with your ASA ID)
         asa_id = 123456  # Replace with the actual ASA ID
         # Create an asset transfer transaction
@@ -152,13 +320,49 @@ def fund_voter_wallet(voter_wallet_address):
         )
         # Sign the transaction
         signed_txn = txn.sign(private_key)
+        txid = signed_txn.get_txid()
+        encoded_txn = encoding.msgpack_encode(signed_txn)
+        save_progress(txid=txid, signed_txn=encoded_txn)
         # Submit the transaction
-        txid = algod_client.send_transaction(signed_txn)
+        pool.send_raw_transaction(encoded_txn)
+        mark_submitted()
         return {"success": True, "txid": txid}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
+def _transaction_known(pool, txid):
+    """Check whether the node already has a transaction (pending or confirmed)."""
+    try:
+        info = pool.pending_transaction_info(txid)
+    except Exception:
+        return False
+    return not info.get("pool-error")
+
+
+def fund_voter_job(voter_wallet_address):
+    """
+    Fund a voter's wallet as a background job.
+
+    fund_voter_wallet reports errors in its result; raise them instead, so the
+    job is marked as failed and retried.
+    """
+    result = fund_voter_wallet(voter_wallet_address)
+    if not result.get("success"):
+        raise RuntimeError(f"Funding failed: {result.get('error', 'unknown error')}")
+    return result
+
+
+def register_jobs(queue):
+    """
+    Register the job types of this module's endpoints.
+
+    Called once by jobs.py when the shared queue is created (this module is
+    imported by jobs.py, so it cannot import the queue while it loads).
+    """
+    queue.register("fund_voter", fund_voter_job, concurrency=JOB_CONCURRENCY_FUNDING)
+
+
 app = Flask(__name__)
 
 
@@ -174,9 +378,36 @@ def api_status():
 def fund_voter(voter_wallet):
     """
     API endpoint to fund a voter's wallet.
+    Pass ?async=true (or "Prefer: respond-async") to run it as a background job.
+    Retries that send the same Idempotency-Key header get the original response
+    instead of sending a second transfer.
     """
-    result = fund_voter_wallet(voter_wallet)
-    return jsonify(result)
+    from flask import request
+    from jobs import job_queue, wants_async
+    from idempotency import handle_idempotent
+
+    def fund():
+        if wants_async(request):
+            job_id = job_queue.submit("fund_voter", voter_wallet)
+            return jsonify({"jobId": job_id, "status": "queued", "statusUrl": f"/api/jobs/{job_id}"}), 202
+
+        result = fund_voter_wallet(voter_wallet)
+        return jsonify(result)
+
+    return handle_idempotent("fund-voter", fund)
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def fund_voter_job_status(job_id):
+    """
+    API endpoint to check the status and result of a background job.
+    """
+    from jobs import job_queue
+
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 
 @app.route('/api/vote-count', methods=['GET'])
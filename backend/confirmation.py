@@ -0,0 +1,265 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from config import (
+    CONFIRMATION_WAIT_ROUNDS, CONFIRMATION_IDLE_ROUNDS, CONFIRMATION_RECENT_ROUNDS, CONFIRMATION_CATCHUP_ROUNDS,
+    CONFIRMATION_RETRY_MAX_SECONDS, CONFIRMATION_ROUND_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# First pause before retrying after a node error (doubles up to CONFIRMATION_RETRY_MAX_SECONDS)
+RETRY_INITIAL_SECONDS = 0.1
+
+# A single watcher follows the chain one round at a time and checks every
+# pending transaction against each new block, instead of every caller polling
+# pending_transaction_info for its own txid.
+
+
+class ConfirmationWatcher:
+    def __init__(self, client_factory, wait_rounds=CONFIRMATION_WAIT_ROUNDS):
+        """
+        Args:
+            client_factory: Callable returning an algod client
+            wait_rounds: Default number of rounds to wait before giving up on a transaction
+        """
+        self._client_factory = client_factory
+        self._wait_rounds = wait_rounds
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+        # Last round scanned; kept when the watcher goes idle so the next
+        # thread resumes from there instead of skipping the rounds in between
+        self._last_round = None
+        # Latest round the watcher has seen on the chain; wait rounds count from it
+        self._chain_round = None
+        # Txids seen in the last few scanned rounds, so a transaction that
+        # confirms before it is registered is still resolved.
+        self._recent = deque()
+        self._recent_index = {}
+
+    def watch(self, txid, callback=None, wait_rounds=None):
+        """
+        Register a submitted transaction with the watcher.
+
+        Args:
+            txid: ID of the submitted transaction
+            callback: Optional callable invoked with the resolved future
+            wait_rounds: Rounds to wait before failing (defaults to the watcher setting)
+
+        Returns:
+            Future resolving to {"txid", "confirmed-round"}
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+
+        with self._lock:
+            if txid in self._recent_index:
+                future.set_result({"txid": txid, "confirmed-round": self._recent_index[txid]})
+                return future
+
+            entry = self._pending.get(txid)
+            if entry:
+                entry["futures"].append(future)
+                return future
+
+            running = self._thread is not None and self._thread.is_alive()
+            self._pending[txid] = {
+                "futures": [future],
+                # An idle watcher does not know the chain tip; the next thread sets it
+                "start_round": self._chain_round if running else None,
+                "wait_rounds": wait_rounds or self._wait_rounds,
+                "registered_at": time.time()
+            }
+
+            if not running:
+                self._thread = threading.Thread(target=self._run, name="confirmation-watcher", daemon=True)
+                self._thread.start()
+
+        return future
+
+    def wait(self, txids, timeout=None):
+        """
+        Block until every transaction in txids is confirmed.
+
+        Args:
+            txids: Iterable of transaction IDs
+            timeout: Optional timeout in seconds for each transaction
+
+        Returns:
+            List of confirmation results in the same order as txids
+        """
+        futures = [self.watch(txid) for txid in txids]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        client = self._client_factory()
+        idle_rounds = 0
+        failures = 0
+        current_round = None
+
+        while True:
+            try:
+                if current_round is None:
+                    current_round = self._start(client)
+
+                with self._lock:
+                    if not self._pending:
+                        idle_rounds += 1
+                        if idle_rounds > CONFIRMATION_IDLE_ROUNDS:
+                            self._thread = None
+                            return
+                    else:
+                        idle_rounds = 0
+
+                status = client.status_after_block(current_round)
+                new_round = status["last-round"]
+                with self._lock:
+                    self._chain_round = new_round
+                self._scan_rounds(client, current_round, new_round)
+                current_round = new_round
+                failures = 0
+            except Exception as e:
+                # A timeout or node restart must not fail transactions that may
+                # still confirm: back off and resume after the last scanned round
+                failures += 1
+                logger.warning("Confirmation watcher error (attempt %d): %s", failures, e)
+                with self._lock:
+                    if not self._pending:
+                        self._thread = None
+                        return
+                    if self._last_round is not None and current_round is not None:
+                        current_round = self._last_round
+                self._fail_overdue(client, e)
+                time.sleep(min(CONFIRMATION_RETRY_MAX_SECONDS, RETRY_INITIAL_SECONDS * 2 ** (failures - 1)))
+
+    def _start(self, client):
+        """Find the chain tip and scan the rounds missed while idle. Returns the round reached."""
+        current_round = client.status()["last-round"]
+        with self._lock:
+            self._chain_round = current_round
+            for entry in self._pending.values():
+                if entry["start_round"] is None:
+                    entry["start_round"] = current_round
+            last_round = self._last_round
+
+        # Resume after the last round an earlier thread scanned so nothing
+        # committed while the watcher was idle is missed (after a long idle
+        # spell, older rounds are left to the check before a transaction
+        # fails). The round current at startup is always scanned, since a
+        # transaction sent just before the watcher started may be in it.
+        if last_round is None or current_round - last_round > CONFIRMATION_CATCHUP_ROUNDS:
+            last_round = current_round - 1
+        self._scan_rounds(client, min(last_round, current_round - 1), current_round)
+        return current_round
+
+    def _fail_overdue(self, client, error):
+        """
+        While rounds cannot be followed, fail transactions past their deadline
+        (wait rounds at CONFIRMATION_ROUND_SECONDS each) that the node does not report as confirmed.
+        """
+        now = time.time()
+        with self._lock:
+            overdue = [
+                (txid, self._pending.pop(txid)) for txid, entry in list(self._pending.items())
+                if now - entry["registered_at"] >= entry["wait_rounds"] * CONFIRMATION_ROUND_SECONDS
+            ]
+
+        for txid, entry in overdue:
+            confirmed_round = self._confirmed_round(client, txid)
+            for future in entry["futures"]:
+                if confirmed_round:
+                    future.set_result({"txid": txid, "confirmed-round": confirmed_round})
+                else:
+                    future.set_exception(error)
+
+    def _scan_rounds(self, client, after_round, last_round):
+        """Scan every round in (after_round, last_round] and resolve confirmed transactions."""
+        for round_number in range(after_round + 1, last_round + 1):
+            # Always fetch the txids: a transaction can land in this round before
+            # its sender registers it, and is then found in the recent-round cache
+            confirmed = self._get_block_txids(client, round_number)
+
+            resolved = []
+            expired = []
+            with self._lock:
+                self._remember_round(confirmed)
+                self._last_round = max(self._last_round or 0, round_number)
+
+                for txid in list(self._pending):
+                    entry = self._pending[txid]
+                    if entry["start_round"] is None:
+                        entry["start_round"] = round_number
+
+                    if txid in confirmed:
+                        resolved.append((entry, {"txid": txid, "confirmed-round": confirmed[txid]}, None))
+                        del self._pending[txid]
+                    elif round_number - entry["start_round"] >= entry["wait_rounds"]:
+                        expired.append((txid, self._pending.pop(txid)))
+
+            # A transaction that confirmed before it was registered and has left
+            # the recent-round cache is only visible to the node; ask it before failing
+            for txid, entry in expired:
+                confirmed_round = self._confirmed_round(client, txid)
+                if confirmed_round:
+                    resolved.append((entry, {"txid": txid, "confirmed-round": confirmed_round}, None))
+                else:
+                    error = Exception(f"Transaction {txid} not confirmed after {entry['wait_rounds']} rounds")
+                    resolved.append((entry, None, error))
+
+            # Resolve outside the lock so callbacks can register new transactions
+            for entry, result, error in resolved:
+                for future in entry["futures"]:
+                    if error:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(result)
+
+    @staticmethod
+    def _confirmed_round(client, txid):
+        """Round a transaction was confirmed in according to the node, or None."""
+        try:
+            return client.pending_transaction_info(txid).get("confirmed-round") or None
+        except Exception:
+            return None
+
+    def _get_block_txids(self, client, round_number):
+        """Return {txid: confirmed round} for the transactions committed in a round."""
+        try:
+            response = client.algod_request("GET", f"/blocks/{round_number}/txids")
+            return dict.fromkeys(response.get("blockTxids") or [], round_number)
+        except Exception:
+            # Older nodes lack the txids endpoint; fall back to one lookup per
+            # pending transaction, which reports the round it actually confirmed in.
+            with self._lock:
+                pending = list(self._pending)
+            confirmed = {}
+            for txid in pending:
+                info = client.pending_transaction_info(txid)
+                if info.get("confirmed-round", 0) > 0:
+                    confirmed[txid] = info["confirmed-round"]
+                elif info.get("pool-error"):
+                    with self._lock:
+                        entry = self._pending.pop(txid, None)
+                    if entry:
+                        for future in entry["futures"]:
+                            future.set_exception(Exception(f"Transaction {txid} rejected: {info['pool-error']}"))
+            return confirmed
+
+    def _remember_round(self, confirmed):
+        self._recent.append(confirmed)
+        self._recent_index.update(confirmed)
+
+        while len(self._recent) > CONFIRMATION_RECENT_ROUNDS:
+            old = self._recent.popleft()
+            for txid, confirmed_round in old.items():
+                if self._recent_index.get(txid) == confirmed_round:
+                    self._recent_index.pop(txid, None)
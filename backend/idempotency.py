@@ -0,0 +1,208 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config import IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_WAIT_SECONDS
+from jobs import submission_count
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# Entry states
+IN_FLIGHT = "in_flight"
+COMPLETED = "completed"
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused for a different request."""
+
+
+class IdempotencyIndex:
+    """
+    Bounded map of idempotency key -> in-flight or completed response.
+
+    The first request with a key owns it and runs the handler; retries with
+    the same key wait for that request and get its stored response instead of
+    submitting again. Entries expire IDEMPOTENCY_TTL seconds after they were
+    created, and the oldest entries are evicted once there are more than
+    IDEMPOTENCY_MAX_KEYS of them.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, max_keys=IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        # Insertion order is creation order, so expired entries are at the front
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now, room=0):
+        """Drop expired entries, then the oldest ones until `room` more entries fit."""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry["createdAt"] <= self.ttl and len(self._entries) + room <= self.max_keys:
+                break
+            del self._entries[key]
+
+    def begin(self, scope, key, fingerprint):
+        """
+        Claim a key, or find the request that already holds it.
+
+        Args:
+            scope: Endpoint the key belongs to (keys are not shared between endpoints)
+            key: Client-supplied idempotency key
+            fingerprint: Hash of the request, to detect a key reused for a different request
+
+        Returns:
+            (entry, owner) where owner is True if the caller must run the request
+
+        Raises:
+            IdempotencyConflict: The key was used for a different request
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get((scope, key))
+            if entry is not None:
+                if entry["fingerprint"] != fingerprint:
+                    raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+                return entry, False
+
+            # Only make room for a new key, so a retry never evicts the entry it is looking for
+            self._evict(now, room=1)
+            entry = {
+                "status": IN_FLIGHT,
+                "fingerprint": fingerprint,
+                "createdAt": now,
+                "response": None,
+                "done": threading.Event()
+            }
+            self._entries[(scope, key)] = entry
+            return entry, True
+
+    def complete(self, entry, response):
+        """Store the response for an owned entry and release any waiting retries."""
+        entry["response"] = response
+        entry["status"] = COMPLETED
+        entry["done"].set()
+
+    def release(self, scope, key, entry):
+        """Forget an owned entry whose request never produced a response, so it can be retried."""
+        with self._lock:
+            if self._entries.get((scope, key)) is entry:
+                del self._entries[(scope, key)]
+        entry["done"].set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+# Shared index for vote and funding endpoints
+idempotency_index = IdempotencyIndex()
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path}\n".encode())
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _stored_response(response):
+    """
+    Keep what is needed to replay a Flask response.
+
+    The body is stored uncompressed: the retry may accept different encodings
+    than the original request, so it is encoded again for each replay.
+    """
+    from serialization import SerializedBody, decompress
+
+    body = decompress(response.get_data(), response.headers.get("Content-Encoding"))
+    return {
+        "status": response.status_code,
+        "body": SerializedBody(body),
+        "headers": [
+            (name, value) for name, value in response.headers.items()
+            if name in ("Content-Type", "Location")
+        ]
+    }
+
+
+def _replay(stored):
+    response = stored["body"].response(stored["status"])
+    for name, value in stored["headers"]:
+        response.headers[name] = value
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def handle_idempotent(scope, handler):
+    """
+    Run a request handler at most once per Idempotency-Key.
+
+    Requests without the header run as usual. The first request with a key
+    runs the handler and its response is stored; retries with the same key
+    and the same method, path and body get that response, waiting up to
+    IDEMPOTENCY_WAIT_SECONDS if it is still in flight. If the handler raises,
+    or returns a server error before sending any transaction, the key is
+    released so the request can be retried. A server error after a send is
+    stored like any other response, since running again could send twice.
+
+    Args:
+        scope: Endpoint name the key is scoped to
+        handler: Callable returning a Flask response value
+
+    Returns:
+        Flask response
+    """
+    from flask import request, make_response
+    from serialization import json_response
+
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return json_response({"error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"}, 400)
+
+    try:
+        entry, owner = idempotency_index.begin(scope, key, _fingerprint(request))
+    except IdempotencyConflict as e:
+        return json_response({"error": str(e)}, 422)
+
+    if not owner:
+        # Attach to the original submission instead of sending a new transaction
+        if not entry["done"].wait(IDEMPOTENCY_WAIT_SECONDS) or entry["response"] is None:
+            response = json_response({"error": "A request with this Idempotency-Key is still in progress"}, 409)
+            response.headers["Retry-After"] = "1"
+            return response
+        return _replay(entry["response"])
+
+    submissions = submission_count()
+    try:
+        response = make_response(handler())
+    except BaseException:
+        idempotency_index.release(scope, key, entry)
+        raise
+
+    if response.status_code >= 500 and submission_count() == submissions:
+        idempotency_index.release(scope, key, entry)
+        return response
+
+    idempotency_index.complete(entry, _stored_response(response))
+    response.headers[REPLAYED_HEADER] = "false"
+    return response
+
+
+def idempotent(scope):
+    """Decorator form of handle_idempotent for Flask routes."""
+    def decorator(route):
+        @functools.wraps(route)
+        def wrapper(*args, **kwargs):
+            return handle_idempotent(scope, lambda: route(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
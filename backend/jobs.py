@@ -0,0 +1,272 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from config import (
+    JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_DELAY,
+    JOB_RETRY_MAX_DELAY, JOB_RESULT_TTL, register_jobs
+)
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Local job queue with a worker pool for long-running operations.
+
+    Job types are registered with a handler, a retry limit and an optional
+    concurrency bound. Failed jobs are retried with exponential backoff;
+    ValueError is treated as a permanent failure and is not retried. Neither
+    is an attempt that failed after sending a transaction (see mark_submitted):
+    handlers record finished steps with save_progress, and a retry resumes
+    after them instead of repeating on-chain work.
+    """
+
+    def __init__(self, workers=JOB_WORKERS):
+        self._workers = workers
+        self._types = {}
+        self._jobs = {}
+        # Ready heap of (run_at, sequence, job_id)
+        self._ready = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def register(self, job_type, handler, max_attempts=JOB_MAX_ATTEMPTS, concurrency=None):
+        """
+        Register a job type.
+
+        Args:
+            job_type: Name of the job type
+            handler: Callable run with the job's args and kwargs
+            max_attempts: Maximum number of attempts including the first
+            concurrency: Maximum number of jobs of this type running at once (None for unbounded)
+        """
+        with self._condition:
+            self._types[job_type] = {
+                "handler": handler,
+                "max_attempts": max_attempts,
+                "concurrency": concurrency,
+                "running": 0,
+                "deferred": deque()
+            }
+
+    def is_registered(self, job_type):
+        with self._condition:
+            return job_type in self._types
+
+    def submit(self, job_type, *args, **kwargs):
+        """
+        Queue a job.
+
+        Returns:
+            Job ID
+        """
+        if job_type not in self._types:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._condition:
+            self._purge_expired(now)
+            self._jobs[job_id] = {
+                "id": job_id,
+                "type": job_type,
+                "status": QUEUED,
+                "attempts": 0,
+                "createdAt": now,
+                "startedAt": None,
+                "finishedAt": None,
+                "result": None,
+                "error": None,
+                "args": args,
+                "kwargs": kwargs,
+                # Steps finished by earlier attempts, and whether this attempt has sent
+                # a transaction since its last saved step
+                "progress": {},
+                "submitted": False
+            }
+            heapq.heappush(self._ready, (now, next(self._sequence), job_id))
+            self._ensure_workers()
+            self._condition.notify()
+
+        return job_id
+
+    def get(self, job_id):
+        """
+        Get the public status of a job.
+
+        Returns:
+            Job status dict or None if the job is unknown or expired
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None
+            return {
+                key: value for key, value in job.items()
+                if key not in ("args", "kwargs", "progress", "submitted")
+            }
+
+    def _ensure_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self._workers:
+            thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_job(self):
+        """Block until a job is ready and its type has a free concurrency slot."""
+        with self._condition:
+            while True:
+                now = time.time()
+                if self._ready and self._ready[0][0] <= now:
+                    _, _, job_id = heapq.heappop(self._ready)
+                    job = self._jobs.get(job_id)
+                    if not job:
+                        continue
+
+                    job_type = self._types[job["type"]]
+                    if job_type["concurrency"] is not None and job_type["running"] >= job_type["concurrency"]:
+                        # Park it until a job of the same type finishes
+                        job_type["deferred"].append(job_id)
+                        continue
+
+                    job_type["running"] += 1
+                    job["status"] = RUNNING
+                    job["attempts"] += 1
+                    job["startedAt"] = now
+                    job["submitted"] = False
+                    return job
+
+                timeout = self._ready[0][0] - now if self._ready else None
+                self._condition.wait(timeout)
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            job_type = self._types[job["type"]]
+
+            _local.current = (self, job)
+            try:
+                result = job_type["handler"](*job["args"], **job["kwargs"])
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+                logger.exception("Job %s (%s) failed on attempt %d", job["id"], job["type"], job["attempts"])
+            finally:
+                _local.current = None
+
+            with self._condition:
+                job_type["running"] -= 1
+                if job_type["deferred"]:
+                    heapq.heappush(self._ready, (time.time(), next(self._sequence), job_type["deferred"].popleft()))
+
+                now = time.time()
+                if error is None:
+                    job.update(status=SUCCEEDED, result=result, finishedAt=now)
+                elif isinstance(error, ValueError) or job["attempts"] >= job_type["max_attempts"]:
+                    job.update(status=FAILED, error=str(error), finishedAt=now)
+                elif job["submitted"]:
+                    # Running it again could send the same funds or create a second asset
+                    job.update(status=FAILED, error=f"{error} (not retried: transactions were already submitted)",
+                               finishedAt=now)
+                else:
+                    # Exponential backoff before the next attempt
+                    delay = min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * (2 ** (job["attempts"] - 1)))
+                    job.update(status=RETRYING, error=str(error))
+                    heapq.heappush(self._ready, (now + delay, next(self._sequence), job["id"]))
+
+                self._condition.notify_all()
+
+    def _purge_expired(self, now):
+        """Drop finished jobs older than JOB_RESULT_TTL."""
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finishedAt"] and now - job["finishedAt"] > JOB_RESULT_TTL
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+_local = threading.local()
+
+
+def _current_job():
+    return getattr(_local, "current", None) or (None, None)
+
+
+def job_progress():
+    """
+    Get the steps saved by earlier attempts of the job running on this thread.
+
+    Returns:
+        Dict of saved values (empty on the first attempt or outside a job)
+    """
+    queue, job = _current_job()
+    if job is None:
+        return {}
+    with queue._condition:
+        return dict(job["progress"])
+
+
+def save_progress(**values):
+    """
+    Record finished steps of the job running on this thread (e.g. a created
+    asset ID), so a retry can resume after them. No-op outside a job.
+    """
+    queue, job = _current_job()
+    if job is None:
+        return
+    with queue._condition:
+        job["progress"].update(values)
+        job["submitted"] = False
+
+
+def mark_submitted():
+    """
+    Note that the job running on this thread has sent a transaction. If the
+    attempt then fails before its next save_progress, the job is not retried.
+    Outside a job the send is only counted (see submission_count).
+    """
+    _local.submissions = submission_count() + 1
+    queue, job = _current_job()
+    if job is None:
+        return
+    with queue._condition:
+        job["submitted"] = True
+
+
+def submission_count():
+    """Number of transactions sent so far on this thread, in jobs and request handlers alike."""
+    return getattr(_local, "submissions", 0)
+
+
+def wants_async(request):
+    """
+    Check whether a request asked to run as a background job,
+    either with ?async=true or a "Prefer: respond-async" header.
+    """
+    if request.args.get("async", "").lower() in ("true", "1", "t"):
+        return True
+    return "respond-async" in request.headers.get("Prefer", "")
+
+
+# Shared job queue for the backend
+job_queue = JobQueue()
+
+# Job types of the endpoints defined in config.py
+register_jobs(job_queue)
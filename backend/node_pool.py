@@ -0,0 +1,289 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from algosdk.v2client import algod, indexer
+from config import (
+    ALGORAND_NETWORK, ALGORAND_ALGOD_ADDRESSES, ALGORAND_ALGOD_TOKEN,
+    ALGORAND_INDEXER_ADDRESSES, ALGORAND_INDEXER_TOKEN,
+    NODE_LATENCY_WINDOW, NODE_HEDGE_PERCENTILE, NODE_HEDGE_MIN_DELAY_MS,
+    NODE_BREAKER_FAILURES, NODE_BREAKER_COOLDOWN, NODE_HEDGE_WORKERS
+)
+from tracing import span
+
+# Read-only calls that are safe to send to a second node when the first is slow
+ALGOD_HEDGED_METHODS = {
+    "account_info", "pending_transaction_info", "suggested_params",
+    "status", "asset_info", "block_info"
+}
+
+# Long-polling calls: routed to a healthy node but kept out of latency stats
+UNTRACKED_METHODS = {"status_after_block"}
+
+# Shared pool for hedged requests. Calls only take a worker that is idle
+# (see NodePool._submit), so they never queue behind each other
+_hedge_executor = ThreadPoolExecutor(max_workers=NODE_HEDGE_WORKERS, thread_name_prefix="node-hedge")
+_hedge_slots = threading.BoundedSemaphore(NODE_HEDGE_WORKERS)
+
+
+class NodeEndpoint:
+    """Health and latency tracking for a single algod or indexer node."""
+
+    def __init__(self, address, client):
+        self.address = address
+        self.client = client
+        self.latencies = deque(maxlen=NODE_LATENCY_WINDOW)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        # Start time of the trial call let through an open breaker (None when no trial is running)
+        self.trial_started = None
+        self._lock = threading.Lock()
+
+    def is_available(self, now):
+        """
+        Check the circuit breaker without changing it.
+
+        An open breaker lets a single trial call through once the cooldown has
+        passed. A trial that has not reported back within another cooldown is
+        given up, so a lost call cannot keep the node out of rotation.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if now - self.opened_at < NODE_BREAKER_COOLDOWN:
+                return False
+            return self.trial_started is None or now - self.trial_started >= NODE_BREAKER_COOLDOWN
+
+    def start_call(self, now):
+        """Claim the trial when a call is actually sent to a node whose breaker is open."""
+        with self._lock:
+            if self.opened_at is not None:
+                self.trial_started = now
+
+    def record_success(self, elapsed=None):
+        with self._lock:
+            if elapsed is not None:
+                self.latencies.append(elapsed)
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.trial_started is not None or self.consecutive_failures >= NODE_BREAKER_FAILURES:
+                self.opened_at = time.time()
+            self.trial_started = None
+
+    def average_latency(self):
+        with self._lock:
+            if not self.latencies:
+                # Unmeasured nodes sort first so they get probed
+                return 0.0
+            return sum(self.latencies) / len(self.latencies)
+
+    def percentile_latency(self, percentile):
+        with self._lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+    def stats(self):
+        with self._lock:
+            available = self.opened_at is None
+            consecutive_failures = self.consecutive_failures
+        return {
+            "address": self.address,
+            "available": available,
+            "consecutive_failures": consecutive_failures,
+            "average_latency_ms": round(self.average_latency() * 1000, 2),
+            "p95_latency_ms": round((self.percentile_latency(95) or 0) * 1000, 2)
+        }
+
+
+def _is_node_failure(error):
+    """HTTP 4xx responses mean the node is healthy but rejected the request."""
+    code = getattr(error, "code", None)
+    return not (isinstance(code, int) and 400 <= code < 500)
+
+
+class NodePool:
+    """
+    Client that spreads calls across several algod or indexer nodes.
+
+    Calls are routed to the fastest available node. Calls listed in
+    hedged_methods are re-sent to the next fastest node when the first has
+    not answered within its p95 latency, and the first successful answer wins
+    (while every hedge worker is busy they run unhedged on the caller's thread).
+    Nodes that keep failing are taken out of rotation by a circuit breaker.
+    """
+
+    def __init__(self, endpoints, hedged_methods=None, hedge_all=False, kind="node"):
+        """
+        Args:
+            endpoints: List of (address, client) pairs
+            hedged_methods: Names of read-only methods that may be hedged
+            hedge_all: Treat every method as read-only (used for the indexer)
+            kind: Label used in trace span names ("algod" or "indexer")
+        """
+        if not endpoints:
+            raise ValueError("At least one node endpoint is required")
+        self.kind = kind
+        self.endpoints = [NodeEndpoint(address, client) for address, client in endpoints]
+        self.hedged_methods = hedged_methods or set()
+        self.hedge_all = hedge_all
+
+    def __getattr__(self, name):
+        attribute = getattr(self.endpoints[0].client, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self._call(name, args, kwargs)
+
+        return call
+
+    def stats(self):
+        """Return health and latency details for each node."""
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+    def _ranked_endpoints(self):
+        now = time.time()
+        available = [endpoint for endpoint in self.endpoints if endpoint.is_available(now)]
+        if not available:
+            # Every breaker is open; try the node that failed longest ago
+            available = sorted(self.endpoints, key=lambda endpoint: endpoint.opened_at or 0)[:1]
+        return sorted(available, key=lambda endpoint: endpoint.average_latency())
+
+    def _call(self, name, args, kwargs):
+        ranked = self._ranked_endpoints()
+        hedged = name in self.hedged_methods or self.hedge_all
+
+        if hedged and len(ranked) > 1:
+            return self._hedged_call(ranked, name, args, kwargs)
+        return self._invoke(ranked[0], name, args, kwargs)
+
+    def _invoke(self, endpoint, name, args, kwargs):
+        endpoint.start_call(time.time())
+        start = time.perf_counter()
+        try:
+            with span(f"{self.kind}.{name}", node=endpoint.address):
+                result = getattr(endpoint.client, name)(*args, **kwargs)
+        except Exception as e:
+            if _is_node_failure(e):
+                endpoint.record_failure()
+            else:
+                endpoint.record_success()
+            raise
+        elapsed = time.perf_counter() - start
+        endpoint.record_success(None if name in UNTRACKED_METHODS else elapsed)
+        return result
+
+    def _submit(self, endpoint, name, args, kwargs):
+        """Start a call on an idle hedge worker. Returns its future, or None when every worker is busy."""
+        if not _hedge_slots.acquire(blocking=False):
+            return None
+
+        def run():
+            try:
+                return self._invoke(endpoint, name, args, kwargs)
+            finally:
+                _hedge_slots.release()
+
+        # Hedge workers run in a copy of the caller's context so their spans join its trace
+        return _hedge_executor.submit(contextvars.copy_context().run, run)
+
+    def _hedged_call(self, ranked, name, args, kwargs):
+        primary = ranked[0]
+        delay = primary.percentile_latency(NODE_HEDGE_PERCENTILE)
+        delay = max(delay or 0, NODE_HEDGE_MIN_DELAY_MS / 1000)
+
+        # Calls start on an idle worker straight away, so the hedge delay counts
+        # from when the primary call is sent. With every worker busy the call
+        # runs unhedged on this thread rather than waiting for one.
+        future = self._submit(primary, name, args, kwargs)
+        if future is None:
+            return self._invoke(primary, name, args, kwargs)
+
+        futures = {future}
+        backups = list(ranked[1:])
+        last_error = None
+
+        done, _ = wait(futures, timeout=delay)
+        while True:
+            for future in done:
+                futures.discard(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+
+            # Either the hedge delay passed or a node failed: bring in the next node
+            if backups:
+                future = self._submit(backups[0], name, args, kwargs)
+                if future is not None:
+                    futures.add(future)
+                    backups.pop(0)
+                elif not futures:
+                    # Failing over with every worker busy: try the next node on this thread
+                    try:
+                        return self._invoke(backups.pop(0), name, args, kwargs)
+                    except Exception as e:
+                        last_error = e
+                        done = set()
+                        continue
+            elif not futures:
+                raise last_error
+
+            done, _ = wait(futures, timeout=delay if backups else None, return_when=FIRST_COMPLETED)
+
+
+_algod_pool = None
+_indexer_pool = None
+_pool_lock = threading.Lock()
+
+
+def set_clients(algod_client=None, indexer_client=None):
+    """Replace the shared algod and/or indexer clients (e.g. with the ledger simulator)."""
+    global _algod_pool, _indexer_pool
+    with _pool_lock:
+        if algod_client is not None:
+            _algod_pool = algod_client
+        if indexer_client is not None:
+            _indexer_pool = indexer_client
+
+
+def get_algod_pool():
+    """Get the shared algod client pool (or the simulator when ALGORAND_NETWORK=simulator)."""
+    global _algod_pool
+    with _pool_lock:
+        if _algod_pool is None and ALGORAND_NETWORK == "simulator":
+            from simulator import SimulatedAlgodClient, get_ledger
+            _algod_pool = SimulatedAlgodClient(get_ledger())
+        elif _algod_pool is None:
+            _algod_pool = NodePool(
+                [(address, algod.AlgodClient(ALGORAND_ALGOD_TOKEN, address)) for address in ALGORAND_ALGOD_ADDRESSES],
+                hedged_methods=ALGOD_HEDGED_METHODS,
+                kind="algod"
+            )
+        return _algod_pool
+
+
+def get_indexer_pool():
+    """Get the shared indexer client pool. All indexer calls are read-only and may be hedged."""
+    global _indexer_pool
+    with _pool_lock:
+        if _indexer_pool is None and ALGORAND_NETWORK == "simulator":
+            from simulator import SimulatedIndexerClient, get_ledger
+            _indexer_pool = SimulatedIndexerClient(get_ledger())
+        elif _indexer_pool is None:
+            _indexer_pool = NodePool(
+                [(address, indexer.IndexerClient(ALGORAND_INDEXER_TOKEN, address)) for address in ALGORAND_INDEXER_ADDRESSES],
+                hedge_all=True,
+                kind="indexer"
+            )
+        return _indexer_pool
@@ -0,0 +1,127 @@
+import cProfile
+import functools
+import hmac
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from config import (
+    ADMIN_TOKEN, PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_SLOW_REQUEST_MS, PROFILE_SLOW_KEEP
+)
+
+# Only one sampling session at a time per worker
+_sampling_lock = threading.Lock()
+
+# Most recent slow-request profiles
+slow_request_profiles = deque(maxlen=PROFILE_SLOW_KEEP)
+
+
+def is_admin_request(request):
+    """Check the X-Admin-Token header. Admin endpoints are disabled when ADMIN_TOKEN is unset."""
+    if not ADMIN_TOKEN:
+        return False
+    # Constant-time comparison, so response timing does not leak how much of the token matched
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), ADMIN_TOKEN.encode())
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}"
+
+
+def sample_stacks(seconds, interval_ms=PROFILE_SAMPLE_INTERVAL_MS):
+    """
+    Sample the Python stacks of every other thread in this worker.
+
+    Args:
+        seconds: How long to sample for (capped at PROFILE_MAX_SECONDS)
+        interval_ms: Delay between samples in milliseconds
+
+    Returns:
+        Dict with sample count, duration and collapsed stack counts
+        ("thread;outer;...;inner" -> samples), or None if a session is already running
+    """
+    if not _sampling_lock.acquire(blocking=False):
+        return None
+
+    try:
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        interval = interval_ms / 1000
+        own_thread = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+
+        start = time.perf_counter()
+        deadline = start + seconds
+        while time.perf_counter() < deadline:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(thread_names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(labels))] += 1
+
+            samples += 1
+            time.sleep(interval)
+
+        return {
+            "samples": samples,
+            "duration": round(time.perf_counter() - start, 3),
+            "interval_ms": interval_ms,
+            "stacks": dict(stacks.most_common())
+        }
+    finally:
+        _sampling_lock.release()
+
+
+def collapsed_stacks(profile):
+    """Render sampled stacks in the collapsed format used by flamegraph.pl and speedscope."""
+    return "\n".join(f"{stack} {count}" for stack, count in profile["stacks"].items()) + "\n"
+
+
+def profile_slow_requests(route):
+    """
+    Decorator that runs cProfile around a route and keeps the profile
+    when the request takes longer than PROFILE_SLOW_REQUEST_MS.
+    Does nothing when PROFILE_SLOW_REQUEST_MS is 0.
+    """
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        if PROFILE_SLOW_REQUEST_MS <= 0:
+            return route(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active on this interpreter
+            return route(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return route(*args, **kwargs)
+        finally:
+            profile.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            if elapsed_ms >= PROFILE_SLOW_REQUEST_MS:
+                output = io.StringIO()
+                pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(40)
+                slow_request_profiles.append({
+                    "route": route.__name__,
+                    "elapsed_ms": round(elapsed_ms, 2),
+                    "timestamp": int(time.time()),
+                    "stats": output.getvalue()
+                })
+
+    return wrapper
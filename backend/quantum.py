@@ -1,104 +1,266 @@
 
 import hashlib
 import os
+import base64
 from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import x25519
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import numpy as np
+from config import QUANTUM_KEM_ALGORITHM
+from tracing import traced
+
+# Optional lattice KEM support via liboqs-python
+try:
+    import oqs
+except ImportError:
+    oqs = None
 
 # In a real quantum voting system, you would use actual quantum algorithms
 # This is a simplified version for demonstration purposes
 
-def generate_quantum_keypair():
+# Keys are stored as "<algorithm>:<key>" so the right backend is used to
+# encrypt and decrypt. Untagged PEM keys predate tagging and are RSA.
+KEY_TAG_SEPARATOR = ":"
+HKDF_INFO = b"quantum-vote-encryption"
+
+
+def _derive_key(shared_secret):
+    """Derive a 256-bit AES key from a KEM shared secret."""
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=HKDF_INFO
+    ).derive(shared_secret)
+
+
+class RSABackend:
+    """RSA-4096 with OAEP padding (the original backend)."""
+    name = "rsa-4096"
+    available = True
+
+    def generate_keypair(self):
+        private_key = rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=4096  # Larger key size for better security
+        )
+
+        private_pem = private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ).decode('utf-8')
+
+        public_pem = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode('utf-8')
+
+        return private_pem, public_pem
+
+    def encrypt(self, public_key_pem, plaintext):
+        public_key = serialization.load_pem_public_key(public_key_pem.encode('utf-8'))
+        return public_key.encrypt(
+            plaintext,
+            padding.OAEP(
+                mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                algorithm=hashes.SHA256(),
+                label=None
+            )
+        )
+
+    def decrypt(self, private_key_pem, ciphertext):
+        private_key = serialization.load_pem_private_key(
+            private_key_pem.encode('utf-8'),
+            password=None
+        )
+        return private_key.decrypt(
+            ciphertext,
+            padding.OAEP(
+                mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                algorithm=hashes.SHA256(),
+                label=None
+            )
+        )
+
+
+class X25519Backend:
+    """
+    Elliptic-curve hybrid encryption: ephemeral X25519 key agreement, HKDF and AES-GCM.
+    Ciphertext layout: ephemeral public key (32) | nonce (12) | AES-GCM ciphertext.
+    """
+    name = "x25519"
+    available = True
+
+    def generate_keypair(self):
+        private_key = x25519.X25519PrivateKey.generate()
+        private_raw = private_key.private_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PrivateFormat.Raw,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        public_raw = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        return base64.b64encode(private_raw).decode('utf-8'), base64.b64encode(public_raw).decode('utf-8')
+
+    def encrypt(self, public_key_b64, plaintext):
+        public_key = x25519.X25519PublicKey.from_public_bytes(base64.b64decode(public_key_b64))
+        ephemeral_key = x25519.X25519PrivateKey.generate()
+        shared_secret = ephemeral_key.exchange(public_key)
+
+        ephemeral_public = ephemeral_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        nonce = os.urandom(12)
+        ciphertext = AESGCM(_derive_key(shared_secret)).encrypt(nonce, plaintext, ephemeral_public)
+        return ephemeral_public + nonce + ciphertext
+
+    def decrypt(self, private_key_b64, ciphertext):
+        private_key = x25519.X25519PrivateKey.from_private_bytes(base64.b64decode(private_key_b64))
+        ephemeral_public, nonce, body = ciphertext[:32], ciphertext[32:44], ciphertext[44:]
+
+        shared_secret = private_key.exchange(x25519.X25519PublicKey.from_public_bytes(ephemeral_public))
+        return AESGCM(_derive_key(shared_secret)).decrypt(nonce, body, ephemeral_public)
+
+
+class KyberBackend:
+    """
+    Lattice KEM (ML-KEM / Kyber768) through liboqs, combined with HKDF and AES-GCM.
+    Ciphertext layout: KEM ciphertext length (2) | KEM ciphertext | nonce (12) | AES-GCM ciphertext.
+    Requires the optional liboqs-python package.
+    """
+    name = "kyber768"
+    kem_name = "Kyber768"
+    available = oqs is not None
+
+    def _kem(self, secret_key=None):
+        if oqs is None:
+            raise RuntimeError("The kyber768 backend requires liboqs-python (pip install liboqs-python)")
+        return oqs.KeyEncapsulation(self.kem_name, secret_key)
+
+    def generate_keypair(self):
+        with self._kem() as kem:
+            public_key = kem.generate_keypair()
+            secret_key = kem.export_secret_key()
+        return base64.b64encode(secret_key).decode('utf-8'), base64.b64encode(public_key).decode('utf-8')
+
+    def encrypt(self, public_key_b64, plaintext):
+        with self._kem() as kem:
+            kem_ciphertext, shared_secret = kem.encap_secret(base64.b64decode(public_key_b64))
+
+        nonce = os.urandom(12)
+        ciphertext = AESGCM(_derive_key(shared_secret)).encrypt(nonce, plaintext, kem_ciphertext)
+        return len(kem_ciphertext).to_bytes(2, 'big') + kem_ciphertext + nonce + ciphertext
+
+    def decrypt(self, private_key_b64, ciphertext):
+        kem_length = int.from_bytes(ciphertext[:2], 'big')
+        kem_ciphertext = ciphertext[2:2 + kem_length]
+        nonce = ciphertext[2 + kem_length:14 + kem_length]
+        body = ciphertext[14 + kem_length:]
+
+        with self._kem(base64.b64decode(private_key_b64)) as kem:
+            shared_secret = kem.decap_secret(kem_ciphertext)
+        return AESGCM(_derive_key(shared_secret)).decrypt(nonce, body, kem_ciphertext)
+
+
+# Registered key/KEM backends by algorithm name
+KEY_BACKENDS = {
+    backend.name: backend
+    for backend in (RSABackend(), X25519Backend(), KyberBackend())
+}
+
+
+def get_key_backend(algorithm=None):
+    """
+    Get a key backend by algorithm name.
+
+    Args:
+        algorithm: Backend name (defaults to QUANTUM_KEM_ALGORITHM)
+
+    Returns:
+        Backend instance
+    """
+    algorithm = algorithm or QUANTUM_KEM_ALGORITHM
+    if algorithm not in KEY_BACKENDS:
+        raise ValueError(f"Unknown key algorithm: {algorithm}")
+    return KEY_BACKENDS[algorithm]
+
+
+def _split_tagged_key(tagged_key):
+    """Return (backend, raw key) for a stored key."""
+    if tagged_key.startswith("-----BEGIN"):
+        return KEY_BACKENDS[RSABackend.name], tagged_key
+
+    # Never echo the key in errors: it may be a private key
+    algorithm, separator, key = tagged_key.partition(KEY_TAG_SEPARATOR)
+    if not separator or algorithm not in KEY_BACKENDS:
+        raise ValueError("Key is not tagged with a known key algorithm")
+    return KEY_BACKENDS[algorithm], key
+
+
+@traced()
+def generate_quantum_keypair(algorithm=None):
     """
     Generate a quantum-resistant keypair.
     In a real implementation, this would use post-quantum cryptography algorithms.
-    For demonstration, we're using RSA with large key sizes.
+    The backend is selected by QUANTUM_KEM_ALGORITHM (rsa-4096, x25519 or kyber768)
+    and the keys are tagged with the algorithm name.
     """
-    # Generate a private key
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=4096  # Larger key size for better security
-    )
-    
-    # Extract the public key
-    public_key = private_key.public_key()
-    
-    # Serialize the keys to PEM format
-    private_pem = private_key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption()
-    ).decode('utf-8')
-    
-    public_pem = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    ).decode('utf-8')
-    
+    backend = get_key_backend(algorithm)
+    private_key, public_key = backend.generate_keypair()
+
     return {
-        "private_key": private_pem,
-        "public_key": public_pem
+        "private_key": f"{backend.name}{KEY_TAG_SEPARATOR}{private_key}",
+        "public_key": f"{backend.name}{KEY_TAG_SEPARATOR}{public_key}",
+        "algorithm": backend.name
     }
 
-def encrypt_vote(public_key_pem, vote_data):
+@traced()
+def encrypt_vote(public_key, vote_data):
     """
     Encrypt vote data using the public key.
     """
-    # Convert PEM string to public key object
-    public_key = serialization.load_pem_public_key(
-        public_key_pem.encode('utf-8')
-    )
-    
+    backend, raw_key = _split_tagged_key(public_key)
+
     # Convert vote data to bytes
     vote_bytes = str(vote_data).encode('utf-8')
-    
+
     # Encrypt the vote data
-    ciphertext = public_key.encrypt(
-        vote_bytes,
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None
-        )
-    )
-    
+    ciphertext = backend.encrypt(raw_key, vote_bytes)
+
     return ciphertext.hex()
 
-def decrypt_vote(private_key_pem, encrypted_vote_hex):
+@traced()
+def decrypt_vote(private_key, encrypted_vote_hex):
     """
     Decrypt vote data using the private key.
     """
-    # Convert PEM string to private key object
-    private_key = serialization.load_pem_private_key(
-        private_key_pem.encode('utf-8'),
-        password=None
-    )
-    
+    backend, raw_key = _split_tagged_key(private_key)
+
     # Convert hex to bytes
     ciphertext = bytes.fromhex(encrypted_vote_hex)
-    
+
     # Decrypt the vote data
-    plaintext = private_key.decrypt(
-        ciphertext,
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None
-        )
-    )
-    
+    plaintext = backend.decrypt(raw_key, ciphertext)
+
     return plaintext.decode('utf-8')
 
+@traced()
 def generate_vote_hash(vote_data):
     """
     Generate a hash of the vote data for verification.
     """
     # Convert vote data to string and encode to bytes
     vote_str = str(vote_data).encode('utf-8')
-    
+
     # Generate SHA-256 hash
     hash_obj = hashlib.sha256(vote_str)
-    
+
     return hash_obj.hexdigest()
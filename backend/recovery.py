@@ -0,0 +1,278 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+from config import ELECTION_CREATOR_ADDRESS, RECOVERY_SNAPSHOT_PATH, RECOVERY_SNAPSHOT_INTERVAL
+from blockchain import PROPOSAL_NOTE_PREFIX
+from node_pool import get_indexer_pool
+
+logger = logging.getLogger(__name__)
+
+# Page size for indexer searches
+PAGE_SIZE = 1000
+
+
+def _paginate(search, key, **kwargs):
+    """Yield every item from a paginated indexer search."""
+    next_page = None
+    while True:
+        response = search(limit=PAGE_SIZE, next_page=next_page, **kwargs)
+        items = response.get(key, [])
+        yield from items
+        next_page = response.get("next-token")
+        if not next_page or not items:
+            break
+
+
+def _election_record(asset):
+    params = asset.get("params", {})
+    return {
+        "assetId": asset["index"],
+        "electionName": params.get("name"),
+        "totalVotes": params.get("total"),
+        "creator": None,
+        "multisigAdmin": None,
+        "proposals": {}
+    }
+
+
+def _funding_groups(indexer_client, creator_address, min_round=None):
+    """
+    Collect (group ID, receiver) for every grouped payment sent by the creator.
+
+    setup_election funds each proposal account in the same atomic group as its
+    opt-in, so a tagged opt-in is only trusted when the creator funded its
+    sender in that group; anyone can send an opt-in with the tag in its note.
+    """
+    search_kwargs = {"min_round": min_round} if min_round else {}
+    funded = set()
+    for txn in _paginate(
+        indexer_client.search_transactions, "transactions",
+        address=creator_address, address_role="sender", txn_type="pay", **search_kwargs
+    ):
+        if txn.get("sender") == creator_address and txn.get("group"):
+            funded.add((txn["group"], txn.get("payment-transaction", {}).get("receiver")))
+    return funded
+
+
+def _scan_proposals(indexer_client, election, funded, min_round=None):
+    """
+    Add proposals for an election from tagged opt-ins in creator funding groups.
+
+    Proposals added one at a time with add_proposal have no opt-in on chain
+    and are only restored from the snapshot. Other holders of the asset (voters
+    who received VOTE tokens) are never taken for proposals.
+    """
+    asset_id = election["assetId"]
+    known_addresses = {proposal["address"] for proposal in election["proposals"].values()}
+    search_kwargs = {"min_round": min_round} if min_round else {}
+
+    for txn in _paginate(
+        indexer_client.search_transactions, "transactions",
+        asset_id=asset_id, txn_type="axfer", note_prefix=PROPOSAL_NOTE_PREFIX, **search_kwargs
+    ):
+        address = txn["sender"]
+        if (txn.get("group"), address) not in funded:
+            continue
+        name = base64.b64decode(txn.get("note", ""))[len(PROPOSAL_NOTE_PREFIX):].decode(errors="replace")
+        if address in known_addresses or name in election["proposals"]:
+            continue
+        election["proposals"][name] = {"name": name, "details": None, "address": address, "mnemonic": None}
+        known_addresses.add(address)
+
+
+def scan_chain(elections, creator_address, min_round=None, exclude=()):
+    """
+    Rebuild elections created by creator_address from the indexer.
+
+    With min_round only rounds from min_round onwards are scanned: new voting
+    assets are found from asset-config transactions. Without it every VOTE
+    asset of the creator is scanned. Proposals come from tagged opt-ins.
+
+    Args:
+        elections: Dict of asset ID -> election record, updated in place
+        creator_address: Address that created the voting assets
+        min_round: First round to scan (None for a full scan)
+        exclude: Asset IDs to leave out (e.g. archived elections)
+
+    Returns:
+        Round the indexer had reached before scanning (the new watermark)
+    """
+    indexer_client = get_indexer_pool()
+    watermark = indexer_client.health()["round"]
+
+    if min_round:
+        for txn in _paginate(
+            indexer_client.search_transactions, "transactions",
+            address=creator_address, txn_type="acfg", min_round=min_round
+        ):
+            asset_id = txn.get("created-asset-index")
+            if asset_id and asset_id not in elections and asset_id not in exclude:
+                params = txn.get("asset-config-transaction", {}).get("params", {})
+                if params.get("unit-name") == "VOTE":
+                    elections[asset_id] = _election_record({"index": asset_id, "params": params})
+    else:
+        for asset in _paginate(indexer_client.search_assets, "assets", creator=creator_address, unit="VOTE"):
+            if asset["index"] not in elections and asset["index"] not in exclude:
+                elections[asset["index"]] = _election_record(asset)
+
+    funded = _funding_groups(indexer_client, creator_address, min_round)
+    for election in list(elections.values()):
+        if election.get("status", "open") != "open":
+            # Closed elections keep the proposals their tally was frozen with
+            continue
+        _scan_proposals(indexer_client, election, funded, min_round)
+
+    return watermark
+
+
+def save_snapshot(elections, watermark, path=RECOVERY_SNAPSHOT_PATH, region_tallies=None):
+    """Atomically write elections, their region tally trees and the round watermark to a local snapshot."""
+    snapshot = {
+        "round": watermark,
+        "savedAt": int(time.time()),
+        "elections": {str(asset_id): election for asset_id, election in elections.items()},
+        "regionTallies": {str(asset_id): tree for asset_id, tree in (region_tallies or {}).items()}
+    }
+    # Encode in one call: the C encoder does not release the GIL, so the
+    # elections cannot change halfway through (json.dump writes in chunks)
+    data = json.dumps(snapshot)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path=RECOVERY_SNAPSHOT_PATH):
+    """
+    Load a local snapshot.
+
+    Returns:
+        (elections dict, watermark round, region tally trees by asset ID),
+        or ({}, None, {}) if there is no snapshot
+    """
+    if not os.path.exists(path):
+        return {}, None, {}
+    with open(path, "r") as f:
+        snapshot = json.load(f)
+    elections = {int(asset_id): election for asset_id, election in snapshot["elections"].items()}
+    # Snapshots written before region tallies were saved have none
+    region_tallies = {int(asset_id): tree for asset_id, tree in snapshot.get("regionTallies", {}).items()}
+    return elections, snapshot["round"], region_tallies
+
+
+class StateRecovery:
+    """Restores active elections at startup and keeps a periodic local snapshot."""
+
+    def __init__(self, elections, creator_address=ELECTION_CREATOR_ADDRESS, path=RECOVERY_SNAPSHOT_PATH,
+                 archive=None, tallies=None):
+        """
+        Args:
+            elections: The live active_elections dict, restored and snapshotted in place
+            creator_address: Address that creates voting assets
+            path: Snapshot file path
+            archive: ElectionArchive whose elections must not be restored into the hot set
+            tallies: RegionTally whose trees are snapshotted with the elections
+                (region tallies are not on the chain, so a scan cannot rebuild them)
+        """
+        self.elections = elections
+        self.archive = archive
+        self.tallies = tallies
+        self.creator_address = creator_address
+        self.path = path
+        self.watermark = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def recover(self):
+        """
+        Load the snapshot, then replay only rounds after its watermark
+        (or do a full chain scan when there is no snapshot).
+
+        Returns:
+            Number of elections restored
+        """
+        elections, watermark, region_tallies = load_snapshot(self.path)
+        archived = self._archived()
+        for asset_id, election in elections.items():
+            if asset_id not in archived:
+                self.elections.setdefault(asset_id, election)
+                if self.tallies is not None and asset_id in region_tallies:
+                    self.tallies.restore(asset_id, region_tallies[asset_id])
+
+        if self.creator_address:
+            with self._lock:
+                min_round = watermark + 1 if watermark is not None else None
+                self.watermark = self._scan(min_round)
+            self.snapshot()
+        else:
+            self.watermark = watermark
+
+        return len(self.elections)
+
+    def _archived(self):
+        return self.archive.asset_ids() if self.archive is not None else set()
+
+    def _scan(self, min_round):
+        """
+        Scan the chain and merge what it finds into the live elections (callers hold the lock).
+
+        The scan works on copies; new elections are added whole and an
+        election's proposals are replaced by a new dict rather than changed in
+        place, so request threads iterating the live state never see it change.
+
+        Returns:
+            The new watermark
+        """
+        working = {
+            asset_id: {**election, "proposals": dict(election["proposals"])}
+            for asset_id, election in list(self.elections.items())
+        }
+        watermark = scan_chain(working, self.creator_address, min_round, self._archived())
+
+        archived = self._archived()
+        for asset_id, election in working.items():
+            live = self.elections.get(asset_id)
+            if live is None:
+                if asset_id not in archived:
+                    self.elections.setdefault(asset_id, election)
+            elif election["proposals"].keys() - live["proposals"].keys():
+                live["proposals"] = {**election["proposals"], **live["proposals"]}
+        return watermark
+
+    def snapshot(self):
+        """Write the current state with the watermark of the last chain scan."""
+        with self._lock:
+            elections = dict(self.elections)
+            region_tallies = {}
+            if self.tallies is not None:
+                for asset_id in elections:
+                    tree = self.tallies.export(asset_id)
+                    if tree is not None:
+                        region_tallies[asset_id] = tree
+            save_snapshot(elections, self.watermark or 0, self.path, region_tallies)
+
+    def refresh(self):
+        """Pick up elections created elsewhere since the last scan, then snapshot."""
+        if self.creator_address:
+            with self._lock:
+                min_round = self.watermark + 1 if self.watermark is not None else None
+                self.watermark = self._scan(min_round)
+        self.snapshot()
+
+    def start(self, interval=RECOVERY_SNAPSHOT_INTERVAL):
+        """Refresh and snapshot in the background every `interval` seconds."""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception("Snapshot failed")
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=run, name="state-snapshot", daemon=True)
+            self._thread.start()
@@ -0,0 +1,227 @@
+"""
+Replay a captured traffic session against the backend.
+
+By default the backend runs in this process (importing app.py, so every
+module it imports must be installed, including baidu_ernie) and blockchain
+and DHA calls are served by local stand-ins, so a capture can be replayed
+offline at any speed. With --url the requests are sent over HTTP to a running
+server instead (e.g. one started with ALGORAND_NETWORK=simulator), and app.py
+is not imported. Reports throughput, latency percentiles and error rates per
+route.
+
+Usage:
+    python replay.py capture.jsonl.gz [--speed 10] [--concurrency 32] [--chain-latency-ms 0]
+                     [--url http://localhost:5000] [--session N] [--json]
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from traffic import read_capture
+
+# Asset ID that the /cast-vote balance check looks for
+CAST_VOTE_ASSET_ID = 123456
+
+
+class StandInIndexer:
+    """Indexer stand-in that reports a large voting-token balance for every account."""
+
+    def account_info(self, address, **kwargs):
+        return {"account": {"address": address, "assets": [{"asset-id": CAST_VOTE_ASSET_ID, "amount": 10 ** 9}]}}
+
+
+def install_stand_ins(chain_latency_ms=0):
+    """
+    Replace blockchain and DHA calls with local stand-ins.
+
+    Args:
+        chain_latency_ms: Simulated latency for each blockchain call
+    """
+    import app
+    import voting
+    from smart_id import SmartIDVerification
+
+    counter = itertools.count(1)
+    delay = chain_latency_ms / 1000
+
+    def chain_call(result):
+        if delay:
+            time.sleep(delay)
+        return result
+
+    voting.create_voting_asset = lambda creator_mnemonic, asset_name, total_votes: chain_call(
+        1000000 + next(counter))
+    voting.submit_vote_to_blockchain = lambda *args, **kwargs: chain_call(f"REPLAYTX{next(counter):020d}")
+    voting.transfer_votes = lambda *args, **kwargs: chain_call(f"REPLAYTX{next(counter):020d}")
+    voting.get_voting_results = lambda asset_id, proposals: chain_call({proposal: 0 for proposal in proposals})
+    voting.create_proposal_accounts = lambda creator_mnemonic, asset_id, names, **kwargs: chain_call([
+        {"name": name, "address": f"REPLAYADDR{next(counter)}", "mnemonic": "<stand-in>", "optInTxid": ""}
+        for name in names
+    ])
+
+    SmartIDVerification.verify_id_number = lambda self, id_number: {
+        "verified": True,
+        "id_number": id_number,
+        "citizenship_status": "Citizen",
+        "verification_timestamp": int(time.time())
+    }
+
+    app.indexer_client = StandInIndexer()
+    return app.app
+
+
+def seed_elections(entries):
+    """Create the elections and proposals that captured votes refer to."""
+    import voting
+
+    for entry in entries:
+        body = entry.get("b") or {}
+        if entry["p"] != "/cast-vote" or "asset_id" not in body:
+            continue
+
+        election = voting.active_elections.setdefault(body["asset_id"], {
+            "assetId": body["asset_id"],
+            "electionName": f"Replay election {body['asset_id']}",
+            "totalVotes": 0,
+            "creator": None,
+            "multisigAdmin": None,
+            "proposals": {}
+        })
+        name = body.get("proposal_name")
+        if name and name not in election["proposals"]:
+            election["proposals"][name] = {
+                "name": name,
+                "details": None,
+                "address": f"REPLAYPROPOSAL{len(election['proposals'])}",
+                "mnemonic": "<stand-in>"
+            }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def app_sender(app):
+    """Send requests to a Flask app in this process. Returns a callable(method, path, body) -> status."""
+    def send_request(method, path, body):
+        return app.test_client().open(path, method=method, json=body).status_code
+
+    return send_request
+
+
+def http_sender(base_url, timeout=60):
+    """Send requests to a running server over HTTP. Returns a callable(method, path, body) -> status."""
+    base_url = base_url.rstrip("/")
+
+    def send_request(method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        request = urllib.request.Request(base_url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    return send_request
+
+
+def replay(send_request, entries, speed=1.0, concurrency=32):
+    """
+    Replay entries, keeping their relative timing scaled by speed.
+
+    Args:
+        send_request: Callable(method, path, body) returning the status code (see app_sender, http_sender)
+
+    Returns:
+        Dict of route -> {"latencies": [...], "errors": int}
+    """
+    stats = defaultdict(lambda: {"latencies": [], "errors": 0})
+    lock = threading.Lock()
+
+    def send(entry):
+        path = entry["p"] + (f"?{entry['q']}" if entry.get("q") else "")
+        start = time.perf_counter()
+        try:
+            failed = send_request(entry["m"], path, entry.get("b")) >= 400
+        except Exception:
+            failed = True
+        elapsed = (time.perf_counter() - start) * 1000
+
+        with lock:
+            stats[entry["p"]]["latencies"].append(elapsed)
+            if failed:
+                stats[entry["p"]]["errors"] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for entry in entries:
+            wait = entry["t"] / speed - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+            executor.submit(send, entry)
+
+    return stats, time.perf_counter() - start
+
+
+def report(stats, duration):
+    """Summarise replay results per route."""
+    summary = {}
+    for route, route_stats in sorted(stats.items()):
+        latencies = route_stats["latencies"]
+        summary[route] = {
+            "requests": len(latencies),
+            "throughput_rps": round(len(latencies) / duration, 2) if duration else 0,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "error_rate": round(route_stats["errors"] / len(latencies), 4) if latencies else 0
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured backend traffic")
+    parser.add_argument("capture", help="Capture file written by the traffic recorder")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier (1, 10, 100, ...)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum in-flight requests")
+    parser.add_argument("--chain-latency-ms", type=float, default=0, help="Simulated latency per blockchain call")
+    parser.add_argument("--url", help="Replay over HTTP against a running server instead of in-process stand-ins")
+    parser.add_argument("--session", type=int, help="Replay only this session of the capture (1 = first recorded)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    entries = read_capture(args.capture, args.session)
+    if args.url:
+        # The server's own chain and elections are used; captured votes must refer to elections it has
+        send_request = http_sender(args.url)
+    else:
+        send_request = app_sender(install_stand_ins(args.chain_latency_ms))
+        seed_elections(entries)
+
+    stats, duration = replay(send_request, entries, args.speed, args.concurrency)
+    summary = report(stats, duration)
+
+    if args.json:
+        print(json.dumps({"duration": round(duration, 3), "routes": summary}, indent=2))
+        return
+
+    print(f"Replayed {len(entries)} requests in {duration:.2f}s at {args.speed}x")
+    print(f"{'route':<16} {'reqs':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for route, row in summary.items():
+        print(f"{route:<16} {row['requests']:>6} {row['throughput_rps']:>8} {row['p50_ms']:>8} "
+              f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['error_rate']:>7.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import gzip
+import json
+import threading
+import time
+
+from flask import Response, request
+from config import COMPRESS_MIN_BYTES, COMPRESS_LEVEL, RESPONSE_CACHE_TTL
+
+# Optional fast JSON encoder and brotli compression
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _default(value):
+    """Encode types the JSON encoders do not handle natively."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Serialize a payload to JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def _choose_encoding(accept_encoding):
+    """Pick the best supported Content-Encoding from an Accept-Encoding header."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.lower())
+
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_LEVEL)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+
+
+def decompress(body, encoding):
+    """Undo a Content-Encoding applied by json_response."""
+    if encoding == "br":
+        return brotli.decompress(body)
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    return body
+
+
+class SerializedBody:
+    """JSON bytes plus lazily built compressed variants, reused across responses."""
+
+    def __init__(self, body):
+        self.body = body
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        if encoding is None:
+            return self.body
+        with self._lock:
+            if encoding not in self._encoded:
+                self._encoded[encoding] = _compress(self.body, encoding)
+            return self._encoded[encoding]
+
+    def response(self, status=200):
+        """Build a Flask response, compressed according to the request's Accept-Encoding."""
+        encoding = None
+        if len(self.body) >= COMPRESS_MIN_BYTES:
+            encoding = _choose_encoding(request.headers.get("Accept-Encoding", ""))
+
+        response = Response(self.encoded(encoding), status=status, mimetype="application/json")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+class ResponseCache:
+    """Pre-serialized response bodies for hot read endpoints, expiring after a TTL."""
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[0] < self.ttl:
+                return entry[1]
+            return None
+
+    def put(self, key, serialized):
+        with self._lock:
+            self._entries[key] = (time.time(), serialized)
+
+    def invalidate(self, key=None):
+        """Drop one cached body, or all of them when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+# Shared cache for hot read endpoints
+response_cache = ResponseCache()
+
+
+def json_response(payload, status=200, cache_key=None):
+    """
+    Serialize a payload into a (possibly compressed) JSON response.
+
+    Args:
+        payload: JSON-serializable data
+        status: HTTP status code
+        cache_key: When set, keep the serialized bytes in response_cache under this key
+
+    Returns:
+        Flask Response
+    """
+    serialized = SerializedBody(dumps(payload))
+    if cache_key is not None and status == 200:
+        response_cache.put(cache_key, serialized)
+    return serialized.response(status)
+
+
+def cached_response(cache_key):
+    """Return a response built from cached bytes, or None if nothing is cached."""
+    serialized = response_cache.get(cache_key)
+    if serialized is None:
+        return None
+    return serialized.response()
@@ -0,0 +1,181 @@
+import base64
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from algosdk import constants, encoding, mnemonic
+from nacl.signing import SigningKey
+
+from config import SIGNING_MAX_KEYS, SIGNING_KEY_TTL, SIGNING_WORKERS, SIGNING_PARALLEL_MIN
+from txn_template import sign_encoded
+
+
+def decode_private_key(private_key):
+    """
+    Decode a base64 private key (as returned by account.generate_account).
+
+    Returns:
+        (address, SigningKey)
+    """
+    signing_key = SigningKey(base64.b64decode(private_key)[:constants.key_len_bytes])
+    return encoding.encode_address(bytes(signing_key.verify_key)), signing_key
+
+
+class SigningService:
+    """
+    Signs transactions with decoded Ed25519 keys held in memory.
+
+    Keys are cached by address in a bounded LRU that also expires entries
+    SIGNING_KEY_TTL seconds after their last use. Only keys that sign are
+    cached. A mnemonic is decoded once, when its account first signs; later
+    calls find the key through a keyed hash of the mnemonic, so the mnemonic
+    itself is never stored. Batches are split across a worker pool (libsodium
+    releases the GIL while signing).
+    """
+
+    def __init__(self, max_keys=SIGNING_MAX_KEYS, ttl=SIGNING_KEY_TTL, workers=SIGNING_WORKERS,
+                 parallel_min=SIGNING_PARALLEL_MIN):
+        """
+        Args:
+            max_keys: Maximum number of signing keys kept
+            ttl: Seconds an unused key is kept
+            workers: Signing threads for batches
+            parallel_min: Batches smaller than this are signed on the calling thread
+        """
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.workers = workers
+        self.parallel_min = parallel_min
+        # address -> {"key": SigningKey, "expires": timestamp, "digest": mnemonic digest or None}
+        self._keys = OrderedDict()
+        # mnemonic digest -> address
+        self._digests = {}
+        # Per-process salt so cached digests are useless outside this process
+        self._salt = os.urandom(32)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _digest(self, account_mnemonic):
+        return hashlib.blake2b(" ".join(account_mnemonic.split()).encode(), key=self._salt).digest()
+
+    def _store(self, address, signing_key, digest=None):
+        """Add or refresh a key (callers hold the lock)."""
+        self._keys[address] = {"key": signing_key, "expires": time.time() + self.ttl, "digest": digest}
+        self._keys.move_to_end(address)
+        if digest is not None:
+            self._digests[digest] = address
+        while len(self._keys) > self.max_keys:
+            _, evicted = self._keys.popitem(last=False)
+            self._digests.pop(evicted["digest"], None)
+
+    def _drop(self, address):
+        entry = self._keys.pop(address, None)
+        if entry is not None:
+            self._digests.pop(entry["digest"], None)
+
+    def add_key(self, private_key):
+        """
+        Cache a base64 private key (as returned by account.generate_account).
+
+        Returns:
+            The key's address
+        """
+        address, signing_key = decode_private_key(private_key)
+        with self._lock:
+            digest = self._keys[address]["digest"] if address in self._keys else None
+            self._store(address, signing_key, digest)
+        return address
+
+    def load_mnemonic(self, account_mnemonic):
+        """
+        Make the key for a mnemonic available, decoding it only if it is not cached.
+
+        The key is returned as well as cached: other threads may evict it (or
+        it may expire) before the caller signs, so callers sign with the
+        returned key instead of looking it up again.
+
+        Returns:
+            (address, SigningKey)
+        """
+        digest = self._digest(account_mnemonic)
+        now = time.time()
+        with self._lock:
+            address = self._digests.get(digest)
+            entry = self._keys.get(address) if address else None
+            if entry is not None and entry["expires"] > now:
+                entry["expires"] = now + self.ttl
+                self._keys.move_to_end(address)
+                return address, entry["key"]
+
+        address, signing_key = decode_private_key(mnemonic.to_private_key(account_mnemonic))
+        with self._lock:
+            self._store(address, signing_key, digest)
+        return address, signing_key
+
+    def signing_key(self, address):
+        """
+        Get the cached SigningKey for an address.
+
+        Raises:
+            KeyError: No unexpired key is cached for the address
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._keys.get(address)
+            if entry is None or entry["expires"] <= now:
+                self._drop(address)
+                raise KeyError(f"No signing key loaded for {address}")
+            entry["expires"] = now + self.ttl
+            self._keys.move_to_end(address)
+            return entry["key"]
+
+    def forget(self, address):
+        """Remove an address's key from the cache."""
+        with self._lock:
+            self._drop(address)
+
+    def _sign_chunk(self, chunk):
+        return [sign_encoded(key, base64.b64decode(encoding.msgpack_encode(txn))) for txn, key in chunk]
+
+    def sign_transactions(self, txns, keys=None):
+        """
+        Sign unsigned algosdk transactions, each with the key of its sender.
+
+        Args:
+            txns: List of Transaction objects (group IDs already assigned)
+            keys: Optional dict of address -> SigningKey used before the cache
+                (e.g. keys just returned by load_mnemonic)
+
+        Returns:
+            List of (txid, signed transaction bytes) in the same order. Signed
+            bytes of a group can be concatenated for send_raw_transaction.
+
+        Raises:
+            KeyError: A sender's key is neither in keys nor cached
+        """
+        keys = keys or {}
+        work = [
+            (txn, keys[txn.sender] if txn.sender in keys else self.signing_key(txn.sender))
+            for txn in txns
+        ]
+        if len(work) < self.parallel_min or self.workers <= 1:
+            return self._sign_chunk(work)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="signer")
+
+        size = -(-len(work) // self.workers)
+        futures = [self._executor.submit(self._sign_chunk, work[i:i + size]) for i in range(0, len(work), size)]
+        return [signed for future in futures for signed in future.result()]
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._keys), "maxKeys": self.max_keys, "ttl": self.ttl, "workers": self.workers}
+
+
+# Shared signing service
+signing_service = SigningService()
@@ -0,0 +1,591 @@
+"""
+In-process Algorand ledger simulator.
+
+Implements the subset of the algod and indexer APIs that the backend uses,
+with Algo and ASA balances, minimum balances, atomic groups and configurable
+round timing, so the full voting flow can run offline at high throughput.
+
+Enable it for the backend with ALGORAND_NETWORK=simulator, or run a local
+throughput benchmark with:
+    python simulator.py [votes] [threads]
+"""
+import base64
+import copy
+import hashlib
+import io
+import threading
+import time
+from collections import deque
+
+import msgpack
+from algosdk import constants, encoding, transaction
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+from config import (
+    SIMULATOR_ROUND_TIME, SIMULATOR_EMPTY_ROUND_TIME, SIMULATOR_AUTO_FUND_MICROALGOS,
+    SIMULATOR_VERIFY_SIGNATURES, SIMULATOR_TXN_HISTORY
+)
+
+GENESIS_ID = "simnet-v1"
+GENESIS_HASH = base64.b64encode(hashlib.sha256(GENESIS_ID.encode()).digest()).decode()
+MIN_BALANCE = 100000
+ASSET_MIN_BALANCE = 100000
+MAX_VALIDITY = 1000
+
+
+def _txid(encoded_txn):
+    return base64.b32encode(encoding.checksum(constants.txid_prefix + encoded_txn)).decode().rstrip("=")
+
+
+class SimulationError(Exception):
+    """Raised when a transaction is rejected, mirroring an algod 400 response."""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.code = 400
+
+
+class SimulatedLedger:
+    """
+    Ledger state shared by the simulated algod and indexer clients.
+
+    With round_time > 0 a background thread closes a round every round_time
+    seconds and commits everything submitted since the last round. With
+    round_time == 0 every submission (single transaction or group) is
+    committed immediately in its own round, and an empty round is closed when
+    someone waits on the next round for SIMULATOR_EMPTY_ROUND_TIME seconds.
+    """
+
+    def __init__(self, round_time=SIMULATOR_ROUND_TIME, auto_fund=SIMULATOR_AUTO_FUND_MICROALGOS,
+                 verify_signatures=SIMULATOR_VERIFY_SIGNATURES):
+        self.round_time = round_time
+        self.auto_fund = auto_fund
+        self.verify_signatures = verify_signatures
+        self.round = 1
+        self.round_timestamp = time.time()
+        self.accounts = {}
+        self.assets = {}
+        self.next_asset_id = 1000
+        self.blocks = {1: []}
+        self.oldest_block = 1
+        self.transactions = {}
+        self.history = deque()
+        self.queue = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+        if round_time > 0:
+            self._thread = threading.Thread(target=self._produce_rounds, name="simulated-rounds", daemon=True)
+            self._thread.start()
+
+    # Accounts
+
+    def _account(self, address):
+        account_state = self.accounts.get(address)
+        if account_state is None:
+            account_state = {"amount": self.auto_fund, "assets": {}, "created": set()}
+            self.accounts[address] = account_state
+        return account_state
+
+    def fund(self, address, amount):
+        """Credit microAlgos to an account (simulated dispenser)."""
+        with self._condition:
+            self._account(address)["amount"] += amount
+
+    def _min_balance(self, account_state):
+        return MIN_BALANCE + ASSET_MIN_BALANCE * len(account_state["assets"])
+
+    # Submission
+
+    def submit(self, signed_txns, encoded_txns=None):
+        """
+        Validate and queue (or commit) a transaction or atomic group.
+
+        Args:
+            signed_txns: SignedTransaction objects
+            encoded_txns: Canonical msgpack of each transaction, when the caller
+                already has it (saves re-encoding for the txid and signature)
+
+        Returns:
+            Transaction ID of the first transaction
+        """
+        if encoded_txns is None:
+            encoded_txns = [base64.b64decode(encoding.msgpack_encode(signed_txn.transaction))
+                            for signed_txn in signed_txns]
+        txids = [_txid(encoded) for encoded in encoded_txns]
+
+        # Signatures do not depend on ledger state, so they are checked outside
+        # the lock and concurrent submitters verify in parallel
+        if self.verify_signatures:
+            for signed_txn, encoded in zip(signed_txns, encoded_txns):
+                self._check_signature(signed_txn, encoded)
+
+        with self._condition:
+            for txid in txids:
+                if txid in self.transactions:
+                    raise SimulationError(f"transaction already in ledger: {txid}")
+
+            for signed_txn in signed_txns:
+                self._check_envelope(signed_txn)
+            self._check_group(signed_txns)
+
+            if self.round_time > 0:
+                # Check the group applies against current state; it is re-applied at round close
+                self._apply_group(signed_txns, txids, dry_run=True)
+                self.queue.append((signed_txns, txids))
+                for txid, signed_txn in zip(txids, signed_txns):
+                    self.transactions[txid] = {"txn": signed_txn, "confirmed-round": 0, "pool-error": ""}
+            else:
+                self._apply_group(signed_txns, txids)
+                self._close_round([txids])
+
+        return txids[0]
+
+    def _check_envelope(self, signed_txn):
+        txn = signed_txn.transaction
+        if txn.genesis_hash != GENESIS_HASH:
+            raise SimulationError("genesis hash mismatch")
+        if not txn.first_valid_round <= self.round + 1 <= txn.last_valid_round:
+            raise SimulationError(f"txn dead: round {self.round + 1} outside of {txn.first_valid_round}--{txn.last_valid_round}")
+        if txn.last_valid_round - txn.first_valid_round > MAX_VALIDITY:
+            raise SimulationError("validity window too large")
+        if txn.fee < constants.min_txn_fee:
+            raise SimulationError(f"transaction fee {txn.fee} below minimum {constants.min_txn_fee}")
+
+    @staticmethod
+    def _check_signature(signed_txn, encoded_txn):
+        signer = signed_txn.authorizing_address or signed_txn.transaction.sender
+        try:
+            VerifyKey(encoding.decode_address(signer)).verify(
+                constants.txid_prefix + encoded_txn, base64.b64decode(signed_txn.signature))
+        except (BadSignatureError, TypeError):
+            raise SimulationError("invalid signature")
+
+    def _check_group(self, signed_txns):
+        if len(signed_txns) == 1 and not signed_txns[0].transaction.group:
+            return
+        if len(signed_txns) > 16:
+            raise SimulationError("group too large")
+
+        txns = [signed_txn.transaction for signed_txn in signed_txns]
+        # The group ID is computed over the transactions without their group field
+        ungrouped = []
+        for txn in txns:
+            txn_copy = copy.copy(txn)
+            txn_copy.group = None
+            ungrouped.append(txn_copy)
+        expected = transaction.calculate_group_id(ungrouped)
+        if any(txn.group != expected for txn in txns):
+            raise SimulationError("incomplete or mismatched group")
+
+    def _apply_group(self, signed_txns, txids, dry_run=False):
+        """Apply a group atomically; on failure every change is rolled back."""
+        touched = {}
+        asset_state = dict(self.assets)
+        next_asset_id = self.next_asset_id
+        created = {}
+
+        def state(address):
+            if address not in touched:
+                current = self._account(address)
+                touched[address] = {
+                    "amount": current["amount"],
+                    "assets": dict(current["assets"]),
+                    "created": set(current["created"])
+                }
+            return touched[address]
+
+        for signed_txn, txid in zip(signed_txns, txids):
+            txn = signed_txn.transaction
+            sender = state(txn.sender)
+            sender["amount"] -= txn.fee
+
+            if txn.type == constants.payment_txn:
+                receiver = state(txn.receiver)
+                sender["amount"] -= txn.amt
+                receiver["amount"] += txn.amt
+                if txn.close_remainder_to:
+                    closer = state(txn.close_remainder_to)
+                    closer["amount"] += sender["amount"]
+                    sender["amount"] = 0
+
+            elif txn.type == constants.assettransfer_txn:
+                asset_id = txn.index
+                if asset_id not in asset_state:
+                    raise SimulationError(f"asset {asset_id} does not exist")
+                receiver = state(txn.receiver)
+                if txn.sender == txn.receiver and txn.amount == 0:
+                    # Opt-in
+                    sender["assets"].setdefault(asset_id, 0)
+                else:
+                    if asset_id not in sender["assets"]:
+                        raise SimulationError(f"sender {txn.sender} not opted in to asset {asset_id}")
+                    if asset_id not in receiver["assets"]:
+                        raise SimulationError(f"receiver {txn.receiver} not opted in to asset {asset_id}")
+                    if sender["assets"][asset_id] < txn.amount:
+                        raise SimulationError(f"underflow on asset {asset_id}")
+                    sender["assets"][asset_id] -= txn.amount
+                    receiver["assets"][asset_id] += txn.amount
+
+            elif txn.type == constants.assetconfig_txn and not txn.index:
+                asset_id = next_asset_id
+                next_asset_id += 1
+                asset_state[asset_id] = {
+                    "index": asset_id,
+                    "creator": txn.sender,
+                    "total": txn.total,
+                    "decimals": txn.decimals,
+                    "default-frozen": txn.default_frozen,
+                    "unit-name": txn.unit_name,
+                    "name": txn.asset_name,
+                    "url": txn.url,
+                    "manager": txn.manager,
+                    "reserve": txn.reserve,
+                    "freeze": txn.freeze,
+                    "clawback": txn.clawback,
+                    "created-round": self.round + 1
+                }
+                sender["assets"][asset_id] = txn.total
+                sender["created"].add(asset_id)
+                created[txid] = asset_id
+
+            else:
+                raise SimulationError(f"transaction type {txn.type} not supported by the simulator")
+
+        for address, account_state in touched.items():
+            if account_state["amount"] < 0:
+                raise SimulationError(f"overspend by {address}")
+            if account_state["amount"] < self._min_balance(account_state) and account_state["amount"] != 0:
+                raise SimulationError(f"account {address} balance below min {self._min_balance(account_state)}")
+
+        if dry_run:
+            return
+
+        for address, account_state in touched.items():
+            self.accounts[address] = account_state
+        self.assets = asset_state
+        self.next_asset_id = next_asset_id
+
+        for signed_txn, txid in zip(signed_txns, txids):
+            self.transactions[txid] = {
+                "txn": signed_txn,
+                "confirmed-round": self.round + 1,
+                "pool-error": "",
+                "asset-index": created.get(txid)
+            }
+
+    def _close_round(self, committed_groups):
+        """Advance one round containing the given groups of txids."""
+        self.round += 1
+        self.round_timestamp = time.time()
+        block_txids = [txid for txids in committed_groups for txid in txids]
+        self.blocks[self.round] = block_txids
+        self.history.extend(block_txids)
+
+        # Keep bounded history for long benchmark runs
+        while len(self.history) > SIMULATOR_TXN_HISTORY:
+            self.transactions.pop(self.history.popleft(), None)
+        while self.oldest_block < self.round - SIMULATOR_TXN_HISTORY:
+            self.blocks.pop(self.oldest_block, None)
+            self.oldest_block += 1
+
+        self._condition.notify_all()
+
+    def _produce_rounds(self):
+        while True:
+            time.sleep(self.round_time)
+            with self._condition:
+                queued, self.queue = self.queue, []
+                committed = []
+                for signed_txns, txids in queued:
+                    try:
+                        self._apply_group(signed_txns, txids)
+                        committed.append(txids)
+                    except SimulationError as e:
+                        for txid in txids:
+                            self.transactions[txid]["pool-error"] = str(e)
+                self._close_round(committed)
+
+    def wait_for_round_after(self, round_number, timeout=60):
+        with self._condition:
+            deadline = time.time() + timeout
+            while self.round <= round_number and time.time() < deadline:
+                if self.round_time > 0:
+                    self._condition.wait(deadline - time.time())
+                elif not self._condition.wait(min(SIMULATOR_EMPTY_ROUND_TIME, deadline - time.time())):
+                    # A real chain keeps closing (empty) rounds while idle; without
+                    # them, anything counting rounds would wait for the next submission
+                    self._close_round([])
+            return self.round
+
+    # Formatting helpers shared by both clients
+
+    def account_view(self, address):
+        account_state = self._account(address)
+        return {
+            "address": address,
+            "amount": account_state["amount"],
+            "min-balance": self._min_balance(account_state),
+            "round": self.round,
+            "assets": [
+                {"asset-id": asset_id, "amount": amount, "is-frozen": False}
+                for asset_id, amount in account_state["assets"].items()
+            ],
+            "created-assets": [
+                {"index": asset_id, "params": self.assets[asset_id]}
+                for asset_id in account_state["created"]
+            ]
+        }
+
+    def transaction_view(self, txid):
+        """Indexer-format transaction."""
+        entry = self.transactions[txid]
+        txn = entry["txn"].transaction
+        view = {
+            "id": txid,
+            "sender": txn.sender,
+            "tx-type": txn.type,
+            "fee": txn.fee,
+            "first-valid": txn.first_valid_round,
+            "last-valid": txn.last_valid_round,
+            "confirmed-round": entry["confirmed-round"],
+            "note": base64.b64encode(txn.note or b"").decode()
+        }
+        if txn.group:
+            view["group"] = base64.b64encode(txn.group).decode()
+        if txn.type == constants.payment_txn:
+            view["payment-transaction"] = {"receiver": txn.receiver, "amount": txn.amt}
+        elif txn.type == constants.assettransfer_txn:
+            view["asset-transfer-transaction"] = {
+                "asset-id": txn.index, "amount": txn.amount, "receiver": txn.receiver
+            }
+        elif txn.type == constants.assetconfig_txn:
+            asset_id = entry.get("asset-index")
+            view["created-asset-index"] = asset_id
+            view["asset-config-transaction"] = {
+                "asset-id": 0,
+                "params": self.assets.get(asset_id, {})
+            }
+        return view
+
+
+def _page(items, limit, next_page):
+    start = int(next_page or 0)
+    end = start + (limit or 1000)
+    page = items[start:end]
+    return page, (str(end) if end < len(items) else None)
+
+
+class SimulatedAlgodClient:
+    """Subset of algosdk's AlgodClient backed by a SimulatedLedger."""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def suggested_params(self, **kwargs):
+        with self.ledger._condition:
+            current = self.ledger.round
+        return transaction.SuggestedParams(
+            fee=0,
+            first=current,
+            last=current + MAX_VALIDITY,
+            gh=GENESIS_HASH,
+            gen=GENESIS_ID,
+            flat_fee=False,
+            min_fee=constants.min_txn_fee
+        )
+
+    def send_transaction(self, txn, **kwargs):
+        return self.ledger.submit([txn])
+
+    def send_transactions(self, txns, **kwargs):
+        return self.ledger.submit(list(txns))
+
+    def send_raw_transaction(self, txn, **kwargs):
+        """Accepts base64 msgpack of a signed transaction or of a concatenated group."""
+        raw = base64.b64decode(txn)
+        objs = list(msgpack.Unpacker(io.BytesIO(raw), raw=False, strict_map_key=False))
+        # Decoding preserves the canonical key order, so re-packing the "txn" map
+        # yields the bytes that were signed
+        return self.ledger.submit(
+            [encoding.msgpack_decode(obj) for obj in objs],
+            [msgpack.packb(obj["txn"], use_bin_type=True) for obj in objs]
+        )
+
+    def pending_transaction_info(self, txid, **kwargs):
+        with self.ledger._condition:
+            entry = self.ledger.transactions.get(txid)
+            if entry is None:
+                raise SimulationError("txn does not exist")
+            info = {
+                "confirmed-round": entry["confirmed-round"],
+                "pool-error": entry["pool-error"],
+                "txn": {"sig": entry["txn"].signature, "txn": entry["txn"].transaction.dictify()}
+            }
+            if entry.get("asset-index"):
+                info["asset-index"] = entry["asset-index"]
+            return info
+
+    def account_info(self, address, **kwargs):
+        with self.ledger._condition:
+            return self.ledger.account_view(address)
+
+    def asset_info(self, asset_id, **kwargs):
+        with self.ledger._condition:
+            if asset_id not in self.ledger.assets:
+                raise SimulationError("asset does not exist")
+            return {"index": asset_id, "params": self.ledger.assets[asset_id]}
+
+    def status(self, **kwargs):
+        with self.ledger._condition:
+            return {
+                "last-round": self.ledger.round,
+                "time-since-last-round": int((time.time() - self.ledger.round_timestamp) * 1e9)
+            }
+
+    def status_after_block(self, block_num, **kwargs):
+        self.ledger.wait_for_round_after(block_num)
+        return self.status()
+
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json"):
+        parts = requrl.strip("/").split("/")
+        if method == "GET" and len(parts) == 3 and parts[0] == "blocks" and parts[2] == "txids":
+            with self.ledger._condition:
+                return {"blockTxids": list(self.ledger.blocks.get(int(parts[1]), []))}
+        raise SimulationError(f"{method} {requrl} not supported by the simulator")
+
+
+class SimulatedIndexerClient:
+    """Subset of algosdk's IndexerClient backed by a SimulatedLedger."""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def health(self, **kwargs):
+        with self.ledger._condition:
+            return {"round": self.ledger.round}
+
+    def account_info(self, address, **kwargs):
+        with self.ledger._condition:
+            return {"account": self.ledger.account_view(address), "current-round": self.ledger.round}
+
+    def search_transactions(self, limit=None, next_page=None, note_prefix=None, txn_type=None,
+                            min_round=None, max_round=None, asset_id=None, address=None, txid=None, **kwargs):
+        with self.ledger._condition:
+            matches = []
+            for entry_txid in self.ledger.history:
+                entry = self.ledger.transactions.get(entry_txid)
+                if entry is None:
+                    continue
+                txn = entry["txn"].transaction
+                confirmed = entry["confirmed-round"]
+                if txid and entry_txid != txid:
+                    continue
+                if txn_type and txn.type != txn_type:
+                    continue
+                if min_round and confirmed < min_round:
+                    continue
+                if max_round and confirmed > max_round:
+                    continue
+                if asset_id and getattr(txn, "index", None) != asset_id:
+                    continue
+                if address and address not in (txn.sender, getattr(txn, "receiver", None)):
+                    continue
+                if note_prefix and not (txn.note or b"").startswith(note_prefix):
+                    continue
+                matches.append(entry_txid)
+
+            page, token = _page(matches, limit, next_page)
+            response = {
+                "current-round": self.ledger.round,
+                "transactions": [self.ledger.transaction_view(entry_txid) for entry_txid in page]
+            }
+            if token:
+                response["next-token"] = token
+            return response
+
+    def search_assets(self, limit=None, next_page=None, creator=None, name=None, unit=None, asset_id=None, **kwargs):
+        with self.ledger._condition:
+            matches = [
+                {"index": index, "params": params}
+                for index, params in sorted(self.ledger.assets.items())
+                if (not creator or params["creator"] == creator)
+                and (not name or params["name"] == name)
+                and (not unit or params["unit-name"] == unit)
+                and (not asset_id or index == asset_id)
+            ]
+            page, token = _page(matches, limit, next_page)
+            response = {"current-round": self.ledger.round, "assets": page}
+            if token:
+                response["next-token"] = token
+            return response
+
+    def asset_balances(self, asset_id, limit=None, next_page=None, **kwargs):
+        with self.ledger._condition:
+            balances = [
+                {"address": address, "amount": account_state["assets"][asset_id], "is-frozen": False}
+                for address, account_state in self.ledger.accounts.items()
+                if asset_id in account_state["assets"]
+            ]
+            page, token = _page(balances, limit, next_page)
+            response = {"current-round": self.ledger.round, "balances": page}
+            if token:
+                response["next-token"] = token
+            return response
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """Get the shared simulated ledger."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = SimulatedLedger()
+        return _ledger
+
+
+def benchmark(votes=2000, threads=1):
+    """Run election setup and a batch of votes through blockchain.py against the simulator."""
+    from concurrent.futures import ThreadPoolExecutor
+    import node_pool
+    import blockchain
+
+    ledger = get_ledger()
+    node_pool.set_clients(SimulatedAlgodClient(ledger), SimulatedIndexerClient(ledger))
+
+    creator = blockchain.create_account()
+    asset_id = blockchain.create_voting_asset(creator["mnemonic"], "Benchmark election", votes * 10)
+    proposal = blockchain.create_proposal_accounts(creator["mnemonic"], asset_id, ["Proposal A"])[0]
+
+    voters = []
+    for _ in range(votes):
+        voter = blockchain.create_account()
+        opt_in = transaction.AssetTransferTxn(
+            voter["address"], SimulatedAlgodClient(ledger).suggested_params(), voter["address"], 0, asset_id)
+        ledger.submit([opt_in.sign(voter["private_key"])])
+        voters.append(voter)
+
+    for voter in voters:
+        blockchain.transfer_votes(creator["mnemonic"], voter["address"], asset_id, 1)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(
+            lambda voter: blockchain.submit_vote_to_blockchain(
+                voter["mnemonic"], proposal["address"], asset_id, 1, hashlib.sha256(voter["address"].encode()).hexdigest()),
+            voters
+        ))
+    elapsed = time.perf_counter() - start
+
+    results = blockchain.get_voting_results(asset_id, [proposal["address"]])
+    print(f"{votes} votes in {elapsed:.2f}s ({votes / elapsed:.0f} tx/s), tally {results[proposal['address']]} "
+          f"(threads={threads}, round time={ledger.round_time}s, verify signatures={ledger.verify_signatures})")
+
+
+if __name__ == "__main__":
+    import sys
+
+    benchmark(*(int(arg) for arg in sys.argv[1:3]))
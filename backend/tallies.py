@@ -0,0 +1,236 @@
+import bisect
+import threading
+
+from config import REGION_LEVELS, TALLY_PAGE_SIZE, TALLY_MAX_PAGE_SIZE, TALLY_MAX_CHILDREN
+
+REGION_SEPARATOR = "/"
+MAX_REGION_NAME = 64
+
+
+def parse_region(region):
+    """
+    Normalise a region tag to a path of names from the top level down.
+
+    Accepts a "Province/District/Ward" string, a list of names, or a dict keyed
+    by REGION_LEVELS (e.g. {"province": ..., "district": ..., "ward": ...}).
+    Shorter paths are allowed (a vote tagged only with its province).
+
+    Returns:
+        Tuple of region names (empty for None)
+
+    Raises:
+        ValueError: The tag is malformed or deeper than REGION_LEVELS
+    """
+    if region is None or region == "":
+        return ()
+    if isinstance(region, str):
+        names = region.split(REGION_SEPARATOR)
+    elif isinstance(region, dict):
+        names = []
+        for level in REGION_LEVELS:
+            if not region.get(level):
+                break
+            names.append(region[level])
+    elif isinstance(region, (list, tuple)):
+        names = list(region)
+    else:
+        raise ValueError("region must be a string, list or object")
+
+    if len(names) > len(REGION_LEVELS):
+        raise ValueError(f"region has more than {len(REGION_LEVELS)} levels ({', '.join(REGION_LEVELS)})")
+
+    path = []
+    for name in names:
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError("region names must be non-empty strings")
+        name = name.strip()
+        if len(name) > MAX_REGION_NAME or REGION_SEPARATOR in name:
+            raise ValueError(f"region names must be at most {MAX_REGION_NAME} characters without '{REGION_SEPARATOR}'")
+        path.append(name)
+    return tuple(path)
+
+
+def check_vote(proposal, count):
+    """
+    Validate the proposal and vote count of a vote before it is tallied.
+
+    Raises:
+        ValueError: The proposal is not a string (or None) or the count is not a positive integer
+    """
+    if proposal is not None and not isinstance(proposal, str):
+        raise ValueError("proposal must be a string")
+    if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+        raise ValueError("voting_power must be a positive integer")
+
+
+def _new_node():
+    # votes/total include every vote in the subtree; direct counts votes tagged no deeper than this node
+    return {"votes": {}, "total": 0, "direct": 0, "children": {}, "names": []}
+
+
+def query_tree(root, path, offset=0, limit=TALLY_PAGE_SIZE):
+    """
+    Read the tally of one region and a page of its sub-regions.
+
+    Walks the tree along path, so the lookup costs O(depth) plus the page size.
+    Works on live trees and on trees exported to the election archive.
+
+    Returns:
+        Region tally dict, or None if the region has no votes
+    """
+    node = root
+    for name in path:
+        node = node["children"].get(name)
+        if node is None:
+            return None
+
+    limit = max(1, min(limit, TALLY_MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    page = node["names"][offset:offset + limit]
+    depth = len(path)
+    next_offset = offset + limit if offset + limit < len(node["names"]) else None
+
+    return {
+        "region": list(path),
+        "level": REGION_LEVELS[depth - 1] if depth else "national",
+        "childLevel": REGION_LEVELS[depth] if depth < len(REGION_LEVELS) else None,
+        "total": node["total"],
+        "votes": dict(node["votes"]),
+        "unassigned": node["direct"] if depth < len(REGION_LEVELS) else 0,
+        "children": {
+            "items": [
+                {
+                    "name": name,
+                    "total": node["children"][name]["total"],
+                    "votes": dict(node["children"][name]["votes"])
+                }
+                for name in page
+            ],
+            "count": len(node["names"]),
+            "offset": offset,
+            "limit": limit,
+            "nextOffset": next_offset
+        }
+    }
+
+
+class RegionTally:
+    """
+    Per-election vote counters arranged as a region tree (national -> province -> district -> ward).
+
+    Votes are added on write: every node on the path from the root to the
+    vote's region gets the vote, so any region's totals are read by walking
+    down the tree without scanning votes. Child names are kept sorted for
+    stable drill-down pages; a region has at most max_children sub-regions,
+    which bounds the cost of inserting a new name.
+    """
+
+    def __init__(self, max_children=TALLY_MAX_CHILDREN):
+        self.max_children = max_children
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def check_region(self, election, region):
+        """
+        Check that a vote for region can be tallied under it (call before the vote is sent).
+
+        Raises:
+            ValueError: The region tag is malformed or would add a sub-region to a full region
+        """
+        path = parse_region(region)
+        with self._lock:
+            node = self._trees.get(election)
+            for depth, name in enumerate(path):
+                if node is None:
+                    return
+                child = node["children"].get(name)
+                if child is None and len(node["names"]) >= self.max_children:
+                    parent = REGION_SEPARATOR.join(path[:depth]) or "national"
+                    raise ValueError(f"Region {parent} already has {self.max_children} sub-regions")
+                node = child
+
+    def record_vote(self, election, region, proposal, count=1):
+        """
+        Add votes for a proposal in a region.
+
+        Args:
+            election: Election asset ID
+            region: Region tag (see parse_region); None counts towards the national total only
+            proposal: Proposal name (None for votes whose choice is encrypted;
+                they count towards region totals only)
+            count: Number of votes (voting power)
+
+        Raises:
+            ValueError: The region tag, proposal or count is invalid
+        """
+        path = parse_region(region)
+        check_vote(proposal, count)
+        with self._lock:
+            node = self._trees.get(election)
+            if node is None:
+                node = self._trees[election] = _new_node()
+
+            for name in path:
+                child = node["children"].get(name)
+                if child is None:
+                    if len(node["names"]) >= self.max_children:
+                        # The region is full (the caller skipped check_region or
+                        # lost a race for the last slot): count the vote here
+                        break
+                    child = node["children"][name] = _new_node()
+                    bisect.insort(node["names"], name)
+                if proposal is not None:
+                    node["votes"][proposal] = node["votes"].get(proposal, 0) + count
+                node["total"] += count
+                node = child
+
+            if proposal is not None:
+                node["votes"][proposal] = node["votes"].get(proposal, 0) + count
+            node["total"] += count
+            node["direct"] += count
+
+    def query(self, election, region=None, offset=0, limit=TALLY_PAGE_SIZE):
+        """
+        Get the tally of a region and a page of its sub-regions.
+
+        Returns:
+            Region tally dict, or None if the region has no votes
+        """
+        path = parse_region(region)
+        with self._lock:
+            root = self._trees.get(election)
+            if root is None:
+                return None
+            return query_tree(root, path, offset, limit)
+
+    def export(self, election):
+        """Return an election's tree as plain JSON-serialisable data (for the archive)."""
+        with self._lock:
+            root = self._trees.get(election)
+            if root is None:
+                return None
+
+            def copy(node):
+                return {
+                    "votes": dict(node["votes"]),
+                    "total": node["total"],
+                    "direct": node["direct"],
+                    "children": {name: copy(child) for name, child in node["children"].items()},
+                    "names": list(node["names"])
+                }
+
+            return copy(root)
+
+    def restore(self, election, tree):
+        """Load an exported tree (from a snapshot) unless the election already has one."""
+        with self._lock:
+            self._trees.setdefault(election, tree)
+
+    def drop(self, election):
+        """Forget an election's tree (once it is archived)."""
+        with self._lock:
+            self._trees.pop(election, None)
+
+
+# Shared region tallies
+region_tally = RegionTally()
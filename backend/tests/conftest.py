@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests run against the in-process ledger simulator, never a real network
+os.environ.setdefault("ALGORAND_NETWORK", "simulator")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
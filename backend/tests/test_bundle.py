@@ -0,0 +1,109 @@
+import io
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+import bundle
+from bundle import build_bundle, ingest_bundle, register_kiosk_key
+
+VOTES = [
+    {"voter_id": f"90010150{i:05d}", "election": 42, "timestamp": 1700000000 + i, "ciphertext": bytes([i]) * 48}
+    for i in range(20)
+]
+
+
+def _kiosk(kiosk_id):
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    register_kiosk_key(kiosk_id, private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw))
+    return private_key
+
+
+@pytest.fixture
+def kiosk_key():
+    private_key = _kiosk("kiosk-test")
+    yield private_key
+    bundle.kiosk_keys.pop("kiosk-test", None)
+
+
+def _ingest(data):
+    return ingest_bundle(io.BytesIO(data), lambda record, kiosk_id: record)
+
+
+def _header_length(data):
+    return bundle._HEADER_PREFIX.size + data[5] + bundle._HEADER_COUNTS.size
+
+
+def _flip(data, index):
+    tampered = bytearray(data)
+    tampered[index] ^= 0x01
+    return bytes(tampered)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip(kiosk_key, compress):
+    result = _ingest(build_bundle("kiosk-test", kiosk_key, VOTES, compress=compress))
+
+    assert result["kiosk"] == "kiosk-test"
+    assert result["records"] == len(VOTES)
+    assert result["votes"] == VOTES
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_tampered_body_is_rejected(kiosk_key, compress):
+    data = build_bundle("kiosk-test", kiosk_key, VOTES, compress=compress)
+    body_start = _header_length(data)
+    submitted = []
+
+    for index in (body_start, (body_start + len(data) - bundle.SIGNATURE_SIZE) // 2):
+        with pytest.raises(ValueError, match="signature"):
+            ingest_bundle(io.BytesIO(_flip(data, index)), lambda record, kiosk_id: submitted.append(record))
+    assert submitted == []
+
+
+def test_tampered_header_is_rejected(kiosk_key):
+    data = build_bundle("kiosk-test", kiosk_key, VOTES, compress=False)
+    header_length = _header_length(data)
+
+    # Flags byte: the body would be read as compressed
+    with pytest.raises(ValueError, match="signature"):
+        _ingest(_flip(data, 4))
+    # Low byte of the record count
+    with pytest.raises(ValueError, match="signature"):
+        _ingest(_flip(data, header_length - 5))
+
+
+def test_header_naming_another_kiosk_is_rejected(kiosk_key):
+    other = _kiosk("kiosk-tesu")
+    try:
+        data = build_bundle("kiosk-test", kiosk_key, VOTES)
+        # Same-length kiosk ID, so the rest of the header still parses
+        with pytest.raises(ValueError, match="signature"):
+            _ingest(data.replace(b"kiosk-test", b"kiosk-tesu", 1))
+        assert _ingest(build_bundle("kiosk-tesu", other, VOTES))["records"] == len(VOTES)
+    finally:
+        bundle.kiosk_keys.pop("kiosk-tesu", None)
+
+
+def test_tampered_or_foreign_signature_is_rejected(kiosk_key):
+    data = build_bundle("kiosk-test", kiosk_key, VOTES)
+
+    with pytest.raises(ValueError, match="signature"):
+        _ingest(_flip(data, len(data) - 1))
+
+    forged = build_bundle("kiosk-test", ed25519.Ed25519PrivateKey.generate(), VOTES)
+    with pytest.raises(ValueError, match="signature"):
+        _ingest(forged)
+
+
+def test_unknown_kiosk_and_bad_framing_are_rejected(kiosk_key):
+    data = build_bundle("kiosk-test", kiosk_key, VOTES)
+
+    with pytest.raises(ValueError, match="Unknown kiosk"):
+        _ingest(build_bundle("kiosk-none", kiosk_key, VOTES))
+    with pytest.raises(ValueError, match="Not a vote bundle"):
+        _ingest(b"XYZ" + data[3:])
+    with pytest.raises(ValueError, match="version"):
+        _ingest(data[:3] + b"\x02" + data[4:])
+    with pytest.raises(ValueError, match="truncated"):
+        _ingest(data[:-1])
@@ -0,0 +1,188 @@
+import threading
+
+import pytest
+from flask import Flask
+
+import idempotency
+from idempotency import IdempotencyConflict, IdempotencyIndex, idempotent
+from jobs import mark_submitted
+from serialization import json_response
+
+
+@pytest.fixture
+def index(monkeypatch):
+    fresh = IdempotencyIndex(ttl=60, max_keys=100)
+    monkeypatch.setattr(idempotency, "idempotency_index", fresh)
+    return fresh
+
+
+@pytest.fixture
+def app(index):
+    app = Flask(__name__)
+    app.calls = []
+    app.gate = threading.Event()
+    app.gate.set()
+
+    @app.route("/vote", methods=["POST"])
+    @idempotent("vote")
+    def vote():
+        app.calls.append("vote")
+        app.gate.wait(5)
+        return json_response({"txid": f"TX{len(app.calls)}"}, 201)
+
+    @app.route("/flaky", methods=["POST"])
+    @idempotent("flaky")
+    def flaky():
+        app.calls.append("flaky")
+        if len(app.calls) == 1:
+            return json_response({"error": "node unavailable"}, 503)
+        return json_response({"ok": True})
+
+    @app.route("/sent-then-failed", methods=["POST"])
+    @idempotent("sent-then-failed")
+    def sent_then_failed():
+        app.calls.append("sent")
+        mark_submitted()
+        return json_response({"error": "confirmation timed out"}, 504)
+
+    return app
+
+
+def _post(client, path, body, key="key-1"):
+    return client.post(path, json=body, headers={"Idempotency-Key": key})
+
+
+def test_retry_replays_the_stored_response(app):
+    client = app.test_client()
+
+    first = _post(client, "/vote", {"choice": "yes"})
+    retry = _post(client, "/vote", {"choice": "yes"})
+
+    assert app.calls == ["vote"]
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json() == {"txid": "TX1"}
+    assert first.headers["Idempotent-Replayed"] == "false"
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+
+def test_requests_without_a_key_always_run(app):
+    client = app.test_client()
+
+    client.post("/vote", json={"choice": "yes"})
+    client.post("/vote", json={"choice": "yes"})
+
+    assert app.calls == ["vote", "vote"]
+
+
+def test_key_reused_for_another_request_is_rejected(app):
+    client = app.test_client()
+    _post(client, "/vote", {"choice": "yes"})
+
+    response = _post(client, "/vote", {"choice": "no"})
+
+    assert response.status_code == 422
+    assert app.calls == ["vote"]
+    # Keys are scoped per endpoint
+    _post(client, "/flaky", {"choice": "no"})
+    assert app.calls == ["vote", "flaky"]
+
+
+def test_retry_of_an_in_flight_request_gets_409(app, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.05)
+    app.gate.clear()
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(response=_post(app.test_client(), "/vote", {"choice": "yes"})))
+    thread.start()
+    try:
+        while not app.calls:
+            threading.Event().wait(0.01)
+        retry = _post(app.test_client(), "/vote", {"choice": "yes"})
+    finally:
+        app.gate.set()
+        thread.join()
+
+    assert retry.status_code == 409
+    assert retry.headers["Retry-After"] == "1"
+    assert first["response"].status_code == 201
+    assert app.calls == ["vote"]
+
+
+def test_retry_waits_for_the_in_flight_request(app):
+    app.gate.clear()
+    thread = threading.Thread(target=lambda: _post(app.test_client(), "/vote", {"choice": "yes"}))
+    thread.start()
+    while not app.calls:
+        threading.Event().wait(0.01)
+    threading.Timer(0.05, app.gate.set).start()
+
+    retry = _post(app.test_client(), "/vote", {"choice": "yes"})
+    thread.join()
+
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert app.calls == ["vote"]
+
+
+def test_server_error_before_sending_releases_the_key(app, index):
+    client = app.test_client()
+
+    assert _post(client, "/flaky", {}).status_code == 503
+    assert len(index) == 0
+    assert _post(client, "/flaky", {}).status_code == 200
+    assert app.calls == ["flaky", "flaky"]
+
+
+def test_server_error_after_sending_is_stored(app):
+    client = app.test_client()
+
+    assert _post(client, "/sent-then-failed", {}).status_code == 504
+    retry = _post(client, "/sent-then-failed", {})
+
+    assert retry.status_code == 504
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert app.calls == ["sent"]
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(idempotency.time, "time", lambda: clock[0])
+    index = IdempotencyIndex(ttl=60, max_keys=100)
+
+    entry, owner = index.begin("vote", "k", "fp-1")
+    index.complete(entry, {"status": 201})
+    clock[0] += 60
+    assert index.begin("vote", "k", "fp-1") == (entry, False)
+
+    clock[0] += 1
+    _, owner = index.begin("vote", "k", "fp-2")
+    assert owner
+    assert len(index) == 1
+
+
+def test_oldest_entries_are_evicted_past_max_keys():
+    index = IdempotencyIndex(ttl=60, max_keys=3)
+    for key in ("a", "b", "c", "d"):
+        index.begin("vote", key, "fp")
+
+    assert len(index) == 3
+    # Looking up a stored key at capacity evicts nothing
+    for key in ("b", "c", "d"):
+        assert index.begin("vote", key, "fp")[1] is False
+    assert len(index) == 3
+
+    assert index.begin("vote", "a", "fp")[1] is True
+    assert index.begin("vote", "b", "fp")[1] is True
+    assert index.begin("vote", "a", "fp")[1] is False
+
+
+def test_conflict_and_release():
+    index = IdempotencyIndex(ttl=60, max_keys=10)
+    entry, _ = index.begin("vote", "k", "fp-1")
+
+    with pytest.raises(IdempotencyConflict):
+        index.begin("vote", "k", "fp-2")
+    assert index.begin("fund", "k", "fp-2")[1] is True
+
+    index.release("vote", "k", entry)
+    assert entry["done"].is_set()
+    assert index.begin("vote", "k", "fp-2")[1] is True
@@ -0,0 +1,129 @@
+import random
+
+import pytest
+
+from tallies import RegionTally, parse_region, query_tree
+
+PROVINCES = ["Gauteng", "Limpopo", "Western Cape"]
+
+
+class Untouchable(dict):
+    """A tree node that fails the test if a query reads it."""
+
+    def __getitem__(self, key):
+        raise AssertionError("query read a region outside its path and page")
+
+    def get(self, key, default=None):
+        raise AssertionError("query read a region outside its path and page")
+
+
+def _votes(seed=0, count=3000):
+    rng = random.Random(seed)
+    votes = []
+    for _ in range(count):
+        depth = rng.choice([0, 1, 2, 3, 3, 3])
+        path = (rng.choice(PROVINCES), f"District {rng.randrange(8)}", f"Ward {rng.randrange(4)}")[:depth]
+        votes.append((path, rng.choice(["yes", "no", None]), rng.randint(1, 3)))
+    return votes
+
+
+def _tally(votes):
+    tally = RegionTally()
+    for path, proposal, count in votes:
+        tally.record_vote(1, list(path), proposal, count)
+    return tally
+
+
+def _expected(votes, path):
+    """Region totals by scanning every vote."""
+    inside = [vote for vote in votes if vote[0][:len(path)] == path]
+    by_proposal = {}
+    for _, proposal, count in inside:
+        if proposal is not None:
+            by_proposal[proposal] = by_proposal.get(proposal, 0) + count
+    direct = sum(count for vote_path, _, count in inside if len(vote_path) == len(path))
+    return sum(count for _, _, count in inside), by_proposal, direct
+
+
+def _guard(node, path, depth=0):
+    """Replace every node a query for path may not read with an Untouchable copy."""
+    for name, child in node["children"].items():
+        if depth < len(path) and name == path[depth]:
+            _guard(child, path, depth + 1)
+        elif depth == len(path):
+            # Sub-regions on the page expose their own totals, never their children
+            child["children"] = Untouchable(child["children"])
+            child["names"] = Untouchable()
+        else:
+            node["children"][name] = Untouchable(child)
+
+
+@pytest.mark.parametrize("path", [(), ("Gauteng",), ("Limpopo", "District 3"), ("Western Cape", "District 0", "Ward 3")])
+def test_query_matches_a_full_scan(path):
+    votes = _votes()
+    result = _tally(votes).query(1, list(path), limit=500)
+
+    total, by_proposal, direct = _expected(votes, path)
+    assert result["total"] == total
+    assert result["votes"] == by_proposal
+    assert result["unassigned"] == (direct if len(path) < 3 else 0)
+    for child in result["children"]["items"]:
+        assert child["total"] == _expected(votes, path + (child["name"],))[0]
+    if len(path) < 3:
+        assert sum(child["total"] for child in result["children"]["items"]) + result["unassigned"] == total
+
+
+@pytest.mark.parametrize("path", [(), ("Gauteng",), ("Limpopo", "District 3"), ("Western Cape", "District 0", "Ward 3")])
+def test_query_reads_only_the_path_and_one_page(path):
+    votes = _votes()
+    tree = _tally(votes).export(1)
+    _guard(tree, path)
+
+    result = query_tree(tree, path, limit=5)
+
+    assert result["total"] == _expected(votes, path)[0]
+    assert len(result["children"]["items"]) <= 5
+
+
+def test_pages_walk_sorted_sub_regions():
+    tally = RegionTally()
+    for ward in range(23):
+        tally.record_vote(1, f"Gauteng/Johannesburg/Ward {ward:02d}", "yes")
+
+    names, offset = [], 0
+    while offset is not None:
+        page = tally.query(1, "Gauteng/Johannesburg", offset=offset, limit=10)
+        names.extend(item["name"] for item in page["children"]["items"])
+        offset = page["children"]["nextOffset"]
+
+    assert names == [f"Ward {ward:02d}" for ward in range(23)]
+    assert page["childLevel"] == "ward"
+    assert tally.query(1, "Gauteng/Pretoria") is None
+    assert tally.query(2) is None
+
+
+def test_full_region_rejects_new_sub_regions():
+    tally = RegionTally(max_children=2)
+    tally.record_vote(1, "Gauteng", "yes")
+    tally.record_vote(1, "Limpopo", "yes")
+
+    with pytest.raises(ValueError, match="sub-regions"):
+        tally.check_region(1, "Free State")
+    tally.check_region(1, "Gauteng/Johannesburg")
+
+    # A vote that skipped the check is still counted, at the full region
+    tally.record_vote(1, "Free State", "no")
+    national = tally.query(1)
+    assert national["total"] == 3
+    assert national["unassigned"] == 1
+    assert national["children"]["count"] == 2
+
+
+def test_parse_region_forms():
+    assert parse_region("Gauteng/Johannesburg") == ("Gauteng", "Johannesburg")
+    assert parse_region({"province": "Gauteng", "district": "Johannesburg"}) == ("Gauteng", "Johannesburg")
+    assert parse_region([" Gauteng "]) == ("Gauteng",)
+    assert parse_region(None) == ()
+    for bad in ("a/b/c/d", ["Gauteng", ""], 5, ["x" * 65]):
+        with pytest.raises(ValueError):
+            parse_region(bad)
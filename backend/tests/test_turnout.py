@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from turnout import HOUR, MINUTE, RingSeries, TurnoutTracker
+
+NOW = 1_700_000_000
+
+
+class ReferenceSeries:
+    """Plain per-bucket counts with the same retention rules as RingSeries."""
+
+    def __init__(self, size, width):
+        self.size = size
+        self.width = width
+        self.buckets = {}
+        self.head = None
+        self.total = 0
+
+    def add(self, timestamp, count=1):
+        bucket = int(timestamp) // self.width
+        self.head = bucket if self.head is None else max(self.head, bucket)
+        self.total += count
+        if self.head - bucket < self.size:
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+    def window_total(self, start_bucket, end_bucket):
+        if self.head is None:
+            return 0
+        start_bucket = max(start_bucket, self.head - self.size + 1)
+        end_bucket = min(end_bucket, self.head)
+        return sum(self.buckets.get(bucket, 0) for bucket in range(start_bucket, end_bucket + 1))
+
+
+def test_window_totals_match_bucket_sums():
+    ring = RingSeries(10, MINUTE)
+    for minute, count in enumerate([3, 0, 5, 1, 2]):
+        ring.add(NOW + minute * MINUTE, count)
+
+    head = (NOW + 4 * MINUTE) // MINUTE
+    assert ring.window_total(head - 4, head) == 11
+    assert ring.window_total(head - 2, head - 1) == 6
+    assert ring.window_total(head, head) == 2
+    assert ring.window_total(head + 1, head + 5) == 0
+    assert ring.total == 11
+
+
+def test_late_writes_update_newer_windows():
+    ring = RingSeries(10, MINUTE)
+    ring.add(NOW, 1)
+    ring.add(NOW + 5 * MINUTE, 1)
+    head = (NOW + 5 * MINUTE) // MINUTE
+
+    # A vote arriving late for the first minute counts in every window covering it
+    ring.add(NOW + 30, 4)
+    assert ring.window_total(head - 5, head - 5) == 5
+    assert ring.window_total(head - 5, head) == 6
+    assert ring.window_total(head - 4, head) == 1
+
+    # A vote older than the ring only reaches the overall total
+    ring.add(NOW - 20 * MINUTE, 7)
+    assert ring.window_total(head - 100, head) == 6
+    assert ring.total == 13
+
+
+def test_windows_drop_buckets_that_leave_the_ring():
+    ring = RingSeries(5, MINUTE)
+    for minute in range(12):
+        ring.add(NOW + minute * MINUTE, minute)
+    head = (NOW + 11 * MINUTE) // MINUTE
+
+    assert ring.window_total(head - 100, head) == sum(range(7, 12))
+    assert [count for _, count in ring.series(head - 100, head)] == list(range(7, 12))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_writes_match_reference(seed):
+    rng = random.Random(seed)
+    ring = RingSeries(30, MINUTE)
+    reference = ReferenceSeries(30, MINUTE)
+    clock = NOW
+
+    for _ in range(2000):
+        clock += rng.choice([0, 0, 5, 30, 90, 600])
+        # Mostly live votes, some late ones and a few older than the ring
+        timestamp = clock - rng.choice([0, 0, 0, 45, 300, 1200, 4000])
+        count = rng.randint(1, 3)
+        ring.add(timestamp, count)
+        reference.add(timestamp, count)
+
+        head = clock // MINUTE
+        start = head - rng.randint(0, 40)
+        end = start + rng.randint(0, 40)
+        assert ring.window_total(start, end) == reference.window_total(start, end)
+    assert ring.total == reference.total
+
+
+def test_tracker_query_by_election_and_proposal():
+    tracker = TurnoutTracker(minute_buckets=60, hour_buckets=24)
+    for _ in range(3):
+        tracker.record_vote(7, "yes", timestamp=NOW - 10)
+    tracker.record_vote(7, "no", timestamp=NOW - 2 * HOUR)
+
+    election = tracker.query(7, window=HOUR, now=NOW)
+    assert election["windowTotal"] == 3
+    assert election["total"] == 4
+    assert tracker.query(7, "no", window=HOUR, now=NOW)["windowTotal"] == 0
+    assert tracker.query(7, "no", window=3 * HOUR, resolution="hour", now=NOW)["windowTotal"] == 1
+    assert tracker.query(8, window=HOUR, now=NOW)["total"] == 0
+
+    tracker.drop(7)
+    assert tracker.query(7, window=HOUR, now=NOW)["total"] == 0
+
+
+def test_check_timestamp_rejects_out_of_range_times():
+    tracker = TurnoutTracker(minute_buckets=60, hour_buckets=24)
+
+    assert tracker.check_timestamp(NOW - 60, now=NOW) == NOW - 60
+    assert tracker.check_timestamp(None, now=NOW) == NOW
+    for bad in (NOW + 10 * HOUR, NOW - 25 * HOUR, "soon", True, float("nan")):
+        with pytest.raises(ValueError):
+            tracker.check_timestamp(bad, now=NOW)
@@ -0,0 +1,66 @@
+import base64
+
+import pytest
+from algosdk import account, encoding, transaction
+
+from txn_template import AssetTransferTemplate, sign_asset_transfer
+
+GENESIS_HASH = base64.b64encode(bytes(range(32))).decode()
+
+
+def _params(fee=0, flat_fee=False, gen="testnet-v1.0", first=1000, last=2000):
+    return transaction.SuggestedParams(fee, first, last, GENESIS_HASH, gen, flat_fee=flat_fee)
+
+
+def _algosdk_transfer(private_key, sp, receiver, index, amount, note=None):
+    sender = account.address_from_private_key(private_key)
+    signed = transaction.AssetTransferTxn(sender, sp, receiver, amount, index, note=note).sign(private_key)
+    return signed.get_txid(), encoding.msgpack_encode(signed)
+
+
+@pytest.mark.parametrize("sp", [
+    _params(),
+    _params(fee=1000, flat_fee=True),
+    _params(fee=2500, flat_fee=True),
+    _params(fee=10),
+    _params(gen=""),
+    _params(first=1, last=0x1_0000_0001),
+], ids=["min-fee", "flat-fee", "flat-fee-above-min", "per-byte-fee", "no-genesis-id", "wide-rounds"])
+@pytest.mark.parametrize("amount,note", [
+    (1, None),
+    (0, None),
+    (300, b"vote"),
+    (70000, "x" * 40),
+    (1, b"\x00" * 1024),
+])
+def test_signed_bytes_match_algosdk(sp, amount, note):
+    private_key, _ = account.generate_account()
+    _, receiver = account.generate_account()
+
+    expected_txid, expected = _algosdk_transfer(private_key, sp, receiver, 12345, amount, note)
+    txid, signed = sign_asset_transfer(private_key, sp, receiver, 12345, amount, note)
+
+    assert txid == expected_txid
+    assert signed == expected
+
+
+def test_opt_in_to_self_matches_algosdk():
+    private_key, sender = account.generate_account()
+    sp = _params()
+
+    expected_txid, expected = _algosdk_transfer(private_key, sp, sender, 7, 0)
+    txid, signed = sign_asset_transfer(private_key, sp, sender, 7, 0)
+
+    assert (txid, signed) == (expected_txid, expected)
+
+
+def test_encode_rejects_invalid_input():
+    _, receiver = account.generate_account()
+    template = AssetTransferTemplate(_params(), receiver, 1)
+
+    with pytest.raises(ValueError):
+        template.encode(receiver, -1, 1, 2)
+    with pytest.raises(ValueError):
+        template.encode(receiver, 1, 1, 2, note=b"x" * 1025)
+    with pytest.raises(ValueError):
+        AssetTransferTemplate(_params(), receiver, 0)
@@ -0,0 +1,395 @@
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+
+from config import (
+    TRACE_EXPORTER, TRACE_FILE_PATH, TRACE_OTLP_ENDPOINT, TRACE_SERVICE_NAME,
+    TRACE_SAMPLE_RATE, TRACE_SLOW_MS, TRACE_BATCH_SIZE, TRACE_FLUSH_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+# W3C trace context header: version-traceid-spanid-flags
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+SAMPLED_FLAG = 0x01
+
+# Span currently active in this context (request thread, job or hedge worker)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    """Spans of one trace recorded in this process, exported when the root span ends."""
+
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    def __init__(self, name, trace, parent_id=None, attributes=None, root=False):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.root = root
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._token = None
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def traceparent(self):
+        """W3C traceparent header value for calls made inside this span."""
+        flags = SAMPLED_FLAG if self.trace.sampled else 0
+        return f"00-{self.trace_id}-{self.span_id}-{flags:02x}"
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Exited from a different context than it was entered in
+            _current_span.set(None)
+        self.finish()
+        return False
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+        self.trace.add(self)
+        if self.root:
+            _tracer.finish_trace(self)
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class _NullSpan:
+    """Stand-in used when tracing is disabled, so instrumented code costs almost nothing."""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def traceparent(self):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class FileExporter:
+    """Appends one JSON line per span to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with open(self.path, "a") as f:
+            f.write(lines)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPExporter:
+    """Posts spans to an OpenTelemetry collector using OTLP/HTTP with JSON encoding."""
+
+    def __init__(self, endpoint, service_name):
+        self.url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.service_name = service_name
+
+    def _otlp_span(self, span):
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            # SERVER for request roots, INTERNAL otherwise
+            "kind": 2 if span.root else 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return otlp_span
+
+    def export(self, spans):
+        import requests
+
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "quantum-voting.tracing"},
+                    "spans": [self._otlp_span(span) for span in spans]
+                }]
+            }]
+        }
+        response = requests.post(self.url, json=payload, timeout=5)
+        response.raise_for_status()
+
+
+class BatchSpanProcessor:
+    """Exports finished spans from a background thread in batches."""
+
+    def __init__(self, exporter, batch_size=TRACE_BATCH_SIZE, flush_interval=TRACE_FLUSH_INTERVAL):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=batch_size * 100)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, spans):
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                # Never block a request on the exporter
+                self.dropped += 1
+
+    def _export(self, batch):
+        try:
+            self.exporter.export(batch)
+        except Exception:
+            logger.exception("Trace export failed (%d spans dropped)", len(batch))
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            # Collect a batch until it is full or the flush interval has passed
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    span = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+
+            self._export(batch)
+            if stopping:
+                return
+
+    def shutdown(self):
+        if self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=1)
+            except queue.Full:
+                return
+            self._thread.join(timeout=5)
+
+
+class Tracer:
+    """
+    Creates spans and decides which traces are exported.
+
+    Traces are head-sampled at TRACE_SAMPLE_RATE (or follow the sampled flag of
+    an incoming traceparent). When TRACE_SLOW_MS is set every trace is recorded
+    and unsampled traces are still exported if the root span took at least that
+    long, so tail-latency requests are never lost to sampling.
+    """
+
+    def __init__(self, processor=None, sample_rate=TRACE_SAMPLE_RATE, slow_ms=TRACE_SLOW_MS):
+        self.processor = processor
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    @property
+    def enabled(self):
+        return self.processor is not None
+
+    def start_trace(self, name, traceparent=None, attributes=None):
+        """
+        Start a root span for this process, continuing an incoming traceparent if it is valid.
+
+        Returns:
+            The root span, or NULL_SPAN when the trace will not be recorded
+        """
+        if not self.enabled:
+            return NULL_SPAN
+
+        match = TRACEPARENT_PATTERN.match(traceparent or "")
+        if match:
+            trace_id, parent_id, flags = match.group(1), match.group(2), int(match.group(3), 16)
+            sampled = bool(flags & SAMPLED_FLAG)
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+            sampled = random.random() < self.sample_rate
+
+        if not sampled and self.slow_ms <= 0:
+            return NULL_SPAN
+        return Span(name, Trace(trace_id, sampled), parent_id, attributes, root=True)
+
+    def span(self, name, **attributes):
+        """Start a child of the current span (or a new trace if there is none)."""
+        parent = _current_span.get()
+        if parent is None:
+            return self.start_trace(name, attributes=attributes)
+        return Span(name, parent.trace, parent.span_id, attributes)
+
+    def finish_trace(self, root):
+        trace = root.trace
+        if trace.sampled or root.duration_ms >= self.slow_ms > 0:
+            self.processor.submit(trace.spans)
+
+
+def _build_tracer():
+    if TRACE_EXPORTER == "file":
+        return Tracer(BatchSpanProcessor(FileExporter(TRACE_FILE_PATH)))
+    if TRACE_EXPORTER == "otlp":
+        return Tracer(BatchSpanProcessor(OTLPExporter(TRACE_OTLP_ENDPOINT, TRACE_SERVICE_NAME)))
+    return Tracer()
+
+
+# Shared tracer, configured by TRACE_EXPORTER ("" disables tracing)
+_tracer = _build_tracer()
+
+
+def span(name, **attributes):
+    """
+    Context manager that times a block as a child of the current span.
+
+    Usage:
+        with span("blockchain.sign", asset_id=asset_id):
+            ...
+    """
+    if not _tracer.enabled or _current_span.get() is None:
+        # Only trace work that belongs to a traced request
+        return NULL_SPAN
+    return _tracer.span(name, **attributes)
+
+
+def current_span():
+    """Return the active span, or NULL_SPAN outside a traced request."""
+    return _current_span.get() or NULL_SPAN
+
+
+def traced(name=None):
+    """Decorator that wraps a function call in a span (named module.function by default)."""
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def install_tracing(app):
+    """
+    Register request hooks that open a root span per request.
+
+    The incoming traceparent header is continued and the response carries a
+    traceparent header for the request's span so clients can find the trace.
+    """
+    if not _tracer.enabled:
+        return
+
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_span():
+        root = _tracer.start_trace(
+            f"{request.method} {request.path}",
+            request.headers.get("traceparent"),
+            {"http.method": request.method, "http.route": request.path}
+        )
+        if root is not NULL_SPAN:
+            g.trace_span = root
+            root.__enter__()
+
+    @app.after_request
+    def _tag_response(response):
+        root = g.get("trace_span")
+        if root is not None:
+            root.set_attribute("http.status_code", response.status_code)
+            response.headers["traceparent"] = root.traceparent()
+        return response
+
+    @app.teardown_request
+    def _end_request_span(error=None):
+        root = g.pop("trace_span", None)
+        if root is not None:
+            root.__exit__(type(error) if error else None, error, None)
@@ -0,0 +1,229 @@
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+
+from config import TRAFFIC_CAPTURE_PATH, TRAFFIC_CAPTURE_ROUTES, TRAFFIC_FLUSH_EVERY
+
+logger = logging.getLogger(__name__)
+
+# Bytes read at a time when loading a capture
+READ_CHUNK_SIZE = 64 * 1024
+
+# Request fields that must never be written to a capture
+REDACTED_FIELDS = {
+    "algoMnemonic", "mnemonic", "pqPrivateKey", "private_key",
+    "creator_mnemonic", "voter_mnemonic"
+}
+# Identity fields replaced with a stable pseudonym so replayed sessions keep
+# the same voter-to-request relationships without real ID numbers
+PSEUDONYMISED_FIELDS = {"voter_id", "voterId", "id_number", "smart_id"}
+REDACTED = "<redacted>"
+
+
+def _pseudonym(value):
+    """Map an ID to a stable 13-digit pseudonym (still passes the ID format check)."""
+    digest = hashlib.sha256(str(value).encode()).hexdigest()
+    return str(int(digest, 16))[:13].rjust(13, "0")
+
+
+def sanitize(value):
+    """Return a copy of a request body with secrets redacted and IDs pseudonymised."""
+    if isinstance(value, dict):
+        cleaned = {}
+        for key, item in value.items():
+            if key in REDACTED_FIELDS:
+                cleaned[key] = REDACTED
+            elif key in PSEUDONYMISED_FIELDS and isinstance(item, (str, int)):
+                cleaned[key] = _pseudonym(item)
+            else:
+                cleaned[key] = sanitize(item)
+        return cleaned
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+class TrafficRecorder:
+    """
+    Writes one gzip-compressed JSON line per recorded request:
+    {"t": seconds since capture start, "m": method, "p": path, "q": query string,
+     "b": sanitized JSON body, "s": status code, "l": latency in ms}
+
+    Lines are buffered and every TRAFFIC_FLUSH_EVERY lines are appended as a
+    complete gzip member in a single O_APPEND write. A crash loses at most
+    the unflushed lines, the file can be read while the server runs, and
+    several worker processes can share one file. Each member starts with
+    its session header {"session": ID, "started": Unix time}; the "t"
+    offsets of the lines that follow are relative to that session's start.
+    """
+
+    def __init__(self, path, routes):
+        self.path = path
+        self.routes = set(routes)
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._header = json.dumps({"session": uuid.uuid4().hex, "started": round(self._started, 4)}) + "\n"
+        self._buffer = []
+        self._closed = False
+        atexit.register(self.close)
+
+    def install(self, app):
+        """Register request hooks on a Flask app."""
+        from flask import g, request
+
+        @app.before_request
+        def _start_capture():
+            g.traffic_started = time.perf_counter()
+
+        @app.after_request
+        def _record_request(response):
+            if request.path in self.routes and hasattr(g, "traffic_started"):
+                self.record(
+                    request.method,
+                    request.path,
+                    request.query_string.decode(),
+                    request.get_json(silent=True),
+                    response.status_code,
+                    (time.perf_counter() - g.traffic_started) * 1000
+                )
+            return response
+
+    def record(self, method, path, query, body, status, latency_ms):
+        entry = {
+            "t": round(time.time() - self._started, 4),
+            "m": method,
+            "p": path,
+            "q": query,
+            "b": sanitize(body),
+            "s": status,
+            "l": round(latency_ms, 2)
+        }
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._lock:
+            if self._closed:
+                return
+            self._buffer.append(line + "\n")
+            # Flush in batches; a gzip member per line would hurt compression
+            if len(self._buffer) >= TRAFFIC_FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self):
+        """Append the buffered lines as one gzip member (callers hold the lock)."""
+        if not self._buffer:
+            return
+        member = gzip.compress((self._header + "".join(self._buffer)).encode("utf-8"))
+        self._buffer = []
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, member)
+        finally:
+            os.close(fd)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if not self._closed:
+                self._flush()
+                self._closed = True
+
+
+def install_recorder(app):
+    """Start recording traffic when TRAFFIC_CAPTURE_PATH is set. Returns the recorder or None."""
+    if not TRAFFIC_CAPTURE_PATH:
+        return None
+    recorder = TrafficRecorder(TRAFFIC_CAPTURE_PATH, TRAFFIC_CAPTURE_ROUTES)
+    recorder.install(app)
+    return recorder
+
+
+def read_sessions(path):
+    """
+    Load a capture file as a list of sessions in the order they were recorded.
+
+    A member cut short (a crash mid-write, or a read racing a write) keeps
+    the complete lines decoded before the cut; everything before it is kept.
+
+    Returns:
+        List of {"session": ID, "started": Unix time, "entries": [...]}; lines
+        written before session headers were recorded form one session with no ID
+    """
+    sessions = {}
+    current = None
+
+    def add(line):
+        nonlocal current
+        if not line.strip():
+            return
+        item = json.loads(line)
+        if "session" in item:
+            # Members of one session share its header, so interleaved writers regroup here
+            current = sessions.setdefault(
+                item["session"], {"session": item["session"], "started": item.get("started"), "entries": []})
+            return
+        if current is None:
+            current = sessions.setdefault(None, {"session": None, "started": None, "entries": []})
+        current["entries"].append(item)
+
+    pending = b""
+    decompressor = zlib.decompressobj(wbits=31)
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            try:
+                while data:
+                    pending += decompressor.decompress(data)
+                    *lines, pending = pending.split(b"\n")
+                    for line in lines:
+                        add(line)
+                    data = b""
+                    if decompressor.eof:
+                        # Next gzip member
+                        data = decompressor.unused_data
+                        decompressor = zlib.decompressobj(wbits=31)
+            except zlib.error:
+                logger.warning("Capture %s is corrupt; keeping the records read before the damage", path)
+                break
+
+    if not decompressor.eof and pending:
+        logger.warning("Capture %s ends in a truncated record; it was skipped", path)
+    return list(sessions.values())
+
+
+def read_capture(path, session=None):
+    """
+    Load a capture file as a list of entries sorted by time offset.
+
+    Sessions are laid out back to back (each one's offsets start where the
+    previous session's last request was), so requests from separate runs of
+    the server never interleave.
+
+    Args:
+        path: Capture file
+        session: 1-based session number to load alone (None for every session)
+    """
+    sessions = read_sessions(path)
+    if session is not None:
+        if not 1 <= session <= len(sessions):
+            raise ValueError(f"Capture has {len(sessions)} sessions")
+        sessions = [sessions[session - 1]]
+
+    entries = []
+    offset = 0.0
+    for recorded in sessions:
+        ordered = sorted(recorded["entries"], key=lambda entry: entry["t"])
+        entries.extend({**entry, "t": round(entry["t"] + offset, 4)} for entry in ordered)
+        if ordered:
+            offset += ordered[-1]["t"]
+    return entries
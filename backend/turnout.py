@@ -0,0 +1,214 @@
+import math
+import threading
+import time
+
+from config import TURNOUT_MINUTE_BUCKETS, TURNOUT_HOUR_BUCKETS, TURNOUT_MAX_CLOCK_SKEW
+
+MINUTE = 60
+HOUR = 3600
+
+
+class RingSeries:
+    """
+    Fixed-size ring of time buckets with running totals.
+
+    Each slot holds the bucket's count and the cumulative count up to and
+    including that bucket, so the sum over any window still inside the ring
+    is one subtraction. Buckets that fall off the ring are dropped; older
+    data is kept at the coarser resolution of the next series.
+    """
+
+    def __init__(self, size, width):
+        self.size = size
+        self.width = width
+        self.counts = [0] * size
+        self.cumulative = [0] * size
+        self.head = None  # Bucket index (timestamp // width) of the newest slot
+        self.total = 0
+        # Running total of votes that landed inside the ring's timeline
+        self.running = 0
+
+    def _advance(self, bucket):
+        """Move the head forward to bucket, carrying the running total into new slots."""
+        if self.head is None:
+            self.head = bucket
+            slot = bucket % self.size
+            self.counts[slot] = 0
+            self.cumulative[slot] = self.running
+            return
+
+        steps = min(bucket - self.head, self.size)
+        for offset in range(steps, 0, -1):
+            slot = (bucket - offset + 1) % self.size
+            self.counts[slot] = 0
+            self.cumulative[slot] = self.running
+        self.head = bucket
+
+    def add(self, timestamp, count=1):
+        bucket = int(timestamp) // self.width
+        if self.head is None or bucket > self.head:
+            self._advance(bucket)
+
+        self.total += count
+        age = self.head - bucket
+        if age >= self.size:
+            # Older than the ring; only the overall total reflects it
+            return
+
+        # Late writes update the running totals of every newer slot (zero for live votes)
+        self.running += count
+        self.counts[bucket % self.size] += count
+        for newer in range(bucket, self.head + 1):
+            self.cumulative[newer % self.size] += count
+
+    def window_total(self, start_bucket, end_bucket):
+        """Sum of buckets in [start_bucket, end_bucket], clamped to the ring."""
+        if self.head is None:
+            return 0
+        end_bucket = min(end_bucket, self.head)
+        start_bucket = max(start_bucket, self.head - self.size + 1)
+        if end_bucket < start_bucket:
+            return 0
+
+        start_slot = start_bucket % self.size
+        before = self.cumulative[start_slot] - self.counts[start_slot]
+        return self.cumulative[end_bucket % self.size] - before
+
+    def series(self, start_bucket, end_bucket):
+        """List of (bucket start timestamp, count) for buckets in [start_bucket, end_bucket]."""
+        if self.head is None:
+            return []
+        start_bucket = max(start_bucket, self.head - self.size + 1)
+        end_bucket = min(end_bucket, self.head)
+        return [
+            (bucket * self.width, self.counts[bucket % self.size])
+            for bucket in range(start_bucket, end_bucket + 1)
+        ]
+
+
+class TurnoutTracker:
+    """
+    Per-election and per-proposal turnout, bucketed by minute and by hour.
+
+    Votes are added on write by cast_vote and submit_offline_vote. Minute
+    buckets cover the last TURNOUT_MINUTE_BUCKETS minutes; older turnout is
+    downsampled to hour buckets covering TURNOUT_HOUR_BUCKETS hours.
+    """
+
+    def __init__(self, minute_buckets=TURNOUT_MINUTE_BUCKETS, hour_buckets=TURNOUT_HOUR_BUCKETS):
+        self.minute_buckets = minute_buckets
+        self.hour_buckets = hour_buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _get_series(self, key):
+        series = self._series.get(key)
+        if series is None:
+            series = {
+                "minute": RingSeries(self.minute_buckets, MINUTE),
+                "hour": RingSeries(self.hour_buckets, HOUR)
+            }
+            self._series[key] = series
+        return series
+
+    def check_timestamp(self, timestamp, now=None):
+        """
+        Validate a client-supplied vote time before the vote is accepted.
+
+        A vote time far in the future would move every ring's head past the
+        live buckets and empty them, so only times between the oldest hour
+        bucket and a small clock skew ahead of now are accepted.
+
+        Args:
+            timestamp: Vote time in seconds, or None for now
+            now: Current time (defaults to now)
+
+        Returns:
+            The vote time in seconds
+
+        Raises:
+            ValueError: The vote time is not a number or is outside the accepted range
+        """
+        now = now or time.time()
+        if timestamp is None:
+            return now
+        if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)) or not math.isfinite(timestamp):
+            raise ValueError("Vote timestamp must be a number of seconds")
+        if timestamp > now + TURNOUT_MAX_CLOCK_SKEW:
+            raise ValueError("Vote timestamp is in the future")
+        if timestamp < now - self.hour_buckets * HOUR:
+            raise ValueError("Vote timestamp is too old")
+        return timestamp
+
+    def record_vote(self, election, proposal=None, timestamp=None, count=1):
+        """
+        Record votes for an election (and proposal, if known).
+
+        Args:
+            election: Election asset ID
+            proposal: Optional proposal name
+            timestamp: Vote time in seconds (defaults to now; clamped to the allowed clock skew)
+            count: Number of votes (voting power)
+        """
+        now = time.time()
+        timestamp = min(timestamp or now, now + TURNOUT_MAX_CLOCK_SKEW)
+        keys = [(election, None)]
+        if proposal is not None:
+            keys.append((election, proposal))
+
+        with self._lock:
+            for key in keys:
+                series = self._get_series(key)
+                series["minute"].add(timestamp, count)
+                series["hour"].add(timestamp, count)
+
+    def drop(self, election):
+        """Forget every series of an election (once it is archived)."""
+        with self._lock:
+            for key in [key for key in self._series if key[0] == election]:
+                del self._series[key]
+
+    def query(self, election, proposal=None, window=3600, resolution="minute", now=None):
+        """
+        Get turnout for the last `window` seconds.
+
+        Args:
+            election: Election asset ID
+            proposal: Optional proposal name
+            window: Window length in seconds
+            resolution: "minute" or "hour"
+            now: End of the window (defaults to now)
+
+        Returns:
+            Dict with the window total, overall total and per-bucket series
+        """
+        if resolution not in ("minute", "hour"):
+            raise ValueError("resolution must be 'minute' or 'hour'")
+
+        now = now or time.time()
+        with self._lock:
+            series = self._series.get((election, proposal))
+            if series is None:
+                return {"election": election, "proposal": proposal, "resolution": resolution,
+                        "window": window, "windowTotal": 0, "total": 0, "series": []}
+
+            ring = series[resolution]
+            end_bucket = int(now) // ring.width
+            start_bucket = int(now - window) // ring.width + 1
+
+            return {
+                "election": election,
+                "proposal": proposal,
+                "resolution": resolution,
+                "window": window,
+                "windowTotal": ring.window_total(start_bucket, end_bucket),
+                "total": ring.total,
+                "series": [
+                    {"timestamp": timestamp, "votes": count}
+                    for timestamp, count in ring.series(start_bucket, end_bucket)
+                ]
+            }
+
+
+# Shared turnout tracker
+turnout_tracker = TurnoutTracker()
@@ -0,0 +1,237 @@
+"""
+Templated encoding for the fixed-shape asset transfers used to cast and hand out votes.
+
+algosdk builds a Transaction object, turns it into a dict, sorts it and
+msgpack-encodes it from scratch for every transfer (twice when the fee is
+per-byte, to estimate the size). Every vote in an election shares the same
+receiver, asset, genesis and fee fields, so AssetTransferTemplate encodes
+those once and only packs the sender, amount, note and validity rounds per
+transaction. The output is the same canonical msgpack algosdk produces, so
+transaction IDs and signatures are byte-identical.
+"""
+import base64
+import struct
+import threading
+from collections import OrderedDict
+
+from algosdk import constants, encoding
+from nacl.signing import SigningKey
+
+ASSET_TRANSFER_TYPE = "axfer"
+# Signed transaction wrapper: fixmap(2) "sig" bin8(64) <signature> "txn" <transaction>
+SIGNED_PREFIX = b"\x82\xa3sig\xc4\x40"
+SIGNED_TXN_KEY = b"\xa3txn"
+# Size of the signed wrapper around the transaction bytes
+SIGNED_OVERHEAD = len(SIGNED_PREFIX) + 64 + len(SIGNED_TXN_KEY)
+# Most recently used templates kept by get_transfer_template
+MAX_TEMPLATES = 256
+
+
+def _pack_uint(value):
+    """Shortest msgpack encoding of a non-negative integer."""
+    if value < 0x80:
+        return bytes((value,))
+    if value < 0x100:
+        return b"\xcc" + bytes((value,))
+    if value < 0x10000:
+        return b"\xcd" + struct.pack(">H", value)
+    if value < 0x100000000:
+        return b"\xce" + struct.pack(">I", value)
+    return b"\xcf" + struct.pack(">Q", value)
+
+
+def _pack_bin(value):
+    length = len(value)
+    if length < 0x100:
+        return b"\xc4" + bytes((length,)) + value
+    if length < 0x10000:
+        return b"\xc5" + struct.pack(">H", length) + value
+    return b"\xc6" + struct.pack(">I", length) + value
+
+
+def _pack_str(value):
+    data = value.encode("utf-8")
+    length = len(data)
+    if length < 32:
+        return bytes((0xa0 | length,)) + data
+    if length < 0x100:
+        return b"\xd9" + bytes((length,)) + data
+    if length < 0x10000:
+        return b"\xda" + struct.pack(">H", length) + data
+    return b"\xdb" + struct.pack(">I", length) + data
+
+
+def _field(key, packed_value):
+    return _pack_str(key) + packed_value
+
+
+class AssetTransferTemplate:
+    """
+    Pre-encoded asset transfer to one receiver for one asset.
+
+    Canonical msgpack orders keys lexicographically and drops zero values, so
+    the transaction is built as: aamt, arcv, fee, fv, gen, gh, lv, note, snd,
+    type, xaid. Everything except aamt, fv, lv, note and snd (and fee, when
+    the suggested fee is per-byte) is encoded once here.
+    """
+
+    def __init__(self, sp, receiver, index):
+        """
+        Args:
+            sp: SuggestedParams the static fields (fee, genesis) are taken from
+            receiver: Receiver address
+            index: Asset ID
+        """
+        if not receiver:
+            raise ValueError("Receiver address is required")
+        if not isinstance(index, int) or index <= 0:
+            raise ValueError("Asset ID must be a positive integer")
+
+        self.receiver = receiver
+        self.index = index
+        self.flat_fee = sp.flat_fee
+        self.fee = sp.fee
+
+        receiver_bytes = encoding.decode_address(receiver)
+        self._receiver = _field("arcv", _pack_bin(receiver_bytes)) if any(receiver_bytes) else b""
+        self._genesis = (
+            (_field("gen", _pack_str(sp.gen)) if sp.gen else b"")
+            + _field("gh", _pack_bin(base64.b64decode(sp.gh)))
+        )
+        self._tail = _field("type", _pack_str(ASSET_TRANSFER_TYPE)) + _field("xaid", _pack_uint(index))
+        self._static_count = bool(self._receiver) + bool(sp.gen) + 3  # gh, type, xaid
+
+        # The fee field is static unless it has to be derived from the transaction size
+        self._fee = self._fee_field(sp.fee) if sp.flat_fee else None
+
+    @staticmethod
+    def _fee_field(fee):
+        return _field("fee", _pack_uint(fee)) if fee else b""
+
+    def _encode(self, fee_field, sender, amount, first_valid, last_valid, note):
+        parts = []
+        if amount:
+            parts.append(_field("aamt", _pack_uint(amount)))
+        parts.append(self._receiver)
+        parts.append(fee_field)
+        if first_valid:
+            parts.append(_field("fv", _pack_uint(first_valid)))
+        parts.append(self._genesis)
+        if last_valid:
+            parts.append(_field("lv", _pack_uint(last_valid)))
+        if note:
+            parts.append(_field("note", _pack_bin(note)))
+        parts.append(_field("snd", _pack_bin(sender)))
+        parts.append(self._tail)
+
+        count = (self._static_count + bool(fee_field) + bool(amount)
+                 + bool(first_valid) + bool(last_valid) + bool(note) + 1)  # snd
+        return bytes((0x80 | count,)) + b"".join(parts)
+
+    def encode(self, sender, amount, first_valid, last_valid, note=None):
+        """
+        Encode the transaction as canonical msgpack (what algosdk signs).
+
+        Args:
+            sender: Sender address
+            amount: Number of asset units
+            first_valid: First valid round
+            last_valid: Last valid round
+            note: Optional note (bytes or str, at most 1024 bytes)
+
+        Returns:
+            Transaction bytes
+        """
+        if not isinstance(amount, int) or amount < 0:
+            raise ValueError("Amount must be a non-negative integer")
+        if isinstance(note, str):
+            note = note.encode()
+        if note and len(note) > constants.note_max_length:
+            raise ValueError(f"Note must be at most {constants.note_max_length} bytes")
+
+        sender_bytes = encoding.decode_address(sender)
+        if self._fee is not None:
+            return self._encode(self._fee, sender_bytes, amount, first_valid, last_valid, note)
+
+        # Per-byte fee: algosdk sizes a signed copy that still carries the per-byte rate
+        estimate = self._encode(self._fee_field(self.fee), sender_bytes, amount, first_valid, last_valid, note)
+        fee = max((len(estimate) + SIGNED_OVERHEAD) * self.fee, constants.min_txn_fee)
+        return self._encode(self._fee_field(fee), sender_bytes, amount, first_valid, last_valid, note)
+
+    def sign(self, private_key, amount, first_valid, last_valid, note=None, sender=None):
+        """
+        Build and sign a transfer from the private key's account.
+
+        Args:
+            private_key: Base64 private key (as returned by mnemonic.to_private_key)
+                or a nacl SigningKey
+            amount: Number of asset units
+            first_valid: First valid round
+            last_valid: Last valid round
+            note: Optional note
+            sender: Sender address (derived from the key when omitted)
+
+        Returns:
+            (txid, signed transaction bytes ready for send_raw_transaction)
+        """
+        if isinstance(private_key, SigningKey):
+            signing_key = private_key
+        else:
+            signing_key = SigningKey(base64.b64decode(private_key)[:constants.key_len_bytes])
+        if sender is None:
+            sender = encoding.encode_address(bytes(signing_key.verify_key))
+
+        return sign_encoded(signing_key, self.encode(sender, amount, first_valid, last_valid, note))
+
+
+def sign_encoded(signing_key, txn):
+    """
+    Sign canonical msgpack transaction bytes with a nacl SigningKey.
+
+    Returns:
+        (txid, signed transaction bytes), identical to msgpack-encoding algosdk's SignedTransaction
+    """
+    to_sign = constants.txid_prefix + txn
+    signature = signing_key.sign(to_sign).signature
+    txid = base64.b32encode(encoding.checksum(to_sign)).decode().rstrip("=")
+    return txid, SIGNED_PREFIX + signature + SIGNED_TXN_KEY + txn
+
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+
+
+def get_transfer_template(sp, receiver, index):
+    """
+    Get a cached template for transfers of an asset to a receiver.
+
+    Templates are keyed on the receiver, asset and the static parts of the
+    suggested params, so a change of fee or network yields a new template.
+    """
+    key = (receiver, index, sp.gh, sp.gen, sp.fee, sp.flat_fee)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+
+    template = AssetTransferTemplate(sp, receiver, index)
+    with _templates_lock:
+        _templates[key] = template
+        if len(_templates) > MAX_TEMPLATES:
+            _templates.popitem(last=False)
+    return template
+
+
+def sign_asset_transfer(private_key, sp, receiver, index, amount, note=None, sender=None):
+    """
+    Sign an asset transfer through the cached template for (receiver, asset).
+
+    Equivalent to AssetTransferTxn(sender, sp, receiver, amount, index, note=note).sign(private_key).
+
+    Returns:
+        (txid, base64 signed transaction for algod_client.send_raw_transaction)
+    """
+    template = get_transfer_template(sp, receiver, index)
+    txid, signed = template.sign(private_key, amount, sp.first, sp.last, note, sender)
+    return txid, base64.b64encode(signed).decode()
@@ -1,15 +1,84 @@
 from quantum import generate_quantum_keypair, encrypt_vote, decrypt_vote, generate_vote_hash
-from blockchain import create_account, create_voting_asset, transfer_votes, submit_vote_to_blockchain, get_voting_results
+from blockchain import create_account, create_voting_asset, create_proposal_accounts, transfer_votes, submit_vote_to_blockchain, get_voting_results
 from smart_id import SmartIDVerification
+from bundle import ingest_bundle, kiosk_regions
+from turnout import turnout_tracker
+from tallies import region_tally, parse_region, query_tree, check_vote
+from recovery import StateRecovery
+from archive import election_archive
+from tracing import traced
+from jobs import job_progress, save_progress
+from config import ELECTION_CLOSE_WAIT_SECONDS
+from contextlib import contextmanager, nullcontext
+import threading
 import time
 
+# Election lifecycle: open elections take votes and are tallied live, closed
+# elections keep a frozen tally, archived elections live only in election_archive
+ELECTION_OPEN = "open"
+ELECTION_CLOSED = "closed"
+ELECTION_ARCHIVED = "archived"
+
 # Store active elections (in a real system, this would be in a database)
 active_elections = {}
 # Store registered voters (in a real system, this would be in a database)
 registered_voters = {}
 # Store vote batches (in a real system, this would be in a database)
 vote_batches = {}
+# Offline votes already accepted, by vote hash (in a real system, this would be in a database)
+offline_votes = {}
+# Restores active_elections from the local snapshot and the chain after a restart
+state_recovery = StateRecovery(active_elections, archive=election_archive, tallies=region_tally)
+# Votes being submitted per election, and elections waiting for them to finish.
+# close_election rejects new votes first and then waits for the in-flight ones, so
+# every vote reported as cast is in the frozen tally and has updated turnout and
+# region tallies before archive_election drops them
+_lifecycle = threading.Condition()
+_in_flight = {}
+_closing = set()
 
+def _open_election(asset_id):
+    """
+    Get an election that is still taking votes.
+    
+    Raises:
+        ValueError: The election is unknown, closed or archived
+    """
+    election = active_elections.get(asset_id)
+    if election is None:
+        if asset_id in election_archive:
+            raise ValueError("Election is closed")
+        raise ValueError("Election not found")
+    if election.get("status", ELECTION_OPEN) != ELECTION_OPEN:
+        raise ValueError("Election is closed")
+    if asset_id in _closing:
+        raise ValueError("Election is closing")
+    return election
+
+@contextmanager
+def _voting(asset_id):
+    """
+    Hold an open election while a vote is submitted and recorded.
+    
+    Yields:
+        The election
+    
+    Raises:
+        ValueError: The election is unknown, closing, closed or archived
+    """
+    with _lifecycle:
+        election = _open_election(asset_id)
+        _in_flight[asset_id] = _in_flight.get(asset_id, 0) + 1
+    try:
+        yield election
+    finally:
+        with _lifecycle:
+            _in_flight[asset_id] -= 1
+            if not _in_flight[asset_id]:
+                del _in_flight[asset_id]
+                _lifecycle.notify_all()
+
+@traced()
 def register_voter(voter_id):
     """
     Register a new voter with smart ID verification, quantum-resistant keys, and Algorand account.
@@ -44,6 +113,7 @@ def register_voter(voter_id):
         "algoMnemonic": algo_account["mnemonic"],
         "pqPublicKey": quantum_keys["public_key"],
         "pqPrivateKey": quantum_keys["private_key"],
+        "pqAlgorithm": quantum_keys["algorithm"],
         "verified": True,
         "verificationTimestamp": verification_result["verification"]["verification_timestamp"]
     }
@@ -81,6 +151,7 @@ def create_election(creator_credentials, election_name, total_votes, multisig_ad
         "totalVotes": total_votes,
         "creator": creator_credentials.get("voterId"),
         "multisigAdmin": multisig_admin,
+        "status": ELECTION_OPEN,
         "proposals": {}  # Will store proposal addresses and their metadata
     }
     
@@ -103,6 +174,9 @@ def add_proposal(asset_id, proposal_name, proposal_details):
     if asset_id not in active_elections:
         raise ValueError("Election not found")
     
+    if active_elections[asset_id].get("status", ELECTION_OPEN) != ELECTION_OPEN:
+        raise ValueError("Election is closed")
+    
     # Create a new Algorand account for the proposal
     proposal_account = create_account()
     
@@ -118,7 +192,77 @@ def add_proposal(asset_id, proposal_name, proposal_details):
     
     return proposal
 
-def cast_vote(voter_credentials, asset_id, voting_power, proposal_name):
+@traced()
+def setup_election(creator_credentials, election_name, total_votes, proposals, multisig_admin=None):
+    """
+    Create an election together with all of its proposals in one operation.
+    
+    The voting asset is created first, then every proposal account is created,
+    funded and opted into the asset in atomic groups that are confirmed together.
+    
+    Args:
+        creator_credentials: Credentials of the election creator
+        election_name: Name of the election
+        total_votes: Total number of votes to create
+        proposals: List of proposals, each a name or a dict with "name" and optional "details"
+        multisig_admin: Optional multisig admin information
+        
+    Returns:
+        Election details including all proposals
+    """
+    creator_mnemonic = creator_credentials.get("algoMnemonic")
+    if not creator_mnemonic:
+        raise ValueError("Creator mnemonic is required")
+    
+    if not proposals:
+        raise ValueError("At least one proposal is required")
+    
+    # Normalise proposals to name/details pairs
+    proposal_entries = [
+        {"name": proposal, "details": None} if isinstance(proposal, str)
+        else {"name": proposal.get("name"), "details": proposal.get("details")}
+        for proposal in proposals
+    ]
+    names = [entry["name"] for entry in proposal_entries]
+    if not all(names):
+        raise ValueError("Every proposal needs a name")
+    if len(set(names)) != len(names):
+        raise ValueError("Proposal names must be unique")
+    
+    # Create the asset, unless an earlier attempt of this job already did
+    asset_id = job_progress().get("asset_id")
+    if asset_id is None:
+        asset_id = create_voting_asset(creator_mnemonic, election_name, total_votes)
+        save_progress(asset_id=asset_id)
+    
+    # Create, fund and opt in every proposal account in batched atomic groups
+    accounts = create_proposal_accounts(creator_mnemonic, asset_id, names)
+    
+    election = {
+        "assetId": asset_id,
+        "electionName": election_name,
+        "totalVotes": total_votes,
+        "creator": creator_credentials.get("voterId"),
+        "multisigAdmin": multisig_admin,
+        "status": ELECTION_OPEN,
+        "proposals": {
+            entry["name"]: {
+                "name": entry["name"],
+                "details": entry["details"],
+                "address": proposal_account["address"],
+                "mnemonic": proposal_account["mnemonic"],
+                "optInTxid": proposal_account["optInTxid"]
+            }
+            for entry, proposal_account in zip(proposal_entries, accounts)
+        }
+    }
+    
+    active_elections[asset_id] = election
+    
+    return election
+
+@traced()
+def cast_vote(voter_credentials, asset_id, voting_power, proposal_name, region=None):
     """
     Cast a vote in an election.
     
@@ -127,122 +271,335 @@ def cast_vote(voter_credentials, asset_id, voting_power, proposal_name):
         asset_id: ID of the election asset
         voting_power: Number of votes to cast
         proposal_name: Name of the proposal to vote for
+        region: Optional region tag ("Province/District/Ward" or a dict by level)
         
     Returns:
         Vote transaction details
     """
-    if asset_id not in active_elections:
-        raise ValueError("Election not found")
+    # close_election waits for this vote to be recorded before its final tally
+    with _voting(asset_id) as election:
+        if proposal_name not in election["proposals"]:
+            raise ValueError("Proposal not found")
+        
+        proposal = election["proposals"][proposal_name]
+        voter_mnemonic = voter_credentials.get("algoMnemonic")
+        
+        if not voter_mnemonic:
+            raise ValueError("Voter mnemonic is required")
+        
+        # Validate the region tag before anything is sent to the chain
+        region_path = parse_region(region)
+        region_tally.check_region(asset_id, region_path)
+        
+        # Create vote data
+        vote_data = {
+            "voter": voter_credentials.get("voterId"),
+            "election": asset_id,
+            "proposal": proposal_name,
+            "voting_power": voting_power,
+            "timestamp": int(time.time())
+        }
+        if region_path:
+            vote_data["region"] = "/".join(region_path)
+        
+        # Generate hash of vote for verification
+        vote_hash = generate_vote_hash(vote_data)
+        
+        # Submit vote to blockchain
+        txid = submit_vote_to_blockchain(
+            voter_mnemonic,
+            proposal["address"],
+            asset_id,
+            voting_power,
+            vote_hash
+        )
+        
+        # Create a batch record for this vote
+        batch_id = f"batch_{txid}"
+        vote_batches[batch_id] = {
+            "txid": txid,
+            "vote_data": vote_data,
+            "vote_hash": vote_hash
+        }
+        
+        # Update turnout and the regional roll-up on write
+        turnout_tracker.record_vote(asset_id, proposal_name, vote_data["timestamp"], voting_power)
+        region_tally.record_vote(asset_id, region_path, proposal_name, voting_power)
+        
+        return {
+            "batchId": batch_id,
+            "txid": txid,
+            "vote_hash": vote_hash
+        }
+
+@traced()
+def submit_offline_vote(voter_id, vote_data, region=None):
+    """
+    Submit a vote that was created offline.
     
-    election = active_elections[asset_id]
-    if proposal_name not in election["proposals"]:
-        raise ValueError("Proposal not found")
+    A payload that was already accepted (a retried request or a re-uploaded
+    bundle) returns the original record and is not counted again.
     
-    proposal = election["proposals"][proposal_name]
-    voter_mnemonic = voter_credentials.get("algoMnemonic")
+    Args:
+        voter_id: ID of the voter
+        vote_data: Encrypted vote data
+        region: Region of the kiosk that signed the vote; only signed votes
+            count towards regional tallies (a "region" in vote_data is kept with
+            the vote but not tallied)
+        
+    Returns:
+        Vote record
+    """
+    # In a real system, this would verify the vote data and submit it to the blockchain
+    election_id = vote_data.get("election") if isinstance(vote_data, dict) else None
+    # Votes for an election hold it open until they are recorded (see close_election)
+    with _voting(election_id) if election_id else nullcontext():
+        if election_id:
+            # The vote time comes from the client and feeds turnout; check it before the vote is stored
+            timestamp = turnout_tracker.check_timestamp(vote_data.get("timestamp"))
+            proposal = vote_data.get("proposal")
+            voting_power = vote_data.get("voting_power")
+            if voting_power is None:
+                voting_power = 1
+            check_vote(proposal, voting_power)
+        if isinstance(vote_data, dict) and vote_data.get("region"):
+            parse_region(vote_data["region"])
+        region_path = parse_region(region)
+        
+        # Generate a hash of the vote data
+        vote_hash = generate_vote_hash(vote_data)
+        
+        # Create a batch ID
+        batch_id = f"offline_batch_{hash(voter_id) % 10000}"
+        
+        record = {
+            "voteHash": vote_hash,
+            "batchId": batch_id
+        }
+        # setdefault claims the hash atomically, so concurrent reposts count once
+        existing = offline_votes.setdefault(vote_hash, record)
+        if existing is not record:
+            return existing
+        
+        # Store the vote
+        vote_batches[batch_id] = {
+            "voter_id": voter_id,
+            "vote_data": vote_data,
+            "vote_hash": vote_hash
+        }
+        
+        # Update turnout (and the kiosk's regional tally) when the offline vote says which election it belongs to
+        if election_id:
+            turnout_tracker.record_vote(election_id, proposal, timestamp, voting_power)
+            if region_path:
+                region_tally.record_vote(election_id, region_path, proposal, voting_power)
+        
+        return record
+
+@traced()
+def submit_offline_bundle(stream):
+    """
+    Submit a signed binary bundle of offline votes uploaded by a kiosk.
     
-    if not voter_mnemonic:
-        raise ValueError("Voter mnemonic is required")
+    Args:
+        stream: Readable binary stream containing the bundle
+        
+    Returns:
+        Kiosk ID, record count and the vote record for each ingested vote
+    """
+    def submit(record, kiosk_id):
+        vote_data = {
+            "encrypted_vote": record["ciphertext"],
+            "election": record["election"],
+            "timestamp": record["timestamp"],
+            "kiosk": kiosk_id
+        }
+        # A kiosk may upload late: votes for elections that have closed since are
+        # rejected one by one rather than failing the rest of the bundle
+        try:
+            # The bundle signature vouches for the kiosk, so its votes count towards the kiosk's region
+            return submit_offline_vote(record["voter_id"], vote_data, region=kiosk_regions.get(kiosk_id))
+        except ValueError as e:
+            return {"voterId": record["voter_id"], "error": str(e)}
+    
+    return ingest_bundle(stream, submit)
+
+def _tally(asset_id, election):
+    """
+    Count the votes held by each proposal account of an election.
     
-    # Create vote data
-    vote_data = {
-        "voter": voter_credentials.get("voterId"),
-        "election": asset_id,
-        "proposal": proposal_name,
-        "voting_power": voting_power,
-        "timestamp": int(time.time())
+    Returns:
+        Election result with the vote count per proposal
+    """
+    # Get proposal addresses
+    proposal_addresses = {
+        proposal["name"]: proposal["address"] 
+        for proposal_name, proposal in election["proposals"].items()
     }
     
-    # Generate hash of vote for verification
-    vote_hash = generate_vote_hash(vote_data)
-    
-    # Submit vote to blockchain
-    txid = submit_vote_to_blockchain(
-        voter_mnemonic,
-        proposal["address"],
-        asset_id,
-        voting_power,
-        vote_hash
-    )
-    
-    # Create a batch record for this vote
-    batch_id = f"batch_{txid}"
-    vote_batches[batch_id] = {
-        "txid": txid,
-        "vote_data": vote_data,
-        "vote_hash": vote_hash
-    }
+    # Get voting results from blockchain
+    blockchain_results = get_voting_results(asset_id, list(proposal_addresses.values()))
+    
+    # Format results
+    proposals_results = [
+        {
+            "name": name,
+            "votes": blockchain_results.get(address, 0)
+        }
+        for name, address in proposal_addresses.items()
+    ]
     
     return {
-        "batchId": batch_id,
-        "txid": txid,
-        "vote_hash": vote_hash
+        "id": asset_id,
+        "name": election["electionName"],
+        "proposals": proposals_results
     }
 
-def submit_offline_vote(voter_id, vote_data):
+@traced()
+def close_election(asset_id, archive=True):
     """
-    Submit a vote that was created offline.
+    Close an election: stop accepting votes and freeze its final tally.
     
     Args:
-        voter_id: ID of the voter
-        vote_data: Encrypted vote data
+        asset_id: ID of the election asset
+        archive: Move the election to the on-disk archive straight away
         
     Returns:
-        Vote record
+        The election's final results and lifecycle status
     """
-    # In a real system, this would verify the vote data and submit it to the blockchain
+    with _lifecycle:
+        election = active_elections.get(asset_id)
+        if election is None:
+            if asset_id in election_archive:
+                raise ValueError("Election is already archived")
+            raise ValueError("Election not found")
+        if asset_id in _closing:
+            raise ValueError("Election is already closing")
+        
+        closing = election.get("status", ELECTION_OPEN) == ELECTION_OPEN
+        if closing:
+            # Reject new votes, then let the votes already being submitted finish
+            _closing.add(asset_id)
+            if not _lifecycle.wait_for(lambda: not _in_flight.get(asset_id), ELECTION_CLOSE_WAIT_SECONDS):
+                _closing.discard(asset_id)
+                raise RuntimeError("Votes are still being submitted; try closing the election again")
+    
+    if closing:
+        # Take the final count first: if the tally fails the election reopens
+        # rather than closing without results
+        try:
+            closed_at = int(time.time())
+            final_results = _tally(asset_id, election)
+            turnout = turnout_tracker.query(asset_id)["total"]
+        except Exception:
+            with _lifecycle:
+                _closing.discard(asset_id)
+            raise
+        
+        with _lifecycle:
+            election.update({
+                "closedAt": closed_at,
+                "finalResults": final_results,
+                "turnout": turnout
+            })
+            election["status"] = ELECTION_CLOSED
+            _closing.discard(asset_id)
+    
+    if archive:
+        return archive_election(asset_id)
+    
+    return {"status": election["status"], "closedAt": election["closedAt"], "results": election["finalResults"]}
+
+def archive_election(asset_id):
+    """
+    Move a closed election out of memory into the compressed on-disk archive.
     
-    # Generate a hash of the vote data
-    vote_hash = generate_vote_hash(vote_data)
+    Args:
+        asset_id: ID of the election asset
+        
+    Returns:
+        The election's final results and lifecycle status
+    """
+    election = active_elections.get(asset_id)
+    if election is None:
+        raise ValueError("Election not found")
+    if election.get("status", ELECTION_OPEN) == ELECTION_OPEN or "finalResults" not in election:
+        raise ValueError("Close the election before archiving it")
     
-    # Create a batch ID
-    batch_id = f"offline_batch_{hash(voter_id) % 10000}"
+    election["status"] = ELECTION_ARCHIVED
+    election["regionTallies"] = region_tally.export(asset_id)
+    election_archive.archive(election)
     
-    # Store the vote
-    vote_batches[batch_id] = {
-        "voter_id": voter_id,
-        "vote_data": vote_data,
-        "vote_hash": vote_hash
-    }
+    # Drop it from the hot path and the live tally machinery
+    del active_elections[asset_id]
+    turnout_tracker.drop(asset_id)
+    region_tally.drop(asset_id)
     
-    return {
-        "voteHash": vote_hash,
-        "batchId": batch_id
-    }
+    return {"status": ELECTION_ARCHIVED, "closedAt": election["closedAt"], "results": election["finalResults"]}
 
+def get_election(asset_id):
+    """
+    Get one election's status and results, loading archived elections from disk.
+    
+    Args:
+        asset_id: ID of the election asset
+        
+    Returns:
+        Election results with "status" (and "closedAt" once closed), or None if unknown
+    """
+    election = active_elections.get(asset_id)
+    if election is None:
+        election = election_archive.get(asset_id)
+        if election is None:
+            return None
+    
+    status = election.get("status", ELECTION_OPEN)
+    if status == ELECTION_OPEN:
+        return {**_tally(asset_id, election), "status": status}
+    return {**election["finalResults"], "status": status, "closedAt": election["closedAt"]}
+
+def get_region_tallies(asset_id, region=None, offset=0, limit=None):
+    """
+    Get an election's tally for one region with a page of its sub-regions.
+    
+    Args:
+        asset_id: ID of the election asset
+        region: Region tag to drill into (None for the national level)
+        offset: Index of the first sub-region in the page
+        limit: Maximum number of sub-regions in the page
+        
+    Returns:
+        Region tally, or None if the election or region has no votes
+    """
+    page = {"offset": offset} if limit is None else {"offset": offset, "limit": limit}
+    if asset_id in active_elections:
+        return region_tally.query(asset_id, region, **page)
+    
+    # Archived elections keep their frozen region tree in the archive
+    election = election_archive.get(asset_id)
+    if election is None or not election.get("regionTallies"):
+        return None
+    return query_tree(election["regionTallies"], parse_region(region), **page)
+
+@traced()
 def get_election_results():
     """
-    Get results for all active elections.
+    Get results for all elections that have not been archived.
+    
+    Open elections are counted live; closed elections return their frozen tally.
     
     Returns:
         List of election results
     """
     results = []
     
-    for asset_id, election in active_elections.items():
-        # Get proposal addresses
-        proposal_addresses = {
-            proposal["name"]: proposal["address"] 
-            for proposal_name, proposal in election["proposals"].items()
-        }
-        
-        # Get voting results from blockchain
-        blockchain_results = get_voting_results(asset_id, list(proposal_addresses.values()))
-        
-        # Format results
-        proposals_results = [
-            {
-                "name": name,
-                "votes": blockchain_results.get(address, 0)
-            }
-            for name, address in proposal_addresses.items()
-        ]
-        
-        election_result = {
-            "id": asset_id,
-            "name": election["electionName"],
-            "proposals": proposals_results
-        }
+    for asset_id, election in list(active_elections.items()):
+        status = election.get("status", ELECTION_OPEN)
+        if status == ELECTION_OPEN:
+            election_result = _tally(asset_id, election)
+        else:
+            election_result = dict(election["finalResults"])
+        election_result["status"] = status
         
         results.append(election_result)
     
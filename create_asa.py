@@ -13,10 +13,14 @@ creator_private_key = to_private_key(creator_mnemonic)
 creator_address = account.address_from_private_key(creator_private_key)
 
 
-def create_asa():
+def create_asa(client=algod_client):
+    """
+    Create the ASA. Pass a different client (for example the in-process
+    simulator's SimulatedAlgodClient from backend/simulator.py) to run offline.
+    """
     try:
         # Get suggested transaction parameters
-        params = algod_client.suggested_params()
+        params = client.suggested_params()
 
         # Define ASA parameters
         txn = transaction.AssetConfigTxn(
@@ -37,12 +41,12 @@ def create_asa():
         signed_txn = txn.sign(creator_private_key)
 
         # Submit the transaction
-        txid = algod_client.send_transaction(signed_txn)
+        txid = client.send_transaction(signed_txn)
         print(f"Transaction ID: {txid}")
 
         # Wait for confirmation
         confirmed_txn = transaction.wait_for_confirmation(
-            algod_client, txid, 4)
+            client, txid, 4)
         print(f"ASA created with ID: {confirmed_txn['asset-index']}")
     except Exception as e:
         print(f"Error: {e}")